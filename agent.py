@@ -0,0 +1,169 @@
+"""A small control agent that runs on each host.  It is started once
+over the cached SSH connection and then serves framed requests on its
+stdin/stdout, so that a sysfs write or a short shell command costs one
+message on an open channel instead of a new exec channel and a fresh
+remote shell.
+
+Frames are a 4-byte big-endian length followed by a JSON object.
+Strings are sent as latin-1 so arbitrary bytes survive the trip."""
+
+import sys
+import struct
+import threading
+import subprocess
+import json
+from batch import CmdResult
+
+# Runs on the remote host (python 2.6 on the lancelots), so keep it
+# self-contained and old-python friendly.
+AGENT_SOURCE = r'''
+import sys, struct, json, subprocess
+
+def recv():
+    hdr = sys.stdin.read(4)
+    if len(hdr) < 4:
+        return None
+    n = struct.unpack('>I', hdr)[0]
+    return json.loads(sys.stdin.read(n))
+
+def send(msg):
+    data = json.dumps(msg)
+    sys.stdout.write(struct.pack('>I', len(data)) + data)
+    sys.stdout.flush()
+
+def s(b):
+    return b.decode('latin-1')
+
+def handle(req):
+    op = req['op']
+    if op == 'sh':
+        # stdin is the request stream, so children must not inherit it
+        p = subprocess.Popen(req['cmd'], shell=True, stdin=open('/dev/null'),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        return {'status': p.returncode, 'out': s(out), 'err': s(err)}
+    if op == 'write':
+        f = open(req['path'], 'w')
+        try:
+            f.write(req['data'].encode('latin-1'))
+        finally:
+            f.close()
+        return {}
+    if op == 'read':
+        f = open(req['path'])
+        try:
+            return {'data': s(f.read())}
+        finally:
+            f.close()
+    if op == 'ping':
+        return {}
+    raise ValueError('unknown op %s' % op)
+
+while True:
+    req = recv()
+    if req is None or req['op'] == 'quit':
+        break
+    try:
+        resp = handle(req)
+        resp['ok'] = True
+    except Exception, e:
+        resp = {'ok': False, 'error': '%s: %s' % (e.__class__.__name__, e)}
+    send(resp)
+'''
+
+# Reads the agent source from stdin and runs it; the agent then keeps
+# reading requests from the same stdin.
+BOOTSTRAP = "import sys; exec(sys.stdin.read(int(sys.stdin.readline())))"
+
+class AgentError(Exception):
+    pass
+
+class Agent(object):
+    """Client side of the agent protocol over a pair of file objects.
+    Requests are serialised, so one agent can be shared by threads."""
+    def __init__(self, wfile, rfile):
+        self.wfile = wfile
+        self.rfile = rfile
+        self.lock = threading.Lock()
+        self.closed = False
+        self.wfile.write("%d\n%s" % (len(AGENT_SOURCE), AGENT_SOURCE))
+        self.wfile.flush()
+
+    def request(self, op, **kwargs):
+        kwargs['op'] = op
+        data = json.dumps(kwargs)
+        with self.lock:
+            if self.closed:
+                raise AgentError("agent is closed")
+            try:
+                self.wfile.write(struct.pack('>I', len(data)) + data)
+                self.wfile.flush()
+                hdr = self.rfile.read(4)
+                if len(hdr) < 4:
+                    raise AgentError("agent exited")
+                n = struct.unpack('>I', hdr)[0]
+                resp = json.loads(self.rfile.read(n))
+            except (IOError, EOFError, ValueError), e:
+                self.closed = True
+                raise AgentError("agent connection lost: %s" % e)
+        if not resp.pop('ok'):
+            raise AgentError(resp['error'])
+        return resp
+
+    def alive(self):
+        if self.closed:
+            return False
+        try:
+            self.request('ping')
+        except AgentError:
+            return False
+        return True
+
+    def sh(self, cmd):
+        resp = self.request('sh', cmd=cmd)
+        return CmdResult(cmd, resp['status'],
+                         resp['out'].encode('latin-1'),
+                         resp['err'].encode('latin-1'))
+
+    def write(self, path, data):
+        self.request('write', path=path, data=str(data).decode('latin-1'))
+
+    def read(self, path):
+        return self.request('read', path=path)['data'].encode('latin-1')
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                data = json.dumps({'op': 'quit'})
+                self.wfile.write(struct.pack('>I', len(data)) + data)
+                self.wfile.flush()
+            except IOError:
+                pass
+
+class SSHAgent(Agent):
+    """Agent started over an existing paramiko SSHClient."""
+    def __init__(self, ssh, python="python"):
+        stdin, stdout, stderr = ssh.exec_command("%s -u -c '%s'" % (python, BOOTSTRAP))
+        self.channel = stdout.channel
+        Agent.__init__(self, stdin, stdout)
+
+    def close(self):
+        Agent.close(self)
+        self.channel.close()
+
+class LocalAgent(Agent):
+    """Agent running in a local subprocess.  Stands in for a remote host
+    when testing without the cluster."""
+    def __init__(self, python=sys.executable):
+        self.proc = subprocess.Popen([python, '-u', '-c', BOOTSTRAP],
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+        Agent.__init__(self, self.proc.stdin, self.proc.stdout)
+
+    def close(self):
+        Agent.close(self)
+        self.proc.stdin.close()
+        self.proc.wait()
@@ -8,13 +8,6 @@ import f2
 import f3
 import f4
 
-parser = argparse.ArgumentParser(description="Allocation algorithm.")
-
-parser.add_argument('--file',
-                    required=True)
-
-args = parser.parse_args()
-
 """
 Example traffic matrix input file:
 
@@ -67,6 +60,12 @@ def stats(flows):
     return hosts, tenants_list, tx_flows, rx_flows
 
 def main():
+    parser = argparse.ArgumentParser(description="Allocation algorithm.")
+
+    parser.add_argument('--file',
+                        required=True)
+
+    args = parser.parse_args()
     flows = parse_input(args.file)
     hosts, tenants_list, tx_flows, rx_flows = stats(flows)
 
@@ -74,4 +73,6 @@ def main():
     f2.print_formulation(flows, tx_flows, rx_flows)
     #f3.print_formulation(flows, tx_flows, rx_flows)
     #f4.print_formulation(flows, tx_flows, rx_flows)
-main()
+
+if __name__ == "__main__":
+    main()
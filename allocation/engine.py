@@ -0,0 +1,161 @@
+"""Solve the allocation problem directly, instead of printing a
+Mathematica program for it.
+
+Every flow in an allocation_topos file uses two resources: the TX port
+of its source host and the RX port of its destination host, each of
+capacity 1 (the whole link).  Since that is all the structure there
+is, the load on every port is two bincounts over the flows and the
+price of a flow is two array lookups, so both solvers are a handful
+of NumPy passes per iteration:
+
+  maxmin:     weighted max-min fairness by progressive filling: all
+              unfrozen flows grow in proportion to their weights until
+              a port fills up, the flows through it are frozen, repeat.
+              At most one round per port.
+  alpha_fair: maximise sum w^alpha * x^(1-alpha) / (1-alpha) (w log x
+              for alpha = 1) by iterating on port prices; alpha = 1 is
+              weighted proportional fairness, and as alpha grows the
+              rates approach weighted max-min, i.e. what maxmin gives.
+
+Weights are per tenant (default 1).  With --per endpoint, a tenant's
+weight at a port is split evenly among its flows there, as perfiso
+shares a port among tenants and each tenant among its flows; a flow
+gets the smaller of its TX and RX split, i.e. its weight is divided by
+max(ntx, nrx).  That is an approximation of max-min among tenants at
+every port, not an exact solution of it: a tenant whose flows are held
+back elsewhere does not pass its unused split on to its other flows at
+the port.
+
+    python allocation/engine.py --file allocation_topos/cross --weight 2=2"""
+
+import time
+import argparse
+import numpy as np
+from collections import defaultdict
+from alloc import parse_input, stats
+
+class Problem(object):
+    def __init__(self, flows, weights=None, per="flow", capacity=1.0):
+        self.flows = flows
+        self.hosts, self.tenants, self.tx_flows, self.rx_flows = stats(flows)
+        index = dict((h, i) for i, h in enumerate(self.hosts))
+        n = len(self.hosts)
+        # Resources 0..n-1 are TX ports, n..2n-1 RX ports
+        self.tx = np.array([index[f.src_host] for f in flows], dtype=int)
+        self.rx = np.array([n + index[f.dst_host] for f in flows], dtype=int)
+        self.capacity = np.repeat(float(capacity), 2 * n)
+        if weights is None:
+            weights = {}
+        w = np.array([float(weights.get(f.src_tenant, 1)) for f in flows])
+        if per == "endpoint":
+            ntx = defaultdict(int)
+            nrx = defaultdict(int)
+            for f in flows:
+                ntx[(f.src_host, f.src_tenant)] += 1
+                nrx[(f.dst_host, f.dst_tenant)] += 1
+            share = [max(ntx[(f.src_host, f.src_tenant)], nrx[(f.dst_host, f.dst_tenant)])
+                     for f in flows]
+            w = w / np.array(share, dtype=float)
+        self.weights = w
+
+    def load(self, x):
+        """Total rate on every port."""
+        R = len(self.capacity)
+        return np.bincount(self.tx, x, minlength=R) + np.bincount(self.rx, x, minlength=R)
+
+    def price(self, p):
+        """Sum of the port prices along every flow."""
+        return p[self.tx] + p[self.rx]
+
+def maxmin(prob, eps=1e-9):
+    """Weighted max-min fair rates of the flows of prob."""
+    w = prob.weights
+    x = np.zeros(len(w))
+    left = prob.capacity.copy()
+    active = w > 0
+    while active.any():
+        grow = prob.load(w * active)
+        busy = grow > 0
+        dt = (left[busy] / grow[busy]).min()
+        x += dt * w * active
+        left -= dt * grow
+        full = busy & (left <= eps * prob.capacity)
+        active &= ~(full[prob.tx] | full[prob.rx])
+    return x
+
+def alpha_fair(prob, alpha=1.0, iters=100000, tol=1e-7):
+    """Weighted alpha-fair rates of the flows of prob.  The rates
+    maximising the utility given port prices p are w * price^(-1/alpha);
+    prices are then raised on overloaded ports and lowered on idle
+    ones, multiplicatively, until no port is overloaded and the rates
+    stop moving (by less than tol of the largest)."""
+    w = prob.weights
+    cap = prob.capacity
+    # A flow never gets more than the smaller of its two ports
+    limit = np.minimum(cap[prob.tx], cap[prob.rx])
+    p = np.ones(len(cap))
+    # Rates move as price^(-1/alpha), so prices need to move faster
+    # the larger alpha is
+    step = 0.75 * alpha
+    prev = None
+    for _ in xrange(iters):
+        q = prob.price(p)
+        x = np.minimum(limit, w * np.maximum(q, 1e-300) ** (-1.0 / alpha))
+        load = prob.load(x)
+        ratio = load / cap
+        if prev is not None and ratio.max() < 1 + tol and np.abs(x - prev).max() < tol * x.max():
+            break
+        prev = x
+        p *= np.maximum(ratio, 1e-3) ** step
+    # Whatever is left over, the result is feasible
+    return x / max(1.0, (prob.load(x) / cap).max())
+
+def endpoint_rates(prob, x):
+    """{('tx' or 'rx', host, tenant): aggregate rate}"""
+    ret = defaultdict(float)
+    for f, r in zip(prob.flows, x):
+        ret[('tx', f.src_host, f.src_tenant)] += r
+        ret[('rx', f.dst_host, f.dst_tenant)] += r
+    return ret
+
+def show(prob, x):
+    for f, r in zip(prob.flows, x):
+        print "%s:%s -> %s:%s  %.4f" % (f.src_host, f.src_tenant, f.dst_host, f.dst_tenant, r)
+    print ""
+    agg = endpoint_rates(prob, x)
+    load = prob.load(x)
+    n = len(prob.hosts)
+    for dir, off in (('tx', 0), ('rx', n)):
+        for i, h in enumerate(prob.hosts):
+            tenants = sorted((t, r) for (d, host, t), r in agg.iteritems() if d == dir and host == h)
+            if not tenants:
+                continue
+            s = ', '.join("tenant %s %.4f" % tr for tr in tenants)
+            print "%s host %s: %.4f (%s)" % (dir, h, load[off + i], s)
+
+def main():
+    parser = argparse.ArgumentParser(description="Max-min / alpha-fair allocation.")
+    parser.add_argument('--file', required=True)
+    parser.add_argument('--alpha', type=float, default=None,
+                        help="Solve for alpha-fairness instead of max-min")
+    parser.add_argument('--per', choices=["flow", "endpoint"], default="flow",
+                        help="Fairness among flows, or among tenants at every port")
+    parser.add_argument('--weight', action="append", default=[], metavar="TID=W")
+    args = parser.parse_args()
+
+    weights = {}
+    for w in args.weight:
+        tid, value = w.split('=')
+        weights[tid] = float(value)
+    prob = Problem(parse_input(args.file), weights, args.per)
+    start = time.time()
+    if args.alpha is None:
+        x = maxmin(prob)
+    else:
+        x = alpha_fair(prob, args.alpha)
+    took = time.time() - start
+    show(prob, x)
+    print "\n%d flows solved in %.2f ms" % (len(x), took * 1e3)
+
+if __name__ == "__main__":
+    main()
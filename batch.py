@@ -0,0 +1,58 @@
+import os
+import re
+from collections import namedtuple
+
+# Result of one command in a batch.  status is None if the command was
+# never run because an earlier command failed with stop_on_error set.
+CmdResult = namedtuple('CmdResult', ['cmd', 'status', 'out', 'err'])
+
+class HostCmdError(Exception):
+    """A batched command exited with non-zero status."""
+    def __init__(self, addr, results):
+        self.addr = addr
+        self.results = results
+        failed = [r for r in results if r.status]
+        r = failed[0]
+        msg = "%s: '%s' exited with %d" % (addr, r.cmd, r.status)
+        if r.err.strip():
+            msg += ": %s" % r.err.strip()
+        Exception.__init__(self, msg)
+
+def new_marker():
+    return "__eyeq_%s__" % os.urandom(6).encode('hex')
+
+def batch_script(cmds, marker, stop_on_error=False):
+    """Build one shell script that runs cmds in order, in the current
+    shell (like joining them with ';'), and brackets each command's
+    stdout and stderr with marker lines carrying its exit status."""
+    lines = []
+    for i, c in enumerate(cmds):
+        begin = "%s %d begin" % (marker, i)
+        lines.append("echo '%s'; echo '%s' >&2" % (begin, begin))
+        # The newline before } lets commands end in ';' or '&'.
+        lines.append("{ :; %s\n}" % c)
+        end = "\\n%s %d end %%d\\n" % (marker, i)
+        lines.append("__rc=$?; printf '%s' $__rc; printf '%s' $__rc >&2" % (end, end))
+        if stop_on_error:
+            lines.append("[ $__rc -eq 0 ] || exit $__rc")
+    return '\n'.join(lines)
+
+def _split(text, marker):
+    # Each section is "<marker> i begin\n<output>\n<marker> i end rc\n";
+    # the newline before the end marker is ours, not the command's.
+    pat = re.compile(r'%s (\d+) begin\n(.*?)\n%s \1 end (\d+)\n' % (marker, marker), re.S)
+    return dict((int(i), (body, int(rc))) for i, body, rc in pat.findall(text))
+
+def parse_batch_output(cmds, marker, out, err):
+    """Demultiplex the stdout/stderr of a batch_script run into one
+    CmdResult per command."""
+    outs = _split(out, marker)
+    errs = _split(err, marker)
+    ret = []
+    for i, c in enumerate(cmds):
+        if i not in outs:
+            ret.append(CmdResult(c, None, '', ''))
+            continue
+        body, rc = outs[i]
+        ret.append(CmdResult(c, rc, body, errs.get(i, ('', rc))[0]))
+    return ret
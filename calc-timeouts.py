@@ -1,6 +1,9 @@
 #!/usr/bin/python
 import argparse
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "plots"))
+from ingest import parse_all
 
 parser = argparse.ArgumentParser(description="Calculate timeouts during experiments.")
 parser.add_argument('--dir', '-d',
@@ -25,10 +28,16 @@ def parse_file(f):
             ret[desc] = int(num)
     return ret
 
+def parse_dir(dir):
+    return (parse_file(os.path.join(dir, "netstat_begin.txt")),
+            parse_file(os.path.join(dir, "netstat_end.txt")))
+
 total = 0
-for dir in args.dir:
-    begin = parse_file(os.path.join(dir, "netstat_begin.txt"))
-    end = parse_file(os.path.join(dir, "netstat_end.txt"))
+results, failures = parse_all(parse_dir, args.dir)
+for dir, result in zip(args.dir, results):
+    if result is None:
+        continue
+    begin, end = result
 
     for k in begin.keys():
         timeouts = end[k] - begin[k]
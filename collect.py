@@ -0,0 +1,111 @@
+#!/usr/bin/python
+"""Pull experiment results from all hosts concurrently.
+
+Each host streams its result directory as a tar archive over its cached
+SSH transport, and the archive is unpacked locally as it arrives into
+exptdata/<exptid>/<expt>/<hostname>, the layout the plotters expect.
+There is no intermediate scp hop and no per-host serialisation.
+
+With incremental, each host keeps a stamp file in the result directory
+and only files modified since the last successful pull are sent.  That
+makes it cheap to sync the same directory repeatedly during a long run.
+
+    python tests/collect.py --dir /tmp/paggr --exptid Oct18-10:00"""
+
+import os
+import time
+import tarfile
+import argparse
+import termcolor as T
+from host import Host, HostList, host_ips, EXPTDATA_DIR
+from parallel import fanout, FanoutError
+
+SYNC_STAMP = ".eyeq-sync"
+
+def pull(host, dir, local_dir, compress=True, incremental=False):
+    """Copy dir on host into local_dir.  Returns the number of files
+    received."""
+    dir = os.path.abspath(dir)
+    if host.dryrun:
+        return 0
+    if not os.path.exists(local_dir):
+        os.makedirs(local_dir)
+    z = "z" if compress else ""
+    if incremental:
+        newer = "$([ -f %s ] && echo -newer %s)" % (SYNC_STAMP, SYNC_STAMP)
+        c = "cd %s && touch %s.new && " % (dir, SYNC_STAMP)
+        c += "find . -type f %s ! -name '%s*' -print0 | " % (newer, SYNC_STAMP)
+        c += "tar -c%sf - --null -T -" % z
+    else:
+        c = "tar -C %s -c%sf - ." % (dir, z)
+    host.log(c)
+    _, stdout, stderr = host.get().exec_command(c)
+    tar = tarfile.open(fileobj=stdout, mode="r|%s" % ("gz" if compress else ""))
+    nfiles = 0
+    for member in tar:
+        # Never write outside local_dir
+        if member.name.startswith('/') or '..' in member.name.split('/'):
+            continue
+        tar.extract(member, local_dir)
+        if member.isfile():
+            nfiles += 1
+    tar.close()
+    status = stdout.channel.recv_exit_status()
+    if status != 0:
+        raise IOError("%s: tar exited with %d: %s" % (host.addr, status, stderr.read().strip()))
+    if incremental:
+        # Only move the stamp once everything up to it is safely here
+        host.cmd("cd %s && mv %s.new %s" % (dir, SYNC_STAMP, SYNC_STAMP))
+    return nfiles
+
+def collect(hlist, dir, exptid, root=EXPTDATA_DIR, compress=True, incremental=False):
+    """Pull dir from every host in hlist into
+    root/<exptid>/<basename(dir)>/<hostname>, all hosts at once.  Raises
+    FanoutError, after listing them, if some hosts could not be
+    pulled; the others are complete.  Like Host.copy, does nothing
+    without an exptid or for /tmp itself."""
+    dir = os.path.abspath(dir)
+    if dir == "/tmp" or exptid is None:
+        return
+    expt = os.path.basename(dir)
+    root = os.path.expanduser(root)
+    start = time.time()
+
+    def one(h):
+        t0 = time.time()
+        local = os.path.join(root, exptid, expt, h.hostname())
+        n = pull(h, dir, local, compress, incremental)
+        print T.colored("  %s: %d files in %.2fs" % (h.addr, n, time.time() - t0), "green")
+        return n
+
+    results, errors = fanout(one, hlist.lst, hlist.max_workers)
+    failed = []
+    for h, e in zip(hlist.lst, errors):
+        if e is not None:
+            print T.colored("  %s: %s" % (h.addr, e), "red")
+            failed.append(h)
+    total = sum(n for n in results if n is not None)
+    print "collected %d files from %d hosts in %.2fs" % (total, len(hlist.lst) - len(failed),
+                                                         time.time() - start)
+    if failed:
+        raise FanoutError(results, errors, hlist.lst)
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect results from all hosts.")
+    parser.add_argument('--dir', required=True,
+                        help="Result directory on the hosts")
+    parser.add_argument('--exptid', required=True)
+    parser.add_argument('--root', default=EXPTDATA_DIR,
+                        help="Local exptdata directory")
+    parser.add_argument('--no-compress', dest="compress", action="store_false", default=True)
+    parser.add_argument('--incremental', action="store_true", default=False,
+                        help="Only fetch files changed since the last collect")
+    args = parser.parse_args()
+    hlist = HostList(*[Host(ip) for ip in host_ips])
+    try:
+        collect(hlist, args.dir, args.exptid, args.root, args.compress, args.incremental)
+    except FanoutError:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Notice as soon as jobs writing logs on the hosts have finished.
+
+A CompletionTracker keeps one `tail -F` per host open over the cached
+SSH connection, following all the log files at once.  grep on the host
+passes on only the tail headers and the lines that say a job is done,
+so a verbose log costs nothing on the wire.  wait() returns as soon as
+the last file has its done line, instead of at the next poll."""
+
+import os
+import pipes
+import threading
+import termcolor as T
+from remoteproc import RemoteProcess
+
+# Printed for files that do not exist when the tracker starts: a job
+# that was never started counts as done.
+MISSING_MARKER = "__eyeq_missing__"
+
+class CompletionTracker(object):
+    def __init__(self, hlist, files, pattern="client thread terminated", verbose=True):
+        self.hlist = hlist
+        self.files = list(files)
+        self.pattern = pattern
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        # (addr, file) -> True once done
+        self.done = {}
+        self.total = len(hlist.lst) * len(self.files)
+        self.finished = threading.Event()
+        self.procs = []
+
+    def _mark(self, addr, path, why):
+        with self.lock:
+            if (addr, path) in self.done:
+                return
+            self.done[(addr, path)] = True
+            n = len(self.done)
+        if self.verbose:
+            print T.colored("%s %s on %s (%d/%d)" % (os.path.basename(path), why, addr,
+                                                     n, self.total), "cyan")
+        if n == self.total:
+            self.finished.set()
+
+    def follower(self, host):
+        state = {'file': self.files[0] if self.files else None}
+        def on_line(line):
+            line = line.strip()
+            if line.startswith(MISSING_MARKER):
+                self._mark(host.addr, line.split(' ', 1)[1], "not running")
+            elif line.startswith("==> ") and line.endswith(" <=="):
+                state['file'] = line[4:-4]
+            elif self.pattern in line and state['file'] is not None:
+                self._mark(host.addr, state['file'], "completed")
+        return on_line
+
+    def start(self):
+        if self.total == 0:
+            self.finished.set()
+            return self
+        paths = ' '.join(pipes.quote(f) for f in self.files)
+        cmd = "for f in %s; do [ -f $f ] || echo %s $f; done; " % (paths, MISSING_MARKER)
+        # -n +1: jobs may have finished before we started watching.
+        # -v: headers even for a single file.
+        cmd += "tail -v -n +1 -F %s 2>/dev/null | " % paths
+        cmd += "grep --line-buffered -e '^==> .* <==$' -e %s" % pipes.quote(self.pattern)
+        for h in self.hlist.lst:
+            self.procs.append(RemoteProcess(h, cmd, maxlines=10, on_line=self.follower(h)))
+        return self
+
+    def wait(self, stopping=None, timeout=None):
+        """Wait until every file is done (returns True), stopping is
+        set or timeout seconds pass (returns False)."""
+        waited = 0
+        while not self.finished.isSet():
+            if stopping is not None and stopping.isSet():
+                break
+            if timeout is not None and waited >= timeout:
+                break
+            # A bounded wait keeps Ctrl-C working.
+            self.finished.wait(1)
+            waited += 1
+        return self.finished.isSet()
+
+    def pending(self):
+        with self.lock:
+            return [(h.addr, f) for h in self.hlist.lst for f in self.files
+                    if (h.addr, f) not in self.done]
+
+    def stop(self):
+        for p in self.procs:
+            p.kill()
+        self.procs = []
@@ -1,18 +1,34 @@
-
 import termcolor as T
 import sys
 import os
-from time import sleep
+import threading
+from time import sleep, time
+from tasks import Task, spawn, gather
+from telemetry import Telemetry
+from watchdog import Watchdog, parse_rule, span_needed, TenantRateBelow, CpuSaturated, NoData
+import pipes
 
-def progress(t):
+def progress(t, event=None):
+    """Count down t seconds.  Returns early (True) if event is set."""
     while t > 0:
         print T.colored('  %3d seconds left  \r' % (t), 'cyan'),
         t -= 1
         sys.stdout.flush()
-        sleep(1)
+        if event is None:
+            sleep(1)
+            continue
+        event.wait(1)
+        if event.isSet():
+            print '\r\n'
+            return True
     print '\r\n'
+    return False
 
 class Expt(object):
+    # Set by experiments whose stop() still waits for the workload and
+    # calls stop_watchdog() itself once it is done
+    watch_during_stop = False
+
     def __init__(self, opts):
         # Some default opts
         self._opts = {
@@ -22,8 +38,16 @@ class Expt(object):
         self._opts.update(opts)
         self._monitors = []
         self.procs = []
+        # Set to end the measurement phase early
+        self.stopping = threading.Event()
+        self.abort_reason = None
+        self.telemetry = None
+        self.watchdog = None
 
     def start(self):
+        """Set up and start the experiment.  May return a Task (or a
+        list of them) still running setup; run() waits for them before
+        the measurement phase."""
         pass
 
     def stop(self):
@@ -32,18 +56,106 @@ class Expt(object):
     def opts(self, name):
         return self._opts.get(name, None)
 
+    def spawn(self, fn, *args, **kwargs):
+        return spawn(fn, *args, **kwargs)
+
+    def phase(self, name, *tasks):
+        """Wait for tasks started in parallel and log how long the
+        phase took.  Returns their results."""
+        t0 = time()
+        if len(tasks) == 1 and type(tasks[0]) == list:
+            tasks = tasks[0]
+        ret = gather(list(tasks))
+        self.log(T.colored("%s done in %.2fs" % (name, time() - t0), "cyan"))
+        return ret
+
+    def measure(self, t):
+        """The timed phase; returns early if abort() is called."""
+        return progress(t, self.stopping)
+
+    def abort(self, reason=""):
+        if self.abort_reason is not None:
+            return
+        self.abort_reason = reason
+        self.log(T.colored("Aborting: %s" % reason, "red"))
+        self.stopping.set()
+        self.mark_failed(reason)
+
+    def mark_failed(self, reason):
+        """Leave a FAILED file with the reason in the result directory,
+        locally and on the hosts (so copy() brings it along)."""
+        dir = self.opts('dir')
+        path = os.path.join(dir, "FAILED")
+        try:
+            f = open(path, 'w')
+            f.write(reason + '\n')
+            f.close()
+        except IOError:
+            pass
+        hlist = getattr(self, 'hlist', None)
+        if hlist is not None:
+            try:
+                hlist.cmd("mkdir -p %s; echo %s > %s" % (dir, pipes.quote(reason), path))
+            except Exception, e:
+                self.log(T.colored("could not mark hosts failed: %s" % e, "red"))
+
+    def start_telemetry(self, hlist, port=None, console=True, span=60):
+        """Follow the monitors of hlist in opts('dir') live, keeping
+        span seconds of every series; serve the view on localhost:port
+        if given."""
+        self.telemetry = Telemetry(hlist, self.opts('dir'), span).start()
+        if port:
+            self.telemetry.serve(port)
+        if console:
+            self.telemetry.console()
+        return self.telemetry
+
+    def start_watchdog(self, hlist, rules, interval=5):
+        """Abort the run when one of rules (Rule objects or
+        "name:key=value,..." specs) fires."""
+        rules = [parse_rule(r) if isinstance(r, str) else r for r in rules]
+        live = (TenantRateBelow, CpuSaturated, NoData)
+        if [r for r in rules if isinstance(r, live)]:
+            span = span_needed(rules)
+            if self.telemetry is None:
+                self.start_telemetry(hlist, console=False, span=span)
+            else:
+                self.telemetry.set_span(span)
+        self.watchdog = Watchdog(self, hlist, rules, self.telemetry, interval).start()
+        return self.watchdog
+
+    def stop_watchdog(self):
+        """Stop the watchdog and telemetry before teardown, which kills
+        the processes and monitors they watch."""
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        if self.telemetry is not None:
+            self.telemetry.stop()
+            self.telemetry = None
+
     def run(self):
         try:
             dir = self.opts('dir')
             if not os.path.exists(dir):
                 os.makedirs(dir)
-            self.start()
+            ret = self.start()
+            if isinstance(ret, Task):
+                ret = [ret]
+            if type(ret) == list and len(ret) and isinstance(ret[0], Task):
+                self.phase("start", ret)
             t = self.opts('t')
-            progress(t)
+            self.measure(int(t))
         except KeyboardInterrupt:
             self.log("Stopping tests...")
+        if not self.watch_during_stop:
+            self.stop_watchdog()
         self.stop_monitors()
         self.stop()
+        self.stop_watchdog()
+        if self.abort_reason is not None:
+            # Lets sweep.py record this point as failed
+            sys.exit(1)
 
     def start_monitor(self, m):
         self._monitors.append(m)
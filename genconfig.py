@@ -1,90 +1,40 @@
+"""Traffic pattern configs for Siva's loadgen program.
+
+Every pattern is a generator of flow records (or, for paggr, lines of
+the l25 client input), so experiments can build a matrix in-process:
+
+    import genconfig
+    genconfig.write("~/vimal/exports/loadfiles/sort_1G_3", "sort",
+                    type="tcp", n=16, P=16, tenant=3, size="1G", port=12348)
+
+The addresses of the n hosts are worked out once per matrix, not once
+per flow.  Run as a script, it prints the config as before:
+
+    python tests/genconfig.py --traffic sort -n 16 -P 16 --tenant 3 --size 1G
+
+--traffic workload writes one line per flow instead, with sizes and
+arrival times drawn (with numpy) to offer a given load, e.g. web search
+flows at 40% of 10G in Poisson bursts:
+
+    python tests/genconfig.py --traffic workload -n 16 --tenant 2 --load 0.4 \\
+        --dist cdf:websearch.txt,1460 --arrivals onoff:50ms,150ms --time 120"""
+
 from host import *
+import os
+import sys
 import argparse
-from time import sleep
-import subprocess
-
-parser = argparse.ArgumentParser("Generate traffic pattern configs for Siva's loadgen program.")
-
-parser.add_argument('--time',
-                    dest="time",
-                    default="60")
-
-parser.add_argument('--port',
-                    dest="port",
-                    default="12345")
-
-parser.add_argument('--type',
-                    dest="type",
-                    default="tcp",
-                    choices=["tcp", "udp", "rpc"])
-
-parser.add_argument('-n',
-                    dest="n",
-                    type=int,
-                    help="Number of hosts",
-                    default=4)
-
-parser.add_argument('-P',
-                    dest="P",
-                    type=int,
-                    help="Number of parallel connections per host",
-                    default=1)
-
-parser.add_argument('--traffic',
-                    dest="traffic",
-                    choices=["fullmesh", "incast", "sort", "hotspot", "paggr"],
-                    default="incast")
-
-parser.add_argument('--pattern',
-                    dest="pattern",
-                    choices=["onoff", "longlived"],
-                    default="onoff")
-
-parser.add_argument('--size',
-                    dest="size",
-                    default="100M")
-
-parser.add_argument('--duration',
-                    dest="duration",
-                    help="Duration: Flow lasts till size runs out/duration expires.",
-                    default="86400s")
-
-parser.add_argument('--on-off',
-                    dest="on_off",
-                    help="duration,inter specified together",
-                    default=None)
-
-parser.add_argument('--tenant',
-                    dest="tenant",
-                    type=int,
-                    default=None)
-
-parser.add_argument('--repeat',
-                    dest="repeat",
-                    type=int,
-                    default=1000)
-
-parser.add_argument('--inter',
-                    dest="inter",
-                    default="10s")
-
-parser.add_argument('--start',
-                    dest="start",
-                    default="20.0")
-
-parser.add_argument('--stagger',
-                    dest="stagger",
-                    type=float,
-                    default=0.0)
-
-args = parser.parse_args()
-if args.on_off:
-    try:
-        args.duration, args.inter = args.on_off.split(',')
-    except:
-        pass
+from collections import namedtuple
+
+HEADER = "#src_ip dst_ip dst_port type seed start_time stop_time flow_size r/e repetitions time_between_flows r/e (rpc_delay r/e)"
+
+Flow = namedtuple('Flow', 'src dst port type seed start stop size repeat inter duration')
+
+def format_flow(f):
+    return "%s %s %s %s %s %.3f %s %s exact %s %.6f exact %.6f " % f
 
 def parse_size(s):
+    if isinstance(s, (int, long)):
+        return s
     if 'K' in s:
         size = int(s.replace('K','')) * 10**3
     elif 'M' in s:
@@ -98,6 +48,8 @@ def parse_size(s):
     return size
 
 def parse_duration(s):
+    if isinstance(s, (int, long, float)):
+        return float(s)
     d = 1e6
     if 'us' in s:
         d = float(s.replace('us', '')) * 1e-6
@@ -109,39 +61,41 @@ def parse_duration(s):
         d = float(s)
     return d
 
-# Simple full mesh
-def fullmesh(sort=False):
-    n = args.n
-    type = args.type.upper()
-    time = args.time
-    port = args.port
-    seed = 0
-    P = args.P
-    size = parse_size(args.size)
-    start = float(args.start)
-    stagger = float(args.stagger)
-    duration = parse_duration(args.duration)
-    inter = parse_duration(args.inter)
-    repeat = args.repeat
+def addresses(n, tenant=None, first=0):
+    """IPs of hosts first..first+n-1: their tenant IP if tenant is
+    given, else the 10G interface IP."""
+    if tenant:
+        return [Host(pick_host_ip(i)).get_tenant_ip(tenant) for i in xrange(first, first + n)]
+    return [pick_10g_ip(i) for i in xrange(first, first + n)]
+
+def _repeat(repeat):
+    if repeat == -1:
+        return 10**15
+    return repeat
 
-    if args.repeat == -1:
-        repeat = 10**15
+# Simple full mesh
+def fullmesh(n=4, P=1, type="tcp", time="60", port="12345", size="100M", start="20.0",
+             stagger=0.0, duration="86400s", inter="10s", repeat=1000, tenant=None,
+             sort=False, **ignored):
+    type = type.upper()
+    size = parse_size(size)
+    start = float(start)
+    stagger = float(stagger)
+    duration = parse_duration(duration)
+    inter = parse_duration(inter)
+    repeat = _repeat(repeat)
 
     if sort:
         # 1 day
         time = 86400
         pairs = n * (n-1)
         # Size is interpreted as total size of data to sort
-        size_per_flow = size / (pairs * P)
-        size = size_per_flow
+        size = size / (pairs * P)
         repeat = 1
 
-    print "#src_ip dst_ip dst_port type seed start_time stop_time flow_size r/e repetitions time_between_flows r/e (rpc_delay r/e)"
-
+    ips = addresses(n, tenant)
+    seed = 0
     for i in xrange(n):
-        hi = pick_10g_ip(i)
-        if args.tenant:
-            hi = Host(pick_host_ip(i)).get_tenant_ip(args.tenant)
         idx = -1
         for j in xrange(n):
             if i == j:
@@ -149,117 +103,367 @@ def fullmesh(sort=False):
             idx += 1
             for p in xrange(P):
                 seed += 1
-                hj = pick_10g_ip(j)
-                if args.tenant:
-                    hj = Host(pick_host_ip(j)).get_tenant_ip(args.tenant)
-                out = "%s %s " % (hi, hj)
-                out += "%s %s %s " % (port, type, seed)
-                out += "%.3f %s " % (start + idx*stagger, time)
-                out += "%s exact " % size
-                out += "%s %.6f exact " % (repeat, inter)
-                out += "%.6f " % duration
-                print out
-
-def nto1():
-    n = args.n
-    type = args.type.upper()
-    time = args.time
-    port = args.port
+                yield Flow(ips[i], ips[j], port, type, seed, start + idx*stagger, time,
+                           size, repeat, inter, duration)
+
+def sort(**kwargs):
+    """size is the total amount of data sorted, split evenly across all
+    n*(n-1)*P flows."""
+    kwargs['sort'] = True
+    return fullmesh(**kwargs)
+
+def nto1(n=4, P=1, type="tcp", time="60", port="12345", size="100M", start="20.0",
+         duration="86400s", inter="10s", repeat=1000, tenant=None, **ignored):
+    type = type.upper()
+    size = parse_size(size)
+    start = float(start)
+    duration = parse_duration(duration)
+    inter = parse_duration(inter)
+    repeat = _repeat(repeat)
+
+    ips = addresses(n, tenant)
     seed = 0
-    size = parse_size(args.size)
-    duration = parse_duration(args.duration)
-    P = args.P
-    start = args.start
-    inter = parse_duration(args.inter)
-    repeat = args.repeat
-
-    if repeat == -1:
-        repeat = 10**15
-
-    print "#src_ip dst_ip dst_port type seed start_time stop_time flow_size r/e repetitions time_between_flows r/e (rpc_delay r/e)"
-
-    h0 = pick_10g_ip(0)
-    if args.tenant:
-        h0 = Host(pick_host_ip(0)).get_tenant_ip(args.tenant)
-    for i in xrange(2,n):
-        hi = pick_10g_ip(i)
-        if args.tenant:
-            hi = Host(pick_host_ip(i)).get_tenant_ip(args.tenant)
+    for i in xrange(2, n):
         for p in xrange(P):
             seed += 1
-            out = "%s %s " % (hi, h0)
-            out += "%s %s %s " % (port, type, seed)
-            out += "%s %s " % (start, time)
-            out += "%s exact " % size
-            out += "%s %.6f exact " % (repeat, inter)
-            out += "%.6f " % duration
-            print out
-
-def hotspot():
-    n = args.n
-    type = args.type.upper()
-    time = args.time
-    port = args.port
+            yield Flow(ips[i], ips[0], port, type, seed, start, time,
+                       size, repeat, inter, duration)
+
+def hotspot(n=4, type="tcp", time="60", port="12345", size="100M",
+            duration="86400s", inter="10s", repeat=1000, tenant=None, **ignored):
+    type = type.upper()
+    size = parse_size(size)
+    duration = parse_duration(duration)
+    inter = parse_duration(inter)
+    repeat = _repeat(repeat)
+
+    ips = addresses(n, tenant)
     seed = 0
-    size = parse_size(args.size)
-    P = args.P
-    start = args.start
-    inter = parse_duration(args.inter)
-    duration = parse_duration(args.duration)
-    repeat = args.repeat
-    if repeat == -1:
-        repeat = 10**15
-
-    print "#src_ip dst_ip dst_port type seed start_time stop_time flow_size r/e repetitions time_between_flows r/e (rpc_delay r/e)"
-
     for i in xrange(n):
         # all send to host i
-        hi = pick_10g_ip(i)
-        if args.tenant:
-            hi = Host(pick_host_ip(i)).get_tenant_ip(args.tenant)
         start = i * 4
         for j in xrange(n):
             if i == j:
                 continue
             seed += 1
-            hj = pick_10g_ip(j)
-            if args.tenant:
-                hj = Host(pick_host_ip(j)).get_tenant_ip(args.tenant)
-            out = "%s %s " % (hj, hi)
-            out += "%s %s %s " % (port, type, seed)
-            out += "%s %s " % (start, time)
-            out += "%s exact " % size
-            out += "%s %.6f exact " % (repeat, inter)
-            out += "%.6f " % duration
-            print out
-    return
-
-def partition_aggregate():
+            yield Flow(ips[j], ips[i], port, type, seed, start, time,
+                       size, repeat, inter, duration)
+
+def partition_aggregate(n=4, P=1, size="100M", repeat=1000, tenant=None, **ignored):
     # One client, N-1 servers
     # client requires input file.  Server doesn't
-    n = args.n
-    size = parse_size(args.size)
-    P = args.P
-    repeat = args.repeat
-    tenant = args.tenant
-    print "bindaddress %s" % Host(pick_host_ip(0)).get_tenant_ip(tenant)
-    print "destinations %d" % (n * int(P))
+    size = parse_size(size)
+    ips = addresses(n + 1, tenant)
+    yield "bindaddress %s" % ips[0]
+    yield "destinations %d" % (n * int(P))
     for i in xrange(n):
-        hi = Host(pick_host_ip(i+1)).get_tenant_ip(tenant)
         for j in xrange(P):
-            print "0 dest %s %s -1" % (hi, 5001)
-    print "size %s" % size
-    print "iterations %s" % repeat
-    print "l25 0"
-    return
-
-if args.traffic == "fullmesh":
-    fullmesh()
-elif args.traffic == "incast":
-    nto1()
-elif args.traffic == "sort":
-    fullmesh(sort=True)
-elif args.traffic == "hotspot":
-    hotspot()
-elif args.traffic == "paggr":
-    partition_aggregate()
+            yield "0 dest %s %s -1" % (ips[i+1], 5001)
+    yield "size %s" % size
+    yield "iterations %s" % repeat
+    yield "l25 0"
+
+# Workload models: individual flows with sizes drawn from a
+# distribution and arrival times from a Poisson or on/off process,
+# offering a target fraction of each sender's link capacity.  Flows
+# are drawn as arrays, so numpy is only needed for these.
+
+def load_cdf(path):
+    """(sizes, probs) of a flow size CDF file: "size [...] cdf" lines,
+    as in the usual web search and data mining distributions."""
+    import numpy as np
+    sizes, probs = [], []
+    for line in open(os.path.expanduser(path)):
+        line = line.split('#', 1)[0].split()
+        if len(line) < 2:
+            continue
+        sizes.append(float(line[0]))
+        probs.append(float(line[-1]))
+    sizes, probs = np.array(sizes), np.array(probs)
+    if probs[-1] > 1:
+        # Percentages
+        probs /= 100.0
+    if probs[0] > 0:
+        sizes = np.concatenate([[sizes[0]], sizes])
+        probs = np.concatenate([[0.0], probs])
+    return sizes, probs
+
+def size_sampler(dist, size):
+    """(mean, sample(rng, count)) for dist: exact, exp, pareto:ALPHA
+    (all with mean size) or cdf:FILE[,SCALE]."""
+    import numpy as np
+    size = float(parse_size(size))
+    name, _, arg = dist.partition(':')
+    if name == "exact":
+        return size, lambda rng, k: np.repeat(size, k)
+    if name == "exp":
+        return size, lambda rng, k: rng.exponential(size, k)
+    if name == "pareto":
+        alpha = float(arg or 1.1)
+        if alpha <= 1:
+            # The mean is infinite, so no scale gives the requested one
+            raise ValueError("pareto needs alpha > 1, not %s" % arg)
+        xm = size * (alpha - 1) / alpha
+        return size, lambda rng, k: xm * (1 + rng.pareto(alpha, k))
+    if name == "cdf":
+        # cdf:FILE,SCALE for CDFs given in packets or KB
+        path, _, scale = arg.rpartition(',')
+        try:
+            scale = float(scale)
+        except ValueError:
+            path, scale = arg, 1.0
+        sizes, probs = load_cdf(path)
+        sizes = sizes * scale
+        # Linear interpolation between the points of the CDF
+        mean = np.sum(np.diff(probs) * (sizes[1:] + sizes[:-1]) / 2)
+        return mean, lambda rng, k: np.interp(rng.random_sample(k), probs, sizes)
+    raise ValueError("unknown size distribution %s" % dist)
+
+def arrival_times(rng, rate, start, span, arrivals="poisson"):
+    """Sorted arrival times in [start, start+span) of a Poisson process
+    with mean rate, or for "onoff:ON,OFF" one that only runs during on
+    periods (exponential, mean ON and OFF seconds) at a rate that keeps
+    the same mean."""
+    import numpy as np
+    name, _, arg = arrivals.partition(':')
+    if name == "poisson":
+        k = rng.poisson(rate * span)
+        return start + np.sort(rng.uniform(0, span, k))
+    if name != "onoff":
+        raise ValueError("unknown arrival process %s" % arrivals)
+    try:
+        on, off = [parse_duration(x) for x in arg.split(',')]
+    except ValueError:
+        raise ValueError("onoff needs ON,OFF durations, not %s" % arg)
+    if on <= 0 or off < 0:
+        raise ValueError("onoff needs ON > 0 and OFF >= 0, not %s" % arg)
+    # Enough periods to cover span (and then some)
+    m = int(2 * span / (on + off)) + 10
+    lengths = np.empty(2 * m)
+    lengths[0::2] = rng.exponential(on, m)
+    lengths[1::2] = rng.exponential(off, m)
+    # Random phase: start somewhere in the first cycle
+    edges = np.concatenate([[0.0], np.cumsum(lengths)]) - rng.uniform(0, on + off)
+    ons = np.clip(edges[0::2][:m], 0, span), np.clip(edges[1::2][:m], 0, span)
+    busy = ons[1] - ons[0]
+    total = busy.sum()
+    if total == 0:
+        return np.empty(0)
+    k = rng.poisson(rate * (on + off) / on * total)
+    # Uniform over the on time, then mapped back to wall clock
+    x = np.sort(rng.uniform(0, total, k))
+    cum = np.concatenate([[0.0], np.cumsum(busy)])
+    i = np.searchsorted(cum, x, side='right') - 1
+    return start + ons[0][i] + (x - cum[i])
+
+def workload(n=4, type="tcp", time="60", port="12345", size="100K", start="20.0",
+             span=None, load=0.5, capacity="10G", dist="exp", arrivals="poisson",
+             dests="fullmesh", tenant=None, rng_seed=0, **ignored):
+    """One line per flow: every host sends flows of dist sizes at
+    arrivals times to a random other host (fullmesh) or host 0
+    (incast), offering load * capacity (bits/s) from each sender
+    between start and start+span (default: until time).  Yields the
+    header and then blocks of lines."""
+    import numpy as np
+    type = type.upper()
+    start = float(start)
+    if span is None:
+        span = float(time) - start
+    span = float(span)
+    mean, sample = size_sampler(dist, size)
+    # Resolve the addresses first: a bad tenant or host count should
+    # fail before the flows are drawn
+    ips = np.array(addresses(n, tenant), dtype=object)
+    rate = float(load) * parse_size(capacity) / (8 * mean)
+    rng = np.random.RandomState(int(rng_seed))
+
+    if dests == "incast":
+        senders = range(1, n)
+    else:
+        senders = range(n)
+    times, srcs = [], []
+    for i in senders:
+        t = arrival_times(rng, rate, start, span, arrivals)
+        times.append(t)
+        srcs.append(np.repeat(i, len(t)))
+    times = np.concatenate(times)
+    srcs = np.concatenate(srcs).astype(int)
+    order = np.argsort(times, kind='mergesort')
+    times, srcs = times[order], srcs[order]
+    k = len(times)
+    if dests == "incast":
+        dsts = np.zeros(k, dtype=int)
+    else:
+        dsts = (srcs + rng.randint(1, n, k)) % n
+    sizes = np.maximum(sample(rng, k), 1).astype(np.int64)
+
+    yield HEADER
+    fmt = "%%s %%s %s %s %%d %%.6f %s %%d exact 1 0.000000 exact 86400.000000 " % (port, type, time)
+    block = 1 << 16
+    for lo in xrange(0, k, block):
+        hi = min(k, lo + block)
+        rows = zip(ips[srcs[lo:hi]].tolist(), ips[dsts[lo:hi]].tolist(),
+                   xrange(lo + 1, hi + 1), times[lo:hi].tolist(), sizes[lo:hi].tolist())
+        yield '\n'.join([fmt % r for r in rows])
+
+TRAFFIC = {
+    "fullmesh": fullmesh,
+    "incast": nto1,
+    "sort": sort,
+    "hotspot": hotspot,
+    "paggr": partition_aggregate,
+    "workload": workload,
+}
+
+def generate(traffic, **opts):
+    """Lines (without newlines) of the config for traffic; workload
+    yields blocks of lines to keep million-flow matrices fast."""
+    records = TRAFFIC[traffic](**opts)
+    if traffic in ["paggr", "workload"]:
+        return records
+    return _lines(records)
+
+def _lines(flows):
+    yield HEADER
+    for f in flows:
+        yield format_flow(f)
+
+def write(out, traffic, **opts):
+    """Write the config for traffic to out (a path or a file object)."""
+    if hasattr(out, 'write'):
+        out.writelines(l + '\n' for l in generate(traffic, **opts))
+        return
+    path = os.path.expanduser(out)
+    tmp = path + ".tmp"
+    f = open(tmp, 'w', 1 << 20)
+    try:
+        f.writelines(l + '\n' for l in generate(traffic, **opts))
+    finally:
+        f.close()
+    os.rename(tmp, path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser("Generate traffic pattern configs for Siva's loadgen program.")
+
+    parser.add_argument('--time',
+                        dest="time",
+                        default="60")
+
+    parser.add_argument('--port',
+                        dest="port",
+                        default="12345")
+
+    parser.add_argument('--type',
+                        dest="type",
+                        default="tcp",
+                        choices=["tcp", "udp", "rpc"])
+
+    parser.add_argument('-n',
+                        dest="n",
+                        type=int,
+                        help="Number of hosts",
+                        default=4)
+
+    parser.add_argument('-P',
+                        dest="P",
+                        type=int,
+                        help="Number of parallel connections per host",
+                        default=1)
+
+    parser.add_argument('--traffic',
+                        dest="traffic",
+                        choices=sorted(TRAFFIC.keys()),
+                        default="incast")
+
+    parser.add_argument('--pattern',
+                        dest="pattern",
+                        choices=["onoff", "longlived"],
+                        default="onoff")
+
+    parser.add_argument('--size',
+                        dest="size",
+                        default="100M")
+
+    parser.add_argument('--duration',
+                        dest="duration",
+                        help="Duration: Flow lasts till size runs out/duration expires.",
+                        default="86400s")
+
+    parser.add_argument('--on-off',
+                        dest="on_off",
+                        help="duration,inter specified together",
+                        default=None)
+
+    parser.add_argument('--tenant',
+                        dest="tenant",
+                        type=int,
+                        default=None)
+
+    parser.add_argument('--repeat',
+                        dest="repeat",
+                        type=int,
+                        default=1000)
+
+    parser.add_argument('--inter',
+                        dest="inter",
+                        default="10s")
+
+    parser.add_argument('--start',
+                        dest="start",
+                        default="20.0")
+
+    parser.add_argument('--load',
+                        dest="load",
+                        type=float,
+                        help="workload: offered load per sender, as a fraction of --capacity",
+                        default=0.5)
+
+    parser.add_argument('--capacity',
+                        dest="capacity",
+                        help="workload: link capacity in bits/s",
+                        default="10G")
+
+    parser.add_argument('--dist',
+                        dest="dist",
+                        help="workload: flow sizes, exact, exp, pareto:ALPHA (mean --size) or cdf:FILE[,SCALE]",
+                        default="exp")
+
+    parser.add_argument('--arrivals',
+                        dest="arrivals",
+                        help="workload: poisson, or onoff:ON,OFF (mean seconds) for bursts",
+                        default="poisson")
+
+    parser.add_argument('--dests',
+                        dest="dests",
+                        choices=["fullmesh", "incast"],
+                        default="fullmesh")
+
+    parser.add_argument('--span',
+                        dest="span",
+                        help="workload: seconds of arrivals after --start (default until --time)",
+                        default=None)
+
+    parser.add_argument('--rng-seed',
+                        dest="rng_seed",
+                        type=int,
+                        default=0)
+
+    parser.add_argument('--stagger',
+                        dest="stagger",
+                        type=float,
+                        default=0.0)
+
+    args = parser.parse_args()
+    if args.on_off:
+        try:
+            args.duration, args.inter = args.on_off.split(',')
+        except:
+            pass
+    opts = dict(vars(args))
+    traffic = opts.pop('traffic')
+    del opts['on_off'], opts['pattern']
+    write(sys.stdout, traffic, **opts)
+
+if __name__ == "__main__":
+    main()
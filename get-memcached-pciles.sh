@@ -2,14 +2,15 @@
 
 files="mcperf-0-*.txt mcperf-1-*.txt mcperf-2-*.txt mcperf-3-*.txt"
 
+sketch=$(dirname $0)/plots/sketch.py
+
+# Percentiles (ms, as before) of the response time histograms of all
+# clients merged, not the average of each client's percentiles.  One
+# "<p>pc <ms>" line per percentile, where this used to print "50pc" on
+# one line and "95pc .. 99pc .. 99.9pc .." on the next.
 function get_pciles {
     ls $1
-    (for file in `find $1 -type f -iname 'mcperf*'`; do
-    	grep 'Response time \[ms\]: p2' $file
-    done) | less | awk '{ pc50 += $7; } END { print "50pc", pc50/NR; }'
-    (for file in `find $1 -type f -iname 'mcperf*'`; do
-    	grep 'Response time \[ms\]: p9' $file
-    done) | awk '{ pc95 += $5; pc99 += $7; pc999 += $9 } END { print "95pc", pc95/NR, "99pc", pc99/NR, "99.9pc", pc999/NR; }'
+    python $sketch --unit ms --pciles 50,95,99,99.9 `find $1 -type f -iname 'mcperf*'`
 }
 
 for workload in ~/vimal/exports/memcached_cluster/*; do
@@ -1,6 +1,6 @@
 #!/bin/bash
 
-exptid=`date +%b%d-%H:%M`
+exptid=${1:-`date +%b%d-%H:%M`}
 time=120
 start=`date`
 
@@ -13,18 +13,17 @@ trap ctrlc SIGINT
 
 echo exptid $exptid
 
-for mtu in 9000; do
-for size in 10T; do
-for iso in "" "--inv-weighted"; do # other valid options "--enable" and "--weighted"
-for nhadoop in 3; do
-	subdir=size$size-iso$iso-mtu$mtu-nhadoop$nhadoop
-	python tests/test_hadoop_trace.py --mtu $mtu \
-		--dir /tmp/$exptid/$subdir --size $size \
-		--exptid $exptid $iso --nhadoop $nhadoop
-done
-done
-done
-done
+# One python process for the whole sweep; rerunning with the same
+# exptid (./hadoop-multi.sh <exptid>) resumes after the last completed point.
+# iso: other valid options "--enable" and "--weighted"
+python tests/sweep.py tests/test_hadoop_trace.py --exptid $exptid \
+	--grid mtu=9000 --grid size=10T --grid iso=,--inv-weighted --grid nhadoop=3 \
+	--order mtu,iso \
+	--args "--mtu {mtu} --dir /tmp/{exptid}/size{size}-iso{iso}-mtu{mtu}-nhadoop{nhadoop} \
+		--size {size} --exptid {exptid} {iso} --nhadoop {nhadoop} --reconcile"
+
+# Tenants are left in place between runs with --reconcile
+python tests/test_hadoop_trace.py --destroy
 
 # Plot the output
 pushd ~/vimal/10g/exptdata/$exptid
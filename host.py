@@ -4,28 +4,77 @@ from subprocess import Popen
 import termcolor as T
 import os
 import socket
+import threading
 from time import sleep
 from config.packard import *
+from parallel import fanout, fanout_check, FanoutError, MAX_WORKERS
+from batch import CmdResult, HostCmdError, new_marker, batch_script, parse_batch_output
+from agent import Agent, AgentError, SSHAgent, LocalAgent
+from remoteproc import RemoteProcess
+from tasks import spawn
+
+PERFISO_PROC = "/proc/sys/perfiso"
+PERFISO_PARAMS = "/sys/module/perfiso/parameters"
+# Where results are collected, on the copy destination (l1)
+EXPTDATA_DIR = "~/vimal/10g/exptdata"
+# Tenant configuration last applied by topology.Topology
+TOPOLOGY_STATE_FILE = "/tmp/eyeq-topology.json"
+
+# Serialises console output from hosts driven in parallel by HostList
+_log_lock = threading.Lock()
 
 class HostList(object):
-    def __init__(self, *lst):
+    """A list of hosts; calling a Host method on the list calls it on
+    every host concurrently and returns the results in host order.  If
+    any host raised, a FanoutError carrying every host's result and
+    exception is raised once all hosts have finished."""
+    def __init__(self, *lst, **kwargs):
         self.lst = list(lst)
+        self.max_workers = kwargs.get('max_workers', MAX_WORKERS)
 
     def append(self, host):
         self.lst.append(host)
 
+    def set_max_workers(self, n):
+        self.max_workers = n
+
+    def fanout(self, name, *args, **kwargs):
+        """Call method name on all hosts and return (results, errors)
+        without raising."""
+        fn = lambda h: h.__getattribute__(name)(*args, **kwargs)
+        return fanout(fn, self.lst, self.max_workers)
+
+    def spawn(self, name, *args, **kwargs):
+        """Start calling method name on all hosts and return a Task for
+        the list of results, so other work can overlap with it."""
+        return spawn(self.__getattribute__(name), *args, **kwargs)
+
     def __getattribute__(self, name, *args):
         try:
             return object.__getattribute__(self, name)
         except AttributeError:
-            ret = lambda *args: map(lambda h: h.__getattribute__(name)(*args), self.lst)
+            def ret(*args, **kwargs):
+                fn = lambda h: h.__getattribute__(name)(*args, **kwargs)
+                return fanout_check(fn, self.lst, self.max_workers)
             return ret
 
     def __iter__(self):
-        return self.lst
+        return iter(self.lst)
 
 class Host(object):
     _ssh_cache = {}
+    _sftp_cache = {}
+    _agent_cache = {}
+    # Per-address locks, so that connecting to one host does not hold
+    # up the others
+    _addr_locks = {}
+    _addr_locks_lock = threading.Lock()
+
+    @classmethod
+    def _lock(cls, addr):
+        with cls._addr_locks_lock:
+            return cls._addr_locks.setdefault(addr, threading.RLock())
+
     def __init__(self, addr):
         self.addr = addr
         self.tenants = []
@@ -34,6 +83,10 @@ class Host(object):
         self.delay = False
         self.delayed_cmds = []
         self.dryrun = False
+        # Raise HostCmdError from batched commands instead of logging
+        self.strict = False
+        # Send commands and perfiso writes through a persistent agent
+        self.use_agent = False
         self.added_root_qdisc = False
         self.ip_to_classids = {}
         self.next_classid = 1
@@ -42,22 +95,65 @@ class Host(object):
     def set_dryrun(self, state=True):
         self.dryrun = state
 
+    def set_strict(self, state=True):
+        self.strict = state
+
+    def set_agent(self, state=True):
+        """Enable agent mode.  state may also be an Agent instance
+        (e.g. a LocalAgent) to use for this host's address."""
+        if isinstance(state, Agent):
+            with Host._lock(self.addr):
+                Host._agent_cache[self.addr] = state
+            state = True
+        self.use_agent = state
+
     def get(self):
-        ssh = Host._ssh_cache.get(self.addr, None)
-        if ssh is None or ssh._transport is None:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(self.addr, username=SSH_USERNAME,
-                        password=SSH_PASSWORD, key_filename=SSH_KEYFILE)
-            ssh.get_transport().set_keepalive(interval=5)
-            Host._ssh_cache[self.addr] = ssh
+        # Several Host objects for the same address (e.g. the copy
+        # destination) may connect concurrently from HostList threads.
+        with Host._lock(self.addr):
+            ssh = Host._ssh_cache.get(self.addr, None)
+            if ssh is None or ssh._transport is None:
+                ssh = paramiko.SSHClient()
+                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                ssh.connect(self.addr, username=SSH_USERNAME,
+                            password=SSH_PASSWORD, key_filename=SSH_KEYFILE)
+                ssh.get_transport().set_keepalive(interval=5)
+                Host._ssh_cache[self.addr] = ssh
         return ssh
 
+    def get_agent(self):
+        """Return the agent for this host, starting it over the cached
+        SSH connection if it is not running."""
+        with Host._lock(self.addr):
+            agent = Host._agent_cache.get(self.addr, None)
+            if agent is None or agent.closed:
+                agent = SSHAgent(self.get())
+                Host._agent_cache[self.addr] = agent
+        return agent
+
+    def get_sftp(self):
+        """Return an SFTP session on the cached SSH transport."""
+        with Host._lock(self.addr):
+            ssh = self.get()
+            sftp = Host._sftp_cache.get(self.addr, None)
+            if sftp is None or sftp.sock.closed or sftp.sock.get_transport() is not ssh.get_transport():
+                sftp = ssh.open_sftp()
+                Host._sftp_cache[self.addr] = sftp
+        return sftp
+
+    def stop_agent(self):
+        with Host._lock(self.addr):
+            agent = Host._agent_cache.pop(self.addr, None)
+        if agent is not None:
+            agent.close()
+
     def cmd(self, c, dryrun=False):
         self.log(c)
         if not self.delay:
             if dryrun or self.dryrun:
                 return (self.addr, c)
+            if self.use_agent:
+                return self.get_agent().sh(c).out
             ssh = self.get()
             out = ssh.exec_command(c)[1].read()
             return out
@@ -65,24 +161,52 @@ class Host(object):
             self.delayed_cmds.append(c)
         return (self.addr, c)
 
-    def delayed_cmds_execute(self):
+    def cmd_task(self, c):
+        """Run c in the background; returns a Task for its output."""
+        return spawn(self.cmd, c)
+
+    def delayed_cmds_execute(self, stop_on_error=None):
         if len(self.delayed_cmds) == 0:
             return None
         self.delay = False
-        ssh = self.get()
-        cmds = ';'.join(self.delayed_cmds)
-        out = ssh.exec_command(cmds)[1].read()
+        cmds = self.delayed_cmds
         self.delayed_cmds = []
-        return out
-
-    def cmd_async(self, c, dryrun=False):
+        return self.cmd_batch(cmds, stop_on_error)
+
+    def cmd_batch(self, cmds, stop_on_error=None):
+        """Run cmds in a single exec channel and return a CmdResult
+        (exit status, stdout, stderr) for each of them.  With
+        stop_on_error, the batch stops at the first failing command
+        and HostCmdError is raised; otherwise failures are logged.
+        stop_on_error defaults to the host's strict setting."""
+        if stop_on_error is None:
+            stop_on_error = self.strict
+        if self.dryrun:
+            return None
+        marker = new_marker()
+        ssh = self.get()
+        _, stdout, stderr = ssh.exec_command(batch_script(cmds, marker, stop_on_error))
+        out = stdout.read()
+        err = stderr.read()
+        results = parse_batch_output(cmds, marker, out, err)
+        failed = [r for r in results if r.status]
+        if failed and stop_on_error:
+            raise HostCmdError(self.addr, results)
+        for r in failed:
+            self.log_error("'%s' exited with %d: %s" % (r.cmd, r.status, r.err.strip()))
+        return results
+
+    def cmd_async(self, c, dryrun=False, out=None):
+        """Start c in the background and return a RemoteProcess that
+        drains its output (into local file out, if given).  The process
+        is tracked in self.procs and killed by killall."""
         self.log(c)
         if not self.delay:
             if dryrun or self.dryrun:
                 return (self.addr, c)
-            ssh = self.get()
-            out = ssh.exec_command(c)
-            return out
+            proc = RemoteProcess(self, c, out=out)
+            self.procs.append(proc)
+            return proc
         else:
             self.delayed_cmds.append(c)
         return (self.addr, c)
@@ -91,50 +215,140 @@ class Host(object):
         if len(self.delayed_cmds) == 0:
             return None
         self.delay = False
-        ssh = self.get()
         cmds = ';'.join(self.delayed_cmds)
-        out = ssh.exec_command(cmds)[1]
         self.delayed_cmds = []
-        return out
+        proc = RemoteProcess(self, cmds)
+        self.procs.append(proc)
+        return proc
 
     def log(self, c):
         addr = T.colored(self.addr, "magenta")
         c = T.colored(c, "grey", attrs=["bold"])
-        print "%s: %s" % (addr, c)
+        with _log_lock:
+            print "%s: %s" % (addr, c)
+
+    def log_error(self, s):
+        addr = T.colored(self.addr, "magenta")
+        with _log_lock:
+            print "%s: %s" % (addr, T.colored(s, "red"))
+
+    def write_file(self, path, data, newline=False):
+        """Write data to a (sysfs/procfs) file directly, through the
+        agent in agent mode and over SFTP otherwise.  While commands
+        are being delayed it becomes an echo in the batch instead.
+        Failed writes are logged, or raised as IOError if strict."""
+        if self.delay:
+            if newline:
+                return self.cmd("echo %s > %s" % (data, path))
+            return self.cmd("echo -n %s > %s" % (data, path))
+        self.log("write %s < '%s'" % (path, data))
+        if self.dryrun:
+            return (self.addr, path)
+        if newline:
+            data = "%s\n" % data
+        try:
+            if self.use_agent:
+                try:
+                    self.get_agent().write(path, data)
+                except AgentError, e:
+                    raise IOError(str(e))
+            else:
+                f = self.get_sftp().open(path, 'w')
+                try:
+                    f.write(str(data))
+                finally:
+                    f.close()
+        except IOError, e:
+            if self.strict:
+                raise
+            self.log_error("write %s failed: %s" % (path, e))
+
+    def read_file(self, path):
+        if self.use_agent:
+            try:
+                return self.get_agent().read(path)
+            except AgentError, e:
+                raise IOError(str(e))
+        f = self.get_sftp().open(path, 'r')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def list_dir(self, path):
+        if self.use_agent:
+            return self.get_agent().sh("ls %s" % path).out.split()
+        return self.get_sftp().listdir(path)
 
     def perfiso_set(self, name, value):
-        c = "echo %s > /proc/sys/perfiso/%s" % (value, name)
-        self.cmd(c)
+        self.write_file("%s/%s" % (PERFISO_PROC, name), value, newline=True)
+
+    def perfiso_get(self, name):
+        """Current value of a /proc/sys/perfiso tunable, as an int where
+        it looks like one."""
+        value = self.read_file("%s/%s" % (PERFISO_PROC, name)).strip()
+        try:
+            return int(value)
+        except ValueError:
+            return value
+
+    def perfiso_params(self):
+        """All /proc/sys/perfiso tunables and their current values."""
+        return dict((name, self.perfiso_get(name))
+                    for name in self.list_dir(PERFISO_PROC))
+
+    def perfiso_apply(self, params, verify=False):
+        """Set a dict of /proc/sys/perfiso tunables.  With verify, read
+        them back and return the ones that did not take as a dict
+        name -> (wanted, got).  On a HostList this applies the same
+        dict to every host concurrently."""
+        for name in sorted(params.keys()):
+            self.perfiso_set(name, params[name])
+        if verify and not self.dryrun:
+            return self.perfiso_verify(params)
+        return {}
+
+    def perfiso_verify(self, params):
+        bad = {}
+        for name, want in params.iteritems():
+            try:
+                got = self.perfiso_get(name)
+            except IOError:
+                got = None
+            if str(got) != str(want).strip():
+                bad[name] = (want, got)
+        for name, (want, got) in bad.iteritems():
+            self.log_error("perfiso %s is %s, wanted %s" % (name, got, want))
+        return bad
 
     def perfiso_create_txc(self, name):
         dev = self.get_10g_dev()
-        c = "echo -n dev %s %s > /sys/module/perfiso/parameters/create_txc" % (dev, name)
-        self.cmd(c)
+        self.write_file("%s/create_txc" % PERFISO_PARAMS,
+                        "dev %s %s" % (dev, name))
 
     def perfiso_create_vq(self, name):
         dev = self.get_10g_dev()
-        c = "echo -n dev %s %s > /sys/module/perfiso/parameters/create_vq" % (dev, name)
-        self.cmd(c)
+        self.write_file("%s/create_vq" % PERFISO_PARAMS,
+                        "dev %s %s" % (dev, name))
 
     def perfiso_assoc_txc_vq(self, txc, vq):
         dev = self.get_10g_dev()
-        c = "echo -n dev %s associate txc %s vq %s > /sys/module/perfiso/parameters/assoc_txc_vq"
-        c = c % (dev, txc, vq)
-        self.cmd(c)
+        self.write_file("%s/assoc_txc_vq" % PERFISO_PARAMS,
+                        "dev %s associate txc %s vq %s" % (dev, txc, vq))
 
     def perfiso_set_vq_weight(self, vq, weight):
         dev = self.get_10g_dev()
-        c = "echo -n dev %s %s weight %s > /sys/module/perfiso/parameters/set_vq_weight" % (dev, vq, weight)
-        self.cmd(c)
+        self.write_file("%s/set_vq_weight" % PERFISO_PARAMS,
+                        "dev %s %s weight %s" % (dev, vq, weight))
 
     def perfiso_set_txc_weight(self, vq, weight):
         dev = self.get_10g_dev()
-        c = "echo -n dev %s %s weight %s > /sys/module/perfiso/parameters/set_txc_weight" % (dev, vq, weight)
-        self.cmd(c)
+        self.write_file("%s/set_txc_weight" % PERFISO_PARAMS,
+                        "dev %s %s weight %s" % (dev, vq, weight))
 
     def rmmod(self, mod="perfiso"):
         dev = self.get_10g_dev()
-        self.cmd("tc qdisc del dev %s root; rmmod %s" % (dev, mod))
+        self.cmd("tc qdisc del dev %s root; rmmod %s; rm -f %s" % (dev, mod, TOPOLOGY_STATE_FILE))
 
     def getID(self):
         id = 1
@@ -170,6 +384,7 @@ class Host(object):
         cmd += "tc qdisc add dev %s root handle 1: htb default 1; " % (self.get_10g_dev())
         if rmmod:
             cmd = ("tc qdisc del dev %s root; rmmod sch_htb; rmmod perfiso; " % dev) + cmd
+        cmd = ("rm -f %s; " % TOPOLOGY_STATE_FILE) + cmd
         self.cmd(cmd)
 
     def prepare_iface(self, iface=None, ip=None, direct=True):
@@ -217,8 +432,7 @@ class Host(object):
                 cmd = "/root/vimal/exports/ip route change 11.0.%d.0/24 src %s rto_min 1ms dev %s:%d" % (tid, src, dev, tid)
                 self.cmd(cmd)
 
-        self.delayed_cmds_execute()
-        return
+        return self.delayed_cmds_execute()
 
     def remove_bridge(self, direct=True):
         if direct:
@@ -250,7 +464,7 @@ class Host(object):
             self.cmd("ifconfig %s:%d %s" % (self.get_10g_dev(), tid, ip))
         else:
             self.cmd("ifconfig br0:%d %s" % (tid, ip))
-        self.delayed_cmds_execute()
+        return self.delayed_cmds_execute()
 
     def get_classid(self, ip=None):
         if ip is None:
@@ -263,10 +477,10 @@ class Host(object):
         return classid
 
     def create_ip_tx_rl(self, ip=None, rate='1Gbit', static=False):
-        self.delay = True
-        dev = self.get_10g_dev()
         if ip is None:
             return
+        self.delay = True
+        dev = self.get_10g_dev()
         #ip = self.get_tenant_ip(tid)
         classid = self.get_classid(ip)
 
@@ -289,7 +503,7 @@ class Host(object):
         cmd = "tc filter add dev %s protocol ip parent 1: prio 1 " % dev
         cmd += " u32 match ip src %s flowid 1:%s" % (ip, classid)
         self.cmd(cmd)
-        self.delayed_cmds_execute()
+        return self.delayed_cmds_execute()
 
     def create_tcp_tenant(self, server_ports=[], tid=1, weight=1):
         self.create_service_tenant("tcp", server_ports, tid, weight)
@@ -330,11 +544,14 @@ class Host(object):
         return
 
     def killall(self, extra=""):
+        # Processes we started are killed by process group; the killall
+        # by name catches anything started some other way.
         for p in self.procs:
             try:
                 p.kill()
             except:
                 pass
+        self.procs = []
         self.cmd("killall -9 ssh iperf top bwm-ng memcached pimonitor netserver netperf %s" % extra)
 
     def ipt_ebt_flush(self):
@@ -418,7 +635,12 @@ class Host(object):
                 self.start_bw_monitor(dir),
                 self.start_tenant_monitor(dir, interval)]
 
-    def copy(self, dest="l1", dir="/tmp", exptid=None):
+    def copy(self, dest="l1", dir="/tmp", exptid=None, compress=False, incremental=False):
+        """Copy dir on this host to exptdata/<exptid>/<expt>/<hostname>
+        on dest.  compress streams a gzipped tar over ssh instead of
+        scp; incremental uses rsync, so only changed files move.
+        Raises HostCmdError if the transfer fails.  collect.collect
+        pulls to this machine instead, over the cached connections."""
         dir = os.path.abspath(dir)
         # This name usually contains the parameters
         expt = os.path.basename(dir)
@@ -427,11 +649,21 @@ class Host(object):
         if type(dest) == str:
             dest = Host(dest)
         src_path = dir
-        dst_path = "~/vimal/10g/exptdata/%s/%s/%s/" % (exptid, expt, self.hostname())
-        dest.cmd("mkdir -p %s" % dst_path)
+        dst_path = "%s/%s/%s/%s/" % (EXPTDATA_DIR, exptid, expt, self.hostname())
         opts = "-o StrictHostKeyChecking=no"
-        c = "scp %s -r %s/* %s:%s" % (opts, src_path, dest.hostname(), dst_path)
-        self.cmd(c)
+        if incremental:
+            dest.cmd("mkdir -p %s" % dst_path)
+            z = "z" if compress else ""
+            c = "rsync -a%s -e 'ssh %s' %s/ %s:%s" % (z, opts, src_path, dest.hostname(), dst_path)
+        elif compress:
+            # pipefail: a tar that fails on this side fails the copy too
+            c = "set -o pipefail; tar -C %s -czf - . | ssh %s %s 'mkdir -p %s; tar -C %s -xzf -'"
+            c = c % (src_path, opts, dest.hostname(), dst_path, dst_path)
+        else:
+            dest.cmd("mkdir -p %s" % dst_path)
+            c = "scp %s -r %s/* %s:%s" % (opts, src_path, dest.hostname(), dst_path)
+        self.log(c)
+        self.cmd_batch([c], stop_on_error=True)
 
     def hostname(self):
         return socket.gethostbyaddr(self.addr)[0]
@@ -452,9 +684,7 @@ class Host(object):
     def start_memcached(self):
         self.stop_memcached()
         c = "ulimit -n unlimited; memcached -t 8 -b 10241024 -m 8192 -v -c 1024000 -u nobody"
-        proc = self.cmd_async(c)
-        self.procs.append(proc)
-        return proc
+        return self.cmd_async(c)
 
     def stop_memcached(self):
         self.cmd("killall -9 memcached")
@@ -1,4 +1,4 @@
-exptid=`date +%b%d-%H:%M`
+exptid=${1:-`date +%b%d-%H:%M`}
 dir=/tmp/$exptid/incast
 time=60
 n=1
@@ -11,37 +11,35 @@ ctrlc() {
 
 trap ctrlc SIGINT
 
-basecmd="python tests/scenario.py --time $time -n $n --run tcpvsudp --exptid $exptid"
-
-for iso in "--enabled"; do
-for size in 100G; do
-	for proto in udp; do
-		for mtu in 9000; do
-            # WITH ISOLATION
-			python tests/genconfig.py --type $proto --traffic incast \
-				--size $size --repeat 1000 \
-				--inter 5 -n $((n+2)) --time 1000 \
-				--duration 100s \
-				--tenant 2 > ~/vimal/exports/${n}to1_${size}_${proto}_tenant
-
-			$basecmd --dir $dir/$proto-mtu$mtu-s$size-with$iso $iso \
-				--traffic ~/vimal/exports/${n}to1_${size}_${proto}_tenant \
-				--mtu $mtu \
-				--ai 10 --md 4 \
-				-P $P
-
-            # WITHOUT ISOLATION
-			#python tests/genconfig.py --type $proto --traffic incast \
-			#	--size $size --repeat 1000 \
-			#	--inter 5 -n 16 --time 1000 > ~/vimal/exports/14to1_${size}_${proto}
-
-			#$basecmd --dir $dir/$proto-mtu$mtu-s$size-without \
-			#	--traffic ~/vimal/exports/14to1_${size}_${proto} \
-			#	--mtu $mtu
-		done
+sizes=100G
+protos=udp
+
+for size in $sizes; do
+	for proto in $protos; do
+		# WITH ISOLATION
+		python tests/genconfig.py --type $proto --traffic incast \
+			--size $size --repeat 1000 \
+			--inter 5 -n $((n+2)) --time 1000 \
+			--duration 100s \
+			--tenant 2 > ~/vimal/exports/${n}to1_${size}_${proto}_tenant
+
+		# WITHOUT ISOLATION
+		#python tests/genconfig.py --type $proto --traffic incast \
+		#	--size $size --repeat 1000 \
+		#	--inter 5 -n 16 --time 1000 > ~/vimal/exports/14to1_${size}_${proto}
 	done
 done
-done
+
+# One python process for all points, grouped so the module and MTU
+# change as rarely as possible
+python tests/sweep.py tests/scenario.py --exptid $exptid \
+	--grid iso=--enabled --grid size=`echo $sizes | tr ' ' ,` \
+	--grid proto=`echo $protos | tr ' ' ,` --grid mtu=9000 \
+	--order iso,mtu \
+	--args "--time $time -n $n --run tcpvsudp --exptid {exptid} \
+		--dir $dir/{proto}-mtu{mtu}-s{size}-with{iso} {iso} \
+		--traffic $HOME/vimal/exports/${n}to1_{size}_{proto}_tenant \
+		--mtu {mtu} --ai 10 --md 4 -P $P"
 
 echo `date` $dir
 
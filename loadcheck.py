@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+"""Offered load of loadgen traffic matrices, before running them.
+
+Every line of a loadgen file is turned into an interval of constant
+offered rate: a repeated flow offers size/inter from its start until
+its repetitions (or the stop time) run out, and a one-off flow offers
+line rate for as long as it would take to send at line rate.  Summing
+those intervals per host, tenant and direction gives the offered TX
+and RX load of every port over time, without a run.  Ports offered
+more than their capacity are flagged, and the rates perfiso should
+converge to are predicted by a weighted max-min fill of every bin over
+all TX and RX ports at once, each (src, dst, tenant) aggregate capped
+at what it offers.
+
+    python tests/loadcheck.py --weight 1=1 --weight 2=4 loadfiles/sort_1G_1 loadfiles/udp_2
+
+writes the prediction to <first matrix>.expected, one
+"t host tid dir offered expected" line (rates in Mbps) per second,
+which plots/plot_tenant_rate.py --expected draws over measured rates."""
+
+import argparse
+import numpy as np
+from collections import defaultdict
+from genconfig import parse_size
+
+def host_tenant(ip):
+    """(host id, tenant id) of a loadgen address: 11.0.<tid>.<host>
+    for tenant IPs, tenant 0 for the plain interface IPs."""
+    octets = ip.split('.')
+    if ip.startswith("11.0."):
+        return int(octets[3]), int(octets[2])
+    return int(octets[3]), 0
+
+def read_matrix(path):
+    """Columns of a loadgen file as arrays; lines that are not flows
+    (comments, l25 input) are skipped."""
+    cols = defaultdict(list)
+    addrs = {}
+    for line in open(path):
+        if line[0] == '#':
+            continue
+        row = line.split()
+        if len(row) < 13 or row[0].count('.') != 3:
+            continue
+        for ip in row[0:2]:
+            if ip not in addrs:
+                addrs[ip] = host_tenant(ip)
+        src, tid = addrs[row[0]]
+        cols['src'].append(src)
+        cols['tid'].append(tid)
+        cols['dst'].append(addrs[row[1]][0])
+        cols['start'].append(row[5])
+        cols['stop'].append(row[6])
+        cols['size'].append(row[7])
+        cols['repeat'].append(row[9])
+        cols['inter'].append(row[10])
+        cols['duration'].append(row[12])
+    ret = {}
+    for name in ['src', 'dst', 'tid']:
+        ret[name] = np.array(cols[name], dtype=int)
+    for name in ['start', 'stop', 'size', 'repeat', 'inter', 'duration']:
+        ret[name] = np.array(cols[name], dtype=float)
+    return ret
+
+def intervals(m, capacity):
+    """(a, b, rate): each flow line offers rate bits/s over [a, b)."""
+    start, stop, inter = m['start'], m['stop'], m['inter']
+    # A flow sends size bytes, or what fits in its duration
+    bits = np.minimum(m['size'] * 8, capacity * m['duration'])
+    span = np.maximum(stop - start, 0)
+    count = np.where(inter > 0, np.floor(span / np.where(inter > 0, inter, 1)) + 1, 1)
+    count = np.minimum(count, np.maximum(m['repeat'], 1))
+    repeated = count > 1
+    once = bits / capacity
+    b = np.where(repeated, np.minimum(start + count * inter, np.maximum(stop, start + inter)),
+                 start + once)
+    rate = np.where(repeated, bits / np.where(repeated, inter, 1), capacity)
+    return start, b, rate
+
+def binned(a, b, rate, edges):
+    """Mean of the sum of the interval rates over each bin.  The
+    integral of the sum is piecewise linear with slope changes at
+    the interval ends, so it is evaluated at the bin edges from
+    cumulative sums over the sorted ends, not interval by interval."""
+    t = np.concatenate([a, b])
+    s = np.concatenate([rate, -rate])
+    order = np.argsort(t, kind='mergesort')
+    t, s = t[order], s[order]
+    slope = np.cumsum(s)
+    offset = np.cumsum(s * t)
+    i = np.searchsorted(t, edges, side='right')
+    F = np.where(i > 0, edges * slope[i - 1] - offset[i - 1], 0.0)
+    return np.diff(F) / np.diff(edges)
+
+def offered_pairs(paths, capacity, width=1.0):
+    """(edges, {(src, dst, tid): offered bits/s per bin})"""
+    parts = []
+    for p in paths:
+        m = read_matrix(p)
+        if len(m['src']):
+            parts.append((m, intervals(m, capacity)))
+    if not parts:
+        return np.zeros(1), {}
+    end = max(iv[1].max() for m, iv in parts)
+    edges = np.arange(0, end + width, width)
+    ret = {}
+    for m, (a, b, rate) in parts:
+        keys = (m['src'] * 256 + m['dst']) * 256 + m['tid']
+        for key in np.unique(keys):
+            sel = keys == key
+            key = int(key)
+            k = (key / 65536, key / 256 % 256, key % 256)
+            load = binned(a[sel], b[sel], rate[sel], edges)
+            if k in ret:
+                ret[k] = ret[k] + load
+            else:
+                ret[k] = load
+    return edges, ret
+
+def port_load(pairs):
+    """{(host, tid, dir): bits/s per bin} summed from {(src, dst, tid): ...}"""
+    ret = {}
+    for (src, dst, tid), v in pairs.iteritems():
+        for k in ((src, tid, 'tx'), (dst, tid, 'rx')):
+            if k in ret:
+                ret[k] = ret[k] + v
+            else:
+                ret[k] = v
+    return ret
+
+def offered(paths, capacity, width=1.0):
+    """(edges, {(host, tid, dir): offered bits/s per bin})"""
+    edges, pairs = offered_pairs(paths, capacity, width)
+    return edges, port_load(pairs)
+
+def fill(demand, w, tx, rx, capacity, eps=1e-9):
+    """Weighted max-min rates of aggregates with the given demand and
+    weights, aggregate i using ports tx[i] and rx[i] (all of the same
+    capacity): progressive filling as in allocation/engine.maxmin,
+    except that an aggregate also stops growing once it has all it
+    offers."""
+    R = max(tx.max(), rx.max()) + 1
+    x = np.zeros(len(demand))
+    left = np.repeat(float(capacity), R)
+    active = (demand > 0) & (w > 0)
+    while active.any():
+        wa = w * active
+        grow = np.bincount(tx, wa, minlength=R) + np.bincount(rx, wa, minlength=R)
+        busy = grow > 0
+        dt = min((left[busy] / grow[busy]).min(), ((demand - x)[active] / w[active]).min())
+        x += dt * wa
+        left -= dt * grow
+        full = busy & (left <= eps * capacity)
+        active &= ~(full[tx] | full[rx]) & (x < demand * (1 - eps))
+    return x
+
+def expected(pairs, weights, capacity):
+    """{(host, tid, dir): predicted rate} from the offered load of every
+    (src, dst, tid) aggregate.  All TX and RX ports of a bin are filled
+    together, so a sender is not predicted more than its receiver lets
+    through.  At each port a tenant's weight is split evenly among its
+    active aggregates there and an aggregate gets the smaller of its TX
+    and RX split, as allocation/engine.py --per endpoint does: close to,
+    but not exactly, max-min among tenants at every port."""
+    keys = sorted(pairs.keys())
+    if not keys:
+        return {}
+    hosts = sorted(set([k[0] for k in keys] + [k[1] for k in keys]))
+    index = dict((h, i) for i, h in enumerate(hosts))
+    n = len(hosts)
+    # Ports 0..n-1 are TX, n..2n-1 RX
+    tx = np.array([index[k[0]] for k in keys], dtype=int)
+    rx = np.array([n + index[k[1]] for k in keys], dtype=int)
+    tids = sorted(set(k[2] for k in keys))
+    tid = np.array([tids.index(k[2]) for k in keys], dtype=int)
+    w = np.array([float(weights.get(k[2], 1)) for k in keys])
+    demand = np.array([pairs[k] for k in keys])
+    # (port, tenant) of every aggregate, to count the tenant's aggregates there
+    tx_group = tx * len(tids) + tid
+    rx_group = rx * len(tids) + tid
+    size = 2 * n * len(tids)
+    alloc = np.zeros_like(demand)
+    for j in xrange(demand.shape[1]):
+        on = (demand[:, j] > 0).astype(float)
+        if not on.any():
+            continue
+        ntx = np.bincount(tx_group, on, minlength=size)[tx_group]
+        nrx = np.bincount(rx_group, on, minlength=size)[rx_group]
+        share = w / np.maximum(np.maximum(ntx, nrx), 1)
+        alloc[:, j] = fill(demand[:, j], share, tx, rx, capacity)
+    return port_load(dict(zip(keys, alloc)))
+
+def overloaded(load, capacity, threshold=1.0):
+    """[(host, dir, bins over, peak)] of ports offered more than
+    threshold * capacity in some bin."""
+    ports = {}
+    for (host, tid, dir), v in load.iteritems():
+        if (host, dir) in ports:
+            ports[(host, dir)] = ports[(host, dir)] + v
+        else:
+            ports[(host, dir)] = v
+    ret = []
+    for (host, dir) in sorted(ports.keys()):
+        v = ports[(host, dir)]
+        over = int((v > threshold * capacity).sum())
+        if over:
+            ret.append((host, dir, over, v.max()))
+    return ret
+
+def write(path, edges, load, exp):
+    f = open(path, 'w')
+    f.write("# t host tid dir offered_mbps expected_mbps\n")
+    for k in sorted(load.keys()):
+        host, tid, dir = k
+        for t, o, e in zip(edges[:-1], load[k] / 1e6, exp[k] / 1e6):
+            f.write("%.3f %d %d %s %.3f %.3f\n" % (t, host, tid, dir, o, e))
+    f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offered load and expected rates of loadgen matrices.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--capacity', default="10G", help="Port capacity in bits/s")
+    parser.add_argument('--bin', type=float, default=1.0, help="Seconds per bin")
+    parser.add_argument('--weight', action="append", default=[], metavar="TID=W",
+                        help="perfiso weight of a tenant (default 1)")
+    parser.add_argument('--threshold', type=float, default=1.0,
+                        help="Flag ports offered more than this fraction of capacity")
+    parser.add_argument('--out', default=None,
+                        help="Where to write the prediction (default <first file>.expected)")
+    args = parser.parse_args()
+
+    capacity = float(parse_size(args.capacity))
+    weights = {}
+    for w in args.weight:
+        tid, value = w.split('=')
+        weights[int(tid)] = float(value)
+    edges, pairs = offered_pairs(args.files, capacity, args.bin)
+    load = port_load(pairs)
+    exp = expected(pairs, weights, capacity)
+    for k in sorted(load.keys()):
+        host, tid, dir = k
+        print "host %3d tenant %3d %s: offered mean %8.1f peak %8.1f Mbps, expected mean %8.1f Mbps" % (
+            host, tid, dir, load[k].mean() / 1e6, load[k].max() / 1e6, exp[k].mean() / 1e6)
+    over = overloaded(load, capacity, args.threshold)
+    for host, dir, nbins, peak in over:
+        print "OVERLOADED: host %d %s offered up to %.1f Mbps (%d of %d bins over %.1f Mbps)" % (
+            host, dir, peak / 1e6, nbins, len(edges) - 1, args.threshold * capacity / 1e6)
+    out = args.out or args.files[0] + ".expected"
+    write(out, edges, load, exp)
+    print "wrote", out
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Generated traffic files, made once and shared by every run.
+
+A file is named by a hash of the genconfig parameters it was made with,
+of genconfig.py itself (so changing a generator invalidates its files)
+and of the host addresses it resolved to.  get() generates it into CACHE_DIR only if it is not already
+there with the right SHA-1, and push() copies it over SFTP, to all
+hosts at once, only to the hosts where `sha1sum` says it is missing or
+different.  So the points of a sweep that share a matrix generate and
+distribute it once:
+
+    path = loadfiles.prepare(hlist.lst, "sort", name="sort_1G_3",
+                             type="tcp", n=16, P=16, tenant=3, size="1G")
+    # path is where the file is on the hosts"""
+
+import os
+import json
+import hashlib
+import termcolor as T
+from parallel import fanout_check
+import genconfig
+
+CACHE_DIR = os.path.expanduser("~/vimal/exports/loadfiles/cache")
+# Where the files go on the hosts
+REMOTE_DIR = "/root/vimal/loadfiles"
+
+def _sha1_file(path):
+    h = hashlib.sha1()
+    f = open(path, 'rb')
+    try:
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            h.update(data)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+def _code_version():
+    src = genconfig.__file__
+    if src.endswith('.pyc') or src.endswith('.pyo'):
+        src = src[:-1]
+    return _sha1_file(src)
+
+def key(traffic, **opts):
+    # The addresses come from the config module, not from opts, so changing
+    # host_ips or the tenant IP scheme must change the key too.  Resolve
+    # exactly those the pattern uses: paggr has one more host than n.
+    n = int(opts.get('n', 4))
+    if traffic == "paggr":
+        n += 1
+    ips = genconfig.addresses(n, opts.get('tenant'))
+    desc = json.dumps({'traffic': traffic, 'opts': opts, 'code': _code_version(),
+                       'addresses': ips}, sort_keys=True)
+    return hashlib.sha1(desc).hexdigest()
+
+def get(traffic, name=None, **opts):
+    """(path, sha1) of the local file for genconfig traffic with opts,
+    generating it if it is missing or does not match its hash."""
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+    path = os.path.join(CACHE_DIR, "%s-%s" % (name or traffic, key(traffic, **opts)[:16]))
+    try:
+        digest = open(path + ".sha1").read().strip()
+        if _sha1_file(path) == digest:
+            return path, digest
+    except IOError:
+        pass
+    genconfig.write(path, traffic, **opts)
+    digest = _sha1_file(path)
+    f = open(path + ".sha1", 'w')
+    f.write(digest + '\n')
+    f.close()
+    return path, digest
+
+def remote_path(path):
+    return os.path.join(REMOTE_DIR, os.path.basename(path))
+
+def push(hosts, path, digest):
+    """Copy path to REMOTE_DIR on the hosts that do not have it with
+    this digest.  Returns the hosts it was copied to."""
+    remote = remote_path(path)
+    def push_one(h):
+        out = h.cmd("sha1sum %s 2>/dev/null" % remote).strip()
+        if out.split(' ', 1)[0] == digest:
+            return False
+        h.cmd("mkdir -p %s" % REMOTE_DIR)
+        h.get_sftp().put(path, remote + ".tmp")
+        h.cmd("mv %s.tmp %s" % (remote, remote))
+        return True
+    hosts = list(hosts)
+    pushed = fanout_check(push_one, hosts)
+    hosts = [h for h, p in zip(hosts, pushed) if p]
+    if hosts:
+        print T.colored("pushed %s to %d host(s)" % (os.path.basename(path), len(hosts)), "cyan")
+    return hosts
+
+def prepare(hosts, traffic, name=None, **opts):
+    """Make sure hosts have the file for genconfig traffic with opts;
+    returns its path on the hosts."""
+    path, digest = get(traffic, name, **opts)
+    push(hosts, path, digest)
+    return remote_path(path)
@@ -8,9 +8,8 @@ ctrlc() {
 
 trap ctrlc SIGINT
 size=10G
-dirs=""
-exptid=`date +%b%d-%H:%M`
 rps=${1:-3000}
+exptid=${2:-`date +%b%d-%H:%M`}
 
 # Vary mtu
 # Vary workloads
@@ -19,44 +18,35 @@ rps=${1:-3000}
 python tests/genconfig.py --traffic fullmesh \
 	--size $size --type udp --inter 16 --duration 0.5 -n 16 --stagger 1 --time $time \
 	-P 1 \
-	--tenant 2 > ~/vimal/exports/loadfiles/fullmesh_n16_udp_tenant_2_${size}
+	--tenant 2 > ~/vimal/exports/loadfiles/fullmesh_n16_udp_${size}_iso--enable
 
 python tests/genconfig.py --traffic fullmesh \
 	--size $size --type udp --inter 16 --duration 0.5 -n 16 --stagger 1 --time $time \
 	-P 1 \
-	> ~/vimal/exports/loadfiles/fullmesh_n16_udp_${size}
+	> ~/vimal/exports/loadfiles/fullmesh_n16_udp_${size}_iso
 
 # Both tenants executed alone without interference
-
-for mtu in 9000; do
-	for iso in "" "--enable"; do
-		for workload in ~/vimal/exports/memcached_cluster/*; do
-			for active in mem udp,mem; do
-				work=`basename $workload`
-				dir=/tmp/memcached-mtu$mtu-iso$iso-work$work-active$active
-				mkdir -p $dir
-				dirs="$dirs\n$dir"
-
-				traffic=fullmesh_n16_udp_${size}
-				if [[ $iso = "--enable" ]]; then
-					traffic=fullmesh_n16_udp_tenant_2_${size}
-				fi
-
-				echo $exptid $dir $workload $iso $mtu $traffic $active > $dir/README;
-
-				python tests/test_memcached_cluster.py --ns 4 --nc 12 $iso \
-					--dir $dir \
-					--time $time \
-					--mtu $mtu \
-					--memaslap $workload \
-					--exptid $exptid \
-					--traffic ~/vimal/exports/loadfiles/$traffic \
-					--active $active \
-					--mcperf --mcsize 6000 --mcrate $rps --mcexp --nconn 10
-			done
-		done
-	done
-done
+# One python process for the whole sweep; rerunning with the same
+# exptid (./memcached_cluster_onoff.sh <rps> <exptid>) resumes after the
+# last completed point.  The traffic file is named after iso, since
+# --enable points use tenant 2 addresses.
+workloads=`ls ~/vimal/exports/memcached_cluster | tr '\n' , | sed 's/,$//'`
+python tests/sweep.py tests/test_memcached_cluster.py --exptid $exptid \
+	--grid mtu=9000 --grid iso=,--enable --grid work=$workloads \
+	--grid "active=mem|udp,mem" \
+	--order mtu,iso \
+	--args "--ns 4 --nc 12 {iso} \
+		--dir /tmp/memcached-mtu{mtu}-iso{iso}-work{work}-active{active} \
+		--time $time --mtu {mtu} \
+		--memaslap $HOME/vimal/exports/memcached_cluster/{work} \
+		--exptid {exptid} \
+		--traffic $HOME/vimal/exports/loadfiles/fullmesh_n16_udp_${size}_iso{iso} \
+		--active {active} \
+		--mcperf --mcsize 6000 --mcrate $rps --mcexp --nconn 10 \
+		--reconcile"
+
+# The --reconcile --enable points leave perfiso and the tenants in place
+python tests/test_memcached_cluster.py --ns 4 --nc 12 --destroy
 
 sys=EyeQ
 pushd ../exptdata/$exptid
@@ -106,7 +96,6 @@ for dir in mem*; do
 done
 
 echo `date` $exptid
-echo -e $dirs
 popd
 
 echo memcached_cluster_onoff $exptid rps: $rps conn: 10 >> TODO
@@ -0,0 +1,84 @@
+import threading
+from Queue import Queue, Empty
+
+# Upper bound on the number of hosts we talk to at the same time.  The
+# cluster has 16 usable lancelots, so by default every host gets its
+# own worker.
+MAX_WORKERS = 16
+
+class FanoutError(Exception):
+    """Raised when one or more calls in a fanout failed.  results and
+    errors are lists in the same order as the items that were fanned
+    out; errors[i] is None if the call for item i succeeded."""
+    def __init__(self, results, errors, items=None):
+        self.results = results
+        self.errors = errors
+        self.items = items
+        failed = [i for i, e in enumerate(errors) if e is not None]
+        msg = "%d/%d calls failed" % (len(failed), len(errors))
+        if failed:
+            msg += ": %s" % errors[failed[0]]
+        Exception.__init__(self, msg)
+
+def fanout(fn, items, max_workers=None):
+    """Call fn(item) for every item on a bounded pool of threads.
+
+    Returns (results, errors), both in the order of items.  Exceptions
+    are caught per item, so a failure on one host does not stop the
+    others."""
+    items = list(items)
+    n = len(items)
+    results = [None] * n
+    errors = [None] * n
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    nworkers = max(1, min(int(max_workers), n))
+
+    if n == 0:
+        return results, errors
+
+    # No point spinning threads for a single call; this also keeps
+    # tracebacks simple when the list has one host.
+    if nworkers == 1:
+        for i, item in enumerate(items):
+            try:
+                results[i] = fn(item)
+            except Exception, e:
+                errors[i] = e
+        return results, errors
+
+    work = Queue()
+    for i in xrange(n):
+        work.put(i)
+
+    def worker():
+        while True:
+            try:
+                i = work.get_nowait()
+            except Empty:
+                return
+            try:
+                results[i] = fn(items[i])
+            except Exception, e:
+                errors[i] = e
+
+    threads = []
+    for _ in xrange(nworkers):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    # Joining with a timeout keeps the main thread responsive to
+    # Ctrl-C, which Expt.run relies on to stop experiments.
+    for t in threads:
+        while t.isAlive():
+            t.join(0.1)
+    return results, errors
+
+def fanout_check(fn, items, max_workers=None):
+    """Like fanout, but raise FanoutError if any call failed."""
+    items = list(items)
+    results, errors = fanout(fn, items, max_workers)
+    if any(e is not None for e in errors):
+        raise FanoutError(results, errors, items)
+    return results
@@ -0,0 +1,129 @@
+"""Vectorized aggregation of experiment time series.
+
+NumPy versions of the helpers the plotters use (ewma, window averages,
+cdf, percentiles, ...).  They keep the semantics of the list-based
+versions they replace, but take and return arrays, so they are cheap on
+series with millions of samples."""
+
+import math
+import numpy as np
+
+def ewma(alpha, values):
+    """y[i] = alpha * y[i-1] + (1 - alpha) * values[i], with y[-1] = 0.
+
+    Computed in closed form a block at a time: within a block,
+    y[i] = alpha^(i+1) * y0 + (1 - alpha) * alpha^i * cumsum(v[k] / alpha^k),
+    and blocks are short enough that alpha^-k stays far from overflow."""
+    if alpha == 0:
+        return values
+    v = np.asarray(values, dtype=float)
+    y = np.empty_like(v)
+    if alpha >= 1:
+        y.fill(0)
+        return y
+    # alpha^-block <= 1e150
+    block = max(1, min(len(v), int(150 * math.log(10) / -math.log(alpha))))
+    powers = alpha ** np.arange(block, dtype=float)
+    prev = 0.0
+    for i in xrange(0, len(v), block):
+        chunk = v[i:i+block]
+        p = powers[:len(chunk)]
+        out = (1 - alpha) * p * np.cumsum(chunk / p) + alpha * p * prev
+        y[i:i+block] = out
+        prev = out[-1]
+    return y
+
+def window_mean(values, n):
+    """Means of consecutive, non-overlapping windows of n samples; a
+    partial last window is dropped."""
+    v = np.asarray(values, dtype=float)
+    if n is None or n <= 1:
+        return v
+    m = len(v) / n * n
+    return v[:m].reshape((-1, n)).mean(axis=1)
+
+def sliding_mean(values, n):
+    """Mean of every window of n consecutive samples (len - n + 1
+    values)."""
+    v = np.asarray(values, dtype=float)
+    if n <= 1:
+        return v
+    if len(v) < n:
+        return np.zeros(0)
+    c = np.cumsum(np.concatenate(([0.0], v)))
+    return (c[n:] - c[:-n]) / n
+
+def resample(t, values, t_new):
+    """values sampled at times t, linearly interpolated at t_new (t must
+    be increasing)."""
+    return np.interp(t_new, np.asarray(t, dtype=float), np.asarray(values, dtype=float))
+
+def time_base(ts, step):
+    """A common time base with the given step, spanning the overlap of
+    all the time arrays in ts."""
+    lo = max(t[0] for t in ts)
+    hi = min(t[-1] for t in ts)
+    return np.arange(lo, hi + step / 2.0, step)
+
+def avg(lst):
+    v = np.asarray(lst, dtype=float)
+    if len(v) == 0:
+        raise ZeroDivisionError("avg of an empty sequence")
+    return float(v.mean())
+
+def stdev(lst):
+    """Population standard deviation."""
+    v = np.asarray(lst, dtype=float)
+    if len(v) == 0:
+        raise ZeroDivisionError("stdev of an empty sequence")
+    return float(v.std())
+
+def percentile(values, p):
+    """p-th percentile (0-100) with linear interpolation."""
+    return float(np.percentile(np.asarray(values, dtype=float), p))
+
+def percentiles(values, ps):
+    v = np.asarray(values, dtype=float)
+    return [float(np.percentile(v, p)) for p in ps]
+
+def cdf(values):
+    """(x, y): the sorted values and the fraction of values <= each."""
+    x = np.sort(np.asarray(values, dtype=float))
+    y = np.arange(1, len(x) + 1, dtype=float) / max(len(x), 1)
+    return (x, y)
+
+def weighted_cdf(pairs):
+    """CDF of a histogram given as (value, count) pairs in increasing
+    order of value."""
+    a = np.asarray(pairs, dtype=float).reshape((-1, 2))
+    cum = np.cumsum(a[:, 1])
+    return (a[:, 0], cum / cum[-1])
+
+def binned_cdf(values, bin):
+    """Step CDF with values grouped into bins of width bin.  A bin
+    starts at the first value not in the previous bin, so this is a
+    search per bin rather than a pass per value."""
+    v = np.sort(np.asarray(values, dtype=float))
+    x = [v[0] - bin]
+    y = [0]
+    i = 0
+    while i < len(v):
+        end = v[i] + bin
+        i = np.searchsorted(v, end, side='right')
+        x.append(end)
+        y.append(i)
+    return (np.array(x), np.array(y, dtype=float) / len(v))
+
+def rolling_percentile(values, n, p, step=1):
+    """p-th percentile of every window of n samples, every step
+    samples.  Windows are strided views, processed a block at a time to
+    bound memory."""
+    v = np.ascontiguousarray(values, dtype=float)
+    if len(v) < n:
+        return np.zeros(0)
+    nwin = (len(v) - n) / step + 1
+    s = v.strides[0]
+    windows = np.lib.stride_tricks.as_strided(v, shape=(nwin, n), strides=(s * step, s))
+    block = max(1, (1 << 22) / n)
+    return np.concatenate([np.percentile(windows[i:i+block], p, axis=1)
+                           for i in xrange(0, nwin, block)])
@@ -0,0 +1,161 @@
+"""On-disk cache of parsed experiment outputs.
+
+Decorating a parser with @cached makes it parse each raw file once: the
+result is stored as an uncompressed .npz under CACHE_DIR, keyed by the
+file's path, size and mtime, the parser's name and bytecode and the
+remaining arguments.  Later calls (from any plotter) load the arrays
+back instead of reparsing the text.
+
+Results can be nested dicts, lists and tuples of numbers and strings;
+dict keys can be numbers, strings or tuples of them.  Numeric lists
+come back as NumPy arrays, everything else as it went in.  A result
+that cannot be stored is returned uncached.
+Set EYEQ_PLOT_CACHE to change the cache directory, or to "" to turn
+caching off."""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from collections import defaultdict
+
+CACHE_DIR = os.environ.get('EYEQ_PLOT_CACHE', os.path.expanduser('~/.cache/eyeq-plots'))
+LAYOUT = '__layout__'
+# Bumped when the layout changes, so older entries are misses
+VERSION = 2
+
+def _stamp(path):
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_size, st.st_mtime]
+
+def cache_path(fn, path, args):
+    h = hashlib.sha1()
+    h.update(fn.__name__)
+    h.update(fn.func_code.co_code)
+    h.update(repr(fn.func_code.co_consts))
+    h.update(repr(args))
+    h.update(os.path.abspath(path))
+    return os.path.join(CACHE_DIR, "%s-%s.npz" % (fn.__name__, h.hexdigest()[:16]))
+
+def _key(k):
+    if isinstance(k, unicode):
+        return k.encode('utf-8')
+    return k
+
+def _flatten_key(k):
+    # JSON would turn a tuple into an (unhashable) list
+    if isinstance(k, tuple):
+        return {'t': [_flatten_key(x) for x in k]}
+    if isinstance(k, np.generic):
+        k = k.item()
+    if k is None or isinstance(k, (basestring, int, long, float)):
+        return {'v': k}
+    raise TypeError("cannot cache a %s dict key" % type(k).__name__)
+
+def _unflatten_key(k):
+    if 't' in k:
+        return tuple(_unflatten_key(x) for x in k['t'])
+    return _key(k['v'])
+
+def _flatten(obj, arrays):
+    """Layout of obj (JSON-able) with numeric sequences moved into
+    arrays."""
+    if isinstance(obj, dict):
+        return {'d': [[_flatten_key(k), _flatten(v, arrays)] for k, v in obj.iteritems()],
+                'dd': isinstance(obj, defaultdict)}
+    if isinstance(obj, tuple):
+        return {'t': [_flatten(v, arrays) for v in obj]}
+    if isinstance(obj, (list, np.ndarray)):
+        try:
+            a = np.asarray(obj)
+        except ValueError:
+            # Ragged nested lists
+            a = None
+        if a is not None and a.dtype.kind in 'biuf':
+            name = 'a%d' % len(arrays)
+            arrays[name] = a
+            return {'a': name}
+        return {'l': [_flatten(v, arrays) for v in obj]}
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    return {'v': obj}
+
+def _unflatten(layout, arrays):
+    if 'd' in layout:
+        ret = defaultdict(list) if layout['dd'] else {}
+        for k, v in layout['d']:
+            ret[_unflatten_key(k)] = _unflatten(v, arrays)
+        return ret
+    if 't' in layout:
+        return tuple(_unflatten(v, arrays) for v in layout['t'])
+    if 'a' in layout:
+        return arrays[layout['a']]
+    if 'l' in layout:
+        return [_unflatten(v, arrays) for v in layout['l']]
+    return _key(layout['v'])
+
+def load(cpath, stamp):
+    """The cached result in cpath if it was made from a file matching
+    stamp, else None."""
+    if not os.path.exists(cpath):
+        return None
+    try:
+        npz = np.load(cpath)
+        layout = json.loads(str(npz[LAYOUT]))
+        if layout.get('version') != VERSION or layout['stamp'] != stamp:
+            return None
+        arrays = dict((k, npz[k]) for k in npz.files if k != LAYOUT)
+        return _unflatten(layout['data'], arrays)
+    except Exception:
+        # Torn or stale-format entry: treat as a miss
+        return None
+
+def store(cpath, stamp, data, arrays):
+    """Write a result flattened by _flatten into cpath."""
+    arrays = dict(arrays)
+    layout = {'version': VERSION, 'stamp': stamp, 'data': data}
+    arrays[LAYOUT] = np.array(json.dumps(layout))
+    d = os.path.dirname(cpath)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    # Write and rename, so concurrent plotters never see half a file
+    fd, tmp = tempfile.mkstemp(suffix='.npz', dir=d)
+    f = os.fdopen(fd, 'wb')
+    np.savez(f, **arrays)
+    f.close()
+    os.rename(tmp, cpath)
+
+def cached(fn):
+    """Decorator for parsers called as fn(path, *args, **kwargs)."""
+    def wrapper(path, *args, **kwargs):
+        if not CACHE_DIR:
+            return fn(path, *args, **kwargs)
+        stamp = _stamp(path)
+        cpath = cache_path(fn, path, (args, sorted(kwargs.items())))
+        ret = load(cpath, stamp)
+        if ret is None:
+            ret = fn(path, *args, **kwargs)
+            # Caching is an optimisation: whatever goes wrong here, the
+            # parsed result is still returned
+            try:
+                arrays = {}
+                data = _flatten(ret, arrays)
+                # What a hit would return, so callers see the same types
+                # (numeric lists as arrays) either way
+                ret = _unflatten(data, arrays)
+                store(cpath, stamp, data, arrays)
+            except Exception, e:
+                print 'cache: could not store %s: %s' % (path, e)
+        return ret
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    wrapper.uncached = fn
+    return wrapper
+
+def clear():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for f in os.listdir(CACHE_DIR):
+        if f.endswith('.npz'):
+            os.unlink(os.path.join(CACHE_DIR, f))
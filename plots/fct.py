@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""Streaming flow completion time extraction from loadgen sort logs.
+
+The logs have a "starting TCP flow seed <seed> ... size <bytes> ...
+--- <time>" line when a flow starts and an "ending TCP flow seed <seed>
+... --- <time>" line when it ends.  FctExtractor scans a log from a
+byte offset, a block at a time, skips blocks and lines without "TCP
+flow seed" and runs one compiled pattern on the rest, and keeps the
+completed flows as compact (seed, size, start, end) arrays.
+
+flows()/fcts() save the extractor state (offset, flows, still-open
+flows) in the plot cache, so calling them again on a log that has
+grown since only reads the new part.  That makes refreshing the FCT
+CDF of a Hadoop trace run that is still going cheap:
+
+    python plots/fct.py --follow 10 exptdata/.../l*/sort-0.txt"""
+
+import os
+import time
+import array
+import hashlib
+import argparse
+import re
+import numpy as np
+from cache import CACHE_DIR
+
+PREFILTER = "TCP flow seed"
+PATTERN = re.compile(r'(start|end)ing TCP flow seed (\d+)(?:.*size (\d+))?.*\-\-\-\s([\d\.]+)')
+FLOW = np.dtype([('seed', '<i8'), ('size', '<i8'), ('start', '<f8'), ('end', '<f8')])
+
+class FctExtractor(object):
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset
+        st = os.stat(path)
+        self.ident = (st.st_dev, st.st_ino)
+        # seed -> (size, start) of flows that have not ended yet
+        self.pending = {}
+        self.seeds = array.array('l')
+        self.sizes = array.array('l')
+        self.starts = array.array('d')
+        self.ends = array.array('d')
+        # Flows that ended without a start line
+        self.orphans = 0
+
+    def _scan(self, block):
+        if PREFILTER not in block:
+            return
+        pending = self.pending
+        for line in block.split('\n'):
+            if PREFILTER not in line:
+                continue
+            m = PATTERN.match(line)
+            if m is None:
+                continue
+            what, seed, size, t = m.groups()
+            seed = int(seed)
+            t = float(t)
+            if what == 'start':
+                pending[seed] = (int(size or 0), t)
+                continue
+            started = pending.pop(seed, None)
+            if started is None:
+                self.orphans += 1
+                continue
+            self.seeds.append(seed)
+            self.sizes.append(started[0])
+            self.starts.append(started[1])
+            self.ends.append(t)
+
+    def update(self, blocksize=1 << 22):
+        """Scan the log from the current offset up to its last complete
+        line.  Returns the number of flows completed since the last
+        call."""
+        n = len(self.seeds)
+        f = open(self.path, 'rb')
+        f.seek(self.offset)
+        tail = ''
+        while True:
+            data = f.read(blocksize)
+            if not data:
+                break
+            data = tail + data
+            nl = data.rfind('\n')
+            if nl < 0:
+                tail = data
+                continue
+            self._scan(data[:nl])
+            self.offset += nl + 1
+            tail = data[nl+1:]
+        f.close()
+        # An incomplete last line stays unread until it is finished
+        return len(self.seeds) - n
+
+    def flows(self):
+        ret = np.empty(len(self.seeds), dtype=FLOW)
+        ret['seed'] = np.frombuffer(self.seeds, dtype=np.int64) if len(self.seeds) else []
+        ret['size'] = np.frombuffer(self.sizes, dtype=np.int64) if len(self.sizes) else []
+        ret['start'] = np.frombuffer(self.starts, dtype=np.float64) if len(self.starts) else []
+        ret['end'] = np.frombuffer(self.ends, dtype=np.float64) if len(self.ends) else []
+        return ret
+
+    def fcts(self):
+        f = self.flows()
+        return f['end'] - f['start']
+
+    def save(self, path):
+        pending = sorted(self.pending.iteritems())
+        d = os.path.dirname(path)
+        if not os.path.exists(d):
+            os.makedirs(d)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, flows=self.flows(),
+                 pending=np.array([(s, sz, t, 0) for s, (sz, t) in pending], dtype=FLOW),
+                 meta=np.array([self.offset, self.ident[0], self.ident[1], self.orphans], dtype=np.int64))
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path, state):
+        """An extractor for the log path resuming from the saved state,
+        or a fresh one if the log was replaced or truncated since."""
+        ret = cls(path)
+        try:
+            saved = np.load(state)
+            offset, dev, ino, orphans = map(int, saved['meta'])
+            flows = saved['flows']
+            pending = saved['pending']
+        except (IOError, KeyError, ValueError):
+            return ret
+        if (dev, ino) != ret.ident or os.path.getsize(path) < offset:
+            return ret
+        ret.offset = offset
+        ret.orphans = orphans
+        ret.seeds.fromstring(np.ascontiguousarray(flows['seed']).tostring())
+        ret.sizes.fromstring(np.ascontiguousarray(flows['size']).tostring())
+        ret.starts.fromstring(np.ascontiguousarray(flows['start']).tostring())
+        ret.ends.fromstring(np.ascontiguousarray(flows['end']).tostring())
+        for p in pending:
+            ret.pending[int(p['seed'])] = (int(p['size']), float(p['start']))
+        return ret
+
+def state_path(path):
+    h = hashlib.sha1(os.path.abspath(path)).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "fct-%s.npz" % h)
+
+def extract(path):
+    """Extractor for path brought up to date, resuming from (and
+    updating) its saved state when caching is on."""
+    if not CACHE_DIR:
+        e = FctExtractor(path)
+        e.update()
+        return e
+    spath = state_path(path)
+    e = FctExtractor.load(path, spath)
+    offset = e.offset
+    e.update()
+    if e.offset != offset or not os.path.exists(spath):
+        e.save(spath)
+    return e
+
+def flows(path):
+    return extract(path).flows()
+
+def fcts(path):
+    """Completion times (seconds) of the flows that finished in path."""
+    return extract(path).fcts()
+
+def main():
+    parser = argparse.ArgumentParser(description="Flow completion times from loadgen sort logs.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--follow', type=float, default=None,
+                        help="Keep refreshing every this many seconds")
+    args = parser.parse_args()
+    extractors = [extract(f) for f in args.files]
+    while True:
+        values = np.concatenate([e.fcts() for e in extractors])
+        open_flows = sum(len(e.pending) for e in extractors)
+        if len(values):
+            p50, p99 = np.percentile(values, [50, 99])
+            print "%d flows done, %d open: p50 %.3fs p99 %.3fs max %.3fs" % (len(values), open_flows,
+                                                                             p50, p99, values.max())
+        else:
+            print "no flows done yet, %d open" % open_flows
+        if args.follow is None:
+            break
+        time.sleep(args.follow)
+        for e in extractors:
+            e.update()
+
+if __name__ == "__main__":
+    main()
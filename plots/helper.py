@@ -8,10 +8,11 @@ else:
     m.use("Agg")
 import matplotlib.pyplot as plt
 import argparse
-import math
 import numpy as np
 from collections import defaultdict
 from pprint import pprint
+from cache import cached
+import analytics
 
 
 default_colours = ['g','r','b', 'y', 'purple','brown','cyan']
@@ -28,14 +29,7 @@ def read_list(fname, delim=','):
     return ret
 
 def ewma(alpha, values):
-    if alpha == 0:
-        return values
-    ret = []
-    prev = 0
-    for v in values:
-        prev = alpha * prev + (1 - alpha) * v
-        ret.append(prev)
-    return ret
+    return analytics.ewma(alpha, values)
 
 def col(n, obj = None, clean = lambda e: e):
     """A versatile column extractor.
@@ -66,12 +60,10 @@ def transpose(l):
     return zip(*l)
 
 def avg(lst):
-    return sum(map(float, lst)) / len(lst)
+    return analytics.avg(lst)
 
 def stdev(lst):
-    mean = avg(lst)
-    var = avg(map(lambda e: (e - mean)**2, lst))
-    return math.sqrt(var)
+    return analytics.stdev(lst)
 
 def xaxis(values, limit):
     l = len(values)
@@ -89,18 +81,9 @@ def second(l):
     return l[1]
 
 def cdf(values):
-    values.sort()
-    prob = 0
-    l = len(values)
-    x, y = [], []
-
-    for v in values:
-        prob += 1.0 / l
-        x.append(v)
-        y.append(prob)
-
-    return (x, y)
+    return analytics.cdf(values)
 
+@cached
 def parse_cpu_usage(fname, nprocessors=8):
     """Returns (user,system,nice,iowait,hirq,sirq,steal) tuples
 	aggregated over all processors.  DOES NOT RETURN IDLE times."""
@@ -124,20 +107,74 @@ def parse_cpu_usage(fname, nprocessors=8):
         ret.append(total[0:3] + total[4:])
     return ret
 
-def parse_rate_usage(fname, ifaces=["eth2"], dir="tx", divider=1e6):
-    data = read_list(fname)
-    column = 2
-    rate = defaultdict(list)
-    if dir == "rx":
-        column = 3
-    for row in data:
+# Columns of bwm-ng's csv output (-o csv -C ','), after the timestamp
+# and interface name:
+# unix_timestamp;iface_name;bytes_out;bytes_in;bytes_total;packets_out;packets_in;packets_total;errors_out;errors_in
+BWM_FIELDS = ['time', 'bytes_out', 'bytes_in', 'bytes_total',
+              'packets_out', 'packets_in', 'packets_total',
+              'errors_out', 'errors_in']
+
+def _bwm_array(rows, ncols):
+    """rows are 'timestamp,v1,v2,...' strings; returns an (n, ncols)
+    float array.  Parsing the joined chunk happens in C."""
+    try:
+        a = np.fromstring(','.join(rows), dtype=float, sep=',')
+        if a.size == len(rows) * ncols:
+            return a.reshape((len(rows), ncols))
+    except ValueError:
+        pass
+    # Empty cells or other oddities: fall back to the slow path
+    def value(e):
         try:
-            ifname = row[1]
-            if ifname in ifaces:
-                rate[ifname].append(float(row[column]) * 8 / divider)
-        except:
-            # Incomplete line
+            return float(e)
+        except ValueError:
+            return 0.0
+    return np.array([map(value, r.split(',')) for r in rows], dtype=float).reshape((-1, ncols))
+
+def read_bwm(fname, ifaces=None, exclude=[], chunk=1 << 16):
+    """Read a bwm-ng csv file into a record array per interface, with
+    the fields in BWM_FIELDS (as many as the file has).  ifaces, if
+    given, restricts the interfaces read; exclude drops some.  The file
+    is read chunk lines at a time, and incomplete lines (the one being
+    written when bwm-ng was killed) are skipped."""
+    f = open(fname)
+    ncols = None
+    parts = defaultdict(list)
+    while True:
+        lines = list(itertools.islice(f, chunk))
+        if not lines:
             break
+        if ncols is None:
+            ncols = lines[0].count(',')
+        rows = defaultdict(list)
+        for l in lines:
+            if l.count(',') != ncols or not l.endswith('\n'):
+                continue
+            t, name, rest = l.split(',', 2)
+            if (ifaces is not None and name not in ifaces) or name in exclude:
+                continue
+            rows[name].append(t + ',' + rest.rstrip())
+        for name, r in rows.iteritems():
+            parts[name].append(_bwm_array(r, ncols))
+    f.close()
+    ret = {}
+    if ncols is None:
+        return ret
+    names = (BWM_FIELDS + ['col%d' % i for i in xrange(len(BWM_FIELDS), ncols)])[:ncols]
+    for name, p in parts.iteritems():
+        a = np.concatenate(p)
+        ret[name] = np.rec.fromarrays(a.T, names=names)
+    return ret
+
+@cached
+def parse_rate_usage(fname, ifaces=["eth2"], dir="tx", divider=1e6):
+    """Rate in units of divider bits/sec per interface, as arrays."""
+    field = 'bytes_out'
+    if dir == "rx":
+        field = 'bytes_in'
+    rate = defaultdict(list)
+    for ifname, data in read_bwm(fname, ifaces).iteritems():
+        rate[ifname] = data[field] * 8 / divider
     return rate
 
 def parse_perf_data(fname, delim=' '):
@@ -0,0 +1,81 @@
+"""Parse many result files in parallel.
+
+parse_all runs a parser over a list of paths in a process pool (the
+parsers are CPU bound, so threads would not help) and returns the
+results in the order of the paths, whatever order they finished in.  A
+file that fails to parse is put on the failure list instead of killing
+the whole run."""
+
+import sys
+import time
+import traceback
+import multiprocessing
+
+class Failure(object):
+    def __init__(self, path, error, traceback=None):
+        self.path = path
+        self.error = error
+        self.traceback = traceback
+
+    def __str__(self):
+        return "%s: %s" % (self.path, self.error)
+
+def _call(job):
+    i, fn, path = job
+    try:
+        return i, True, fn(path)
+    except KeyboardInterrupt:
+        raise
+    except Exception, e:
+        return i, False, (str(e) or e.__class__.__name__, traceback.format_exc())
+
+def _report(done, total, nfailed, start, final=False):
+    msg = "\rparsed %d/%d files" % (done, total)
+    if nfailed:
+        msg += " (%d failed)" % nfailed
+    msg += " in %.1fs" % (time.time() - start)
+    sys.stderr.write(msg + ("\n" if final else ""))
+    sys.stderr.flush()
+
+def parse_all(fn, paths, processes=None, progress=True):
+    """fn(path) for every path, using processes worker processes (one
+    per CPU by default).  Returns (results, failures): results[i] is
+    fn(paths[i]), or None if it failed, and failures lists Failure
+    objects in path order.  fn must be a module-level function."""
+    paths = list(paths)
+    results = [None] * len(paths)
+    errors = {}
+    start = time.time()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(paths))
+    jobs = [(i, fn, p) for i, p in enumerate(paths)]
+    if processes <= 1:
+        outputs = (_call(job) for job in jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        outputs = pool.imap_unordered(_call, jobs)
+    done = 0
+    try:
+        for i, ok, value in outputs:
+            done += 1
+            if ok:
+                results[i] = value
+            else:
+                errors[i] = value
+            if progress:
+                _report(done, len(paths), len(errors), start)
+    except KeyboardInterrupt:
+        if pool is not None:
+            pool.terminate()
+        raise
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if progress and paths:
+        _report(done, len(paths), len(errors), start, final=True)
+    failures = [Failure(paths[i], *errors[i]) for i in sorted(errors.keys())]
+    for f in failures:
+        print >>sys.stderr, "failed: %s" % f
+    return results, failures
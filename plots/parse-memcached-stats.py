@@ -6,6 +6,7 @@ import termcolor as T
 import plot_defaults
 import matplotlib.pyplot as plt
 import numpy as np
+from sketch import Sketch, ingest_mcperf
 
 parser = argparse.ArgumentParser("Memcached stats plotter.")
 
@@ -35,25 +36,14 @@ colours = '#ffffff,#dddddd,#aaaaaa,#777777,#eeeeee'.split(',')
 series = defaultdict(list)
 xaxis = "Bare,Bare\n+EyeQ,UDP,UDP\n+EyeQ".split(',')
 
-def parse_stats(f):
+def summarise(sketch):
+    """Percentiles (us) of the merged latency distribution."""
     ret = defaultdict(float)
-    for l in open(f).xreadlines():
-        if 'Response time [ms]: p' not in l:
-            continue
-        data = l.split(':')[1].strip()
-        data = data.split(' ')
-        kvs = zip(data[0::2], data[1::2])
-        for k, v in kvs:
-            ret[k] = float(v)
-    return ret
-
-def avg(lst):
-    return sum(lst) * 1.0 / len(lst)
-
-def summarise(stats):
-    ret = defaultdict(float)
-    for k in stats.keys():
-        ret[k] = avg(stats[k]) * 1000
+    for k in pciles:
+        p = float(pciles_labels[k].replace('p', ''))
+        v = sketch.percentile(p)
+        if v is not None:
+            ret[k] = v
     return ret
 
 def dprint(d):
@@ -66,16 +56,12 @@ for w in workloads:
     for t in tenants:
         for i in isos:
             dir = "memcached-mtu9000-iso%s-work%s-active%s" % (i, w, t)
-            agg_stats = defaultdict(list)
-            def aggregate(s):
-                for k in s.keys():
-                    if s[k] != 0.0:
-                        agg_stats[k].append(s[k])
-                return
+            # Merge the histograms of all clients, rather than
+            # averaging their percentiles
+            sketch = Sketch()
             for fname in glob.glob(args.dir + "/" + dir + "/*/mcperf*"):
-                stats = parse_stats(fname)
-                aggregate(stats)
-            agg_stats = summarise(agg_stats)
+                ingest_mcperf(fname, sketch)
+            agg_stats = summarise(sketch)
             print T.colored(dir, "green")
             dprint(agg_stats)
             for k in pciles:
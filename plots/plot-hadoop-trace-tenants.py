@@ -1,7 +1,6 @@
 from helper import *
-import re
-from collections import defaultdict
 import glob
+import fct
 import plot_defaults
 
 parser = argparse.ArgumentParser("Hadoop trace plotter.")
@@ -50,56 +49,14 @@ parser.add_argument('--inter',
 args = parser.parse_args()
 plot_defaults.rcParams['figure.figsize'] = 10, 3.5
 
-pat_start = re.compile(r'starting TCP flow seed (\d+).*size (\d+).*\-\-\-\s([\d\.]+)')
-pat_end = re.compile(r'ending TCP flow seed (\d+).*\-\-\-\s([\d\.]+)')
-
 def get_marker(tid):
     return 'oxsv'[tid]
 
 def parse_fcts(f):
-    flow_start = defaultdict(int)
-    flow_end = defaultdict(int)
-    flow_fct = {}
-    lines = open(f).readlines()
-    for line in lines:
-        ms = pat_start.match(line)
-        me = pat_end.match(line)
-        if ms:
-            fid = ms.group(1)
-            size = ms.group(2)
-            time = float(ms.group(3))
-            flow_start[fid] = time
-        if me:
-            fid = me.group(1)
-            time = float(me.group(2))
-            flow_end[fid] = time
-            flow_fct[fid] = flow_end[fid] - flow_start[fid]
-            #print me.group(2), line, flow_end[fid], flow_start[fid]
-            print "Flow %s completed in %.6f sec" % (fid, flow_fct[fid])
-    return flow_fct
+    return fct.fcts(f)
 
 def plot_cdf(values, bin_sec=0.001, **kwargs):
-    values.sort()
-    curr = values[0]
-    cdf_x = []
-    cdf_y = []
-    count = 0
-
-    cdf_x.append(values[0] - bin_sec)
-    cdf_y.append(0)
-
-    for v in values:
-        if v <= curr + bin_sec:
-            count += 1
-        else:
-            cdf_x.append(curr + bin_sec)
-            cdf_y.append(count)
-            count += 1
-            curr = v
-    cdf_x.append(curr+bin_sec)
-    cdf_y.append(count)
-    fracs = map(lambda c: c*1.0/count, cdf_y)
-    #print cdf_x, cdf_y, fracs
+    cdf_x, fracs = analytics.binned_cdf(values, bin_sec)
     plt.plot(cdf_x, fracs, **kwargs)
     return
 
@@ -117,10 +74,9 @@ for i,dir in enumerate(args.dirs):
         for d in glob.glob(dir + "/*"):
             print d
             fcts = parse_fcts(os.path.join(d, "sort-%d.txt" % j))
-            print j,fcts.values()
-            all_values += fcts.values()
+            all_values += list(fcts)
             if args.every:
-                plot_cdf(fcts.values(), alpha=0.3, color=col)
+                plot_cdf(fcts, alpha=0.3, color=col)
         plot_cdf(all_values, lw=4, color=col, label="P%s" % (args.base**j),
                  marker=get_marker(j), markersize=10, markevery=150)
         plt.axvline(x=max(all_values), ymin=0, ymax=1, ls='--', color=col,
@@ -1,7 +1,7 @@
 from helper import *
-import re
-from collections import defaultdict
 import glob
+from ingest import parse_all
+import fct
 
 parser = argparse.ArgumentParser("Hadoop trace plotter.")
 parser.add_argument('--dirs', '-d',
@@ -25,68 +25,34 @@ parser.add_argument('--out', '-o',
 args = parser.parse_args()
 assert(len(args.legend) == len(args.dirs))
 
-pat_start = re.compile(r'starting TCP flow seed (\d+).*size (\d+).*\-\-\-\s([\d\.]+)')
-pat_end = re.compile(r'ending TCP flow seed (\d+).*\-\-\-\s([\d\.]+)')
-
 def parse_fcts(f):
-    flow_start = defaultdict(int)
-    flow_end = defaultdict(int)
-    flow_fct = {}
-    lines = open(f).readlines()
-    for line in lines:
-        ms = pat_start.match(line)
-        me = pat_end.match(line)
-        if ms:
-            fid = ms.group(1)
-            size = ms.group(2)
-            time = float(ms.group(3))
-            flow_start[fid] = time
-        if me:
-            fid = me.group(1)
-            time = float(me.group(2))
-            flow_end[fid] = time
-            flow_fct[fid] = flow_end[fid] - flow_start[fid]
-            #print me.group(2), line, flow_end[fid], flow_start[fid]
-            print "Flow %s completed in %.6f sec" % (fid, flow_fct[fid])
-    return flow_fct
+    return fct.fcts(f)
 
 def plot_cdf(values, bin_sec=0.001, **kwargs):
-    values.sort()
-    curr = values[0]
-    cdf_x = []
-    cdf_y = []
-    count = 0
-
-    cdf_x.append(values[0] - bin_sec)
-    cdf_y.append(0)
-
-    for v in values:
-        if v <= curr + bin_sec:
-            count += 1
-        else:
-            cdf_x.append(curr + bin_sec)
-            cdf_y.append(count)
-            count += 1
-            curr = v
-    cdf_x.append(curr+bin_sec)
-    cdf_y.append(count)
-    fracs = map(lambda c: c*1.0/count, cdf_y)
-    #print cdf_x, cdf_y, fracs
+    cdf_x, fracs = analytics.binned_cdf(values, bin_sec)
     plt.plot(cdf_x, fracs, **kwargs)
     return
 
+def parse_host_fcts(d):
+    try:
+        return parse_fcts(os.path.join(d, "sort.txt"))
+    except (IOError, OSError):
+        return parse_fcts(os.path.join(d, "sort-0.txt"))
+
+# Parse every host directory of every experiment at once
+host_dirs = [sorted(glob.glob(dir + "/*")) for dir in args.dirs]
+results, failures = parse_all(parse_host_fcts, sum(host_dirs, []))
+results = iter(results)
+
 for i,dir in enumerate(args.dirs):
     all_values = []
     col = default_colours[i]
-    for d in glob.glob(dir + "/*"):
-        print d
-        try:
-            fcts = parse_fcts(os.path.join(d, "sort.txt"))
-        except:
-            fcts = parse_fcts(os.path.join(d, "sort-0.txt"))
-        print fcts.values()
-        all_values += fcts.values()
-        plot_cdf(fcts.values(), alpha=0.3, color=col)
+    for d in host_dirs[i]:
+        fcts = results.next()
+        if fcts is None:
+            continue
+        all_values += list(fcts)
+        plot_cdf(fcts, alpha=0.3, color=col)
 
     plot_cdf(all_values, lw=4, color=col, label=args.legend[i])
     plt.axvline(x=max(all_values), ymin=0, ymax=1, ls='--', color=col)
@@ -1,5 +1,5 @@
 from helper import *
-import re
+from sketch import memaslap_histogram
 
 parser = argparse.ArgumentParser("Memcached histogram plotter.")
 
@@ -26,35 +26,17 @@ args = parser.parse_args()
 if args.legend is None:
     args.legend = args.files
 
-pat = re.compile(r'(\d+) - \s+(\d+):\s+(\d+)')
-
 def parse(f):
-    lines = open(f).readlines()
-    skip = 2
-    xvalues = []
+    # The exact histogram of one file; merging files is sketch.py's job
+    hist = memaslap_histogram(f)
+    xvalues = [hi for hi, num in hist]
+    total = sum(num for hi, num in hist)
     yvalues_cdf = []
-    yvalues_pdf = []
-    sum = 0
-    for l in lines:
-        if skip == 2 and l.startswith("Total Statistics ("):
-            skip = 1
-            continue
-        elif skip == 1 and "lo_us -" in l:
-            skip = 0
-            continue
-        elif skip:
-            continue
-        assert(skip == 0)
-        m = pat.search(l)
-        if m:
-            lo, hi, num = m.group(1), m.group(2), m.group(3)
-            #print lo, hi, num
-            xvalues.append(int(hi))
-            sum += int(num)
-            yvalues_cdf.append(sum)
-            yvalues_pdf.append(int(num))
-    yvalues_cdf = map(lambda e: e * 1.0 / sum, yvalues_cdf)
-    yvalues_pdf = map(lambda e: e * 1.0 / sum, yvalues_pdf)
+    sum_ = 0
+    for hi, num in hist:
+        sum_ += num
+        yvalues_cdf.append(sum_ * 1.0 / total)
+    yvalues_pdf = [num * 1.0 / total for hi, num in hist]
     return (xvalues, yvalues_cdf, yvalues_pdf)
 
 for f,leg in zip(args.files, args.legend):
@@ -3,6 +3,7 @@ import plot_defaults
 from collections import defaultdict
 import re
 from matplotlib.font_manager import FontProperties
+from ingest import parse_all
 
 parser = argparse.ArgumentParser("Memcached stats plotter.")
 
@@ -54,6 +55,7 @@ if args.legend is None:
 
 spaces = re.compile(r'\s+')
 
+@cached
 def parse_ops(f):
     lines = open(f).readlines()
     state_values = defaultdict(list)
@@ -82,6 +84,7 @@ def parse_ops(f):
 
     return state_values
 
+@cached
 def parse_ops_mcperf(f):
     pat_reqr = re.compile(r'Request rate: ([0-9\.]+) req/s')
     pat_rspr = re.compile(r'Response rate: ([0-9\.]+) rsp/s')
@@ -101,16 +104,19 @@ def parse_ops_mcperf(f):
 def plot_ops(ax):
     i = -1
     colours=["blue", "orange", "green", "red", "magenta"]
-    for f,leg in zip(args.files, args.legend):
+    parse = parse_ops_mcperf if args.mcperf else parse_ops
+    results, failures = parse_all(parse, args.files)
+    for f,leg,values in zip(args.files, args.legend, results):
         i += 1
+        if values is None:
+            continue
         if '/' in leg:
             leg = os.path.basename(leg)
         if args.mcperf:
-            reqr, rspr = parse_ops_mcperf(f)
+            reqr, rspr = values
             ax.bar([i+0.0], [reqr], 0.25, label="Req/sec %s" % (leg), color=colours[i])
             ax.bar([i+0.25], [rspr], 0.25, label="Resp/sec %s" % (leg), color=colours[i], alpha=0.5)
         else:
-            values = parse_ops(f)
             ys = values['total']
             ax.plot(ys, lw=2, label=leg)
             ax.set_xlabel("Samples")
@@ -123,6 +129,7 @@ def plot_ops(ax):
     ax.set_title(args.ops_title)
 
 pat = re.compile(r'(\d+) - \s+(\d+):\s+(\d+)')
+@cached
 def parse_latency(f):
     lines = open(f).readlines()
     skip = 2
@@ -153,6 +160,7 @@ def parse_latency(f):
     return (xvalues, yvalues_cdf, yvalues_pdf)
 
 pat_mcperf = re.compile(r'([\d\.]+) (\d+)')
+@cached
 def parse_latency_mcperf(f):
     lines = open(f).readlines()
     skip = 0
@@ -191,13 +199,14 @@ def plot_latency(ax):
     ls = ['-', '-', '--', '-.', ':']
     colours=["blue", "orange", "green", "red", "magenta"]
 
-    for f,leg in zip(args.files, args.legend):
+    parse = parse_latency_mcperf if args.mcperf else parse_latency
+    results, failures = parse_all(parse, args.files)
+    for f,leg,values in zip(args.files, args.legend, results):
         i += 1
+        if values is None:
+            continue
         leg = leg.replace('-without-EyeQ', '')
-        if args.mcperf:
-            x, yc, yp = parse_latency_mcperf(f)
-        else:
-            x, yc, yp = parse_latency(f)
+        x, yc, yp = values
         ax.plot(x, yc, lw=4, label=leg, ls=ls[i], color=colours[i])#, marker='so^v'[i], markersize=15, markevery=300)
 
     ax.grid(True)
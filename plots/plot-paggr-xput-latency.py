@@ -48,27 +48,7 @@ def parse_fcts(f):
     return fcts
 
 def plot_cdf(values, bin_sec=0.001, **kwargs):
-    values.sort()
-    curr = values[0]
-    cdf_x = []
-    cdf_y = []
-    count = 0
-
-    cdf_x.append(values[0] - bin_sec)
-    cdf_y.append(0)
-
-    for v in values:
-        if v <= curr + bin_sec:
-            count += 1
-        else:
-            cdf_x.append(curr + bin_sec)
-            cdf_y.append(count)
-            count += 1
-            curr = v
-    cdf_x.append(curr+bin_sec)
-    cdf_y.append(count)
-    fracs = map(lambda c: c*1.0/count, cdf_y)
-    #print cdf_x, cdf_y, fracs
+    cdf_x, fracs = analytics.binned_cdf(values, bin_sec)
     plt.plot(cdf_x, fracs, **kwargs)
     return
 
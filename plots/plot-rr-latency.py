@@ -3,10 +3,10 @@ import sys
 import argparse
 import termcolor as T
 import re
-from collections import defaultdict
 from helper import *
 import plot_defaults
 import matplotlib as mp
+from sketch import netperf_histogram
 
 parser = argparse.ArgumentParser(description="Plot netperf experiment outputs.")
 parser.add_argument('--rr',
@@ -36,27 +36,19 @@ args = parser.parse_args()
 rspaces = re.compile(r'\s+')
 
 def cdf(lst):
-    vals = []
-    nums = []
-    cum = 0
-    for val, num in lst:
-        cum += num
-        vals.append(val)
-        nums.append(cum)
-    return vals, map(lambda n: n*1.0/cum, nums)
+    return analytics.weighted_cdf(lst)
 
 def plot_cdf(x, y, **opts):
     #plt.figure()
     plt.plot(x, y, **opts)
     #plt.show()
 
-class RRParser:
+class RRParser(object):
     def __init__(self, filename):
         self.filename = filename
-        self.lines = open(filename).readlines()
         self.done = False
         try:
-            self.parse()
+            self.__dict__.update(parse_rr(filename))
             self.done = True
         except Exception, e:
             print 'error parsing %s' % filename
@@ -93,28 +85,17 @@ class RRParser:
         return
 
     def parse_histogram(self):
-        line_no = 0
-        for line in self.lines:
-            if 'Histogram' in line:
-                break
-            line_no += 1
-        line_no += 1
-        unit = 1
-        rsep = re.compile(r':\s+')
-        ret = defaultdict(int)
-        def parse_buckets(line):
-            nums = line.split(":", 1)[1]
-            nums = map(lambda e: int(e.strip()),
-                       rsep.split(nums))
-            return nums
-        for lno in xrange(line_no, line_no+8):
-            nums = parse_buckets(self.lines[lno])
-            for i,n in enumerate(nums):
-                ret[unit+i*unit] += n
-            unit *= 10
-        ret = sorted(list(ret.iteritems()))
-        self.histogram = ret
-        return ret
+        self.histogram = netperf_histogram(self.lines)
+        return self.histogram
+
+@cached
+def parse_rr(filename):
+    """RRParser's parsed fields for filename."""
+    r = RRParser.__new__(RRParser)
+    r.lines = open(filename).readlines()
+    r.parse()
+    del r.lines
+    return r.__dict__
 
 def plot():
     markers='so'
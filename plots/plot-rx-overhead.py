@@ -1,6 +1,5 @@
 import plot_defaults
 from helper import *
-import math
 
 parser = argparse.ArgumentParser()
 
@@ -79,14 +78,6 @@ bar_width=1
 bar_group=len(nums)+1
 cols = args.cols
 
-def avg(l):
-    return sum(l) * 1.0 /len(l)
-
-def stdev(l):
-    m = avg(l)
-    dev = map(lambda x: (x - m)**2, l)
-    return math.sqrt(avg(dev))
-
 def plot_without(without=False):
     alpha = 1
     first = True
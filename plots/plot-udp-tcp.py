@@ -26,23 +26,8 @@ RX=1
 args = parser.parse_args()
 
 def parse_rate(fname, iface, type=TX):
-    data = read_list(fname)
-    values = []
-    column = 2
-    if type == RX:
-        column = 3
-    for row in data:
-        try:
-            ifname = row[1]
-        except:
-            break
-        if ifname != iface:
-            continue
-        try:
-            values.append(float(row[column]) * 8 / 1e6)
-        except:
-            break
-    return values
+    dir = "rx" if type == RX else "tx"
+    return parse_rate_usage(fname, ifaces=[iface], dir=dir, divider=1e6)[iface]
 
 def plt_rx():
     host = pick_host_name(0)
@@ -76,30 +76,12 @@ unix_timestamp;iface_name;bytes_out;bytes_in;bytes_total;packets_out;packets_in;
 """
 
 for f in args.files:
-    data = read_list(f)
-    #xaxis = map(float, col(0, data))
-    #start_time = xaxis[0]
-    #xaxis = map(lambda x: x - start_time, xaxis)
-    #rate = map(float, col(2, data))
+    field = 'bytes_in' if args.rx else 'bytes_out'
     rate = {}
-    column = 2
-    if args.rx:
-        column = 3
-    for row in data:
-        try:
-            ifname = row[1]
-        except:
-            break
-        if ifname not in ['eth0', 'lo']:
-            if not rate.has_key(ifname):
-                rate[ifname] = []
-            try:
-                value = float(row[column]) * 8 / 1e6
-                if value > args.maxy:
-                    args.maxy = 10000
-                rate[ifname].append(value)
-            except:
-                break
+    for ifname, data in read_bwm(f, exclude=['eth0', 'lo']).iteritems():
+        rate[ifname] = data[field] * 8 / 1e6
+        if len(rate[ifname]) and rate[ifname].max() > float(args.maxy):
+            args.maxy = 10000
     print rate
     if args.summarise:
         for k in rate.keys():
@@ -5,6 +5,7 @@ import os
 import glob
 import sys
 import plot_defaults
+import tenantdata
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--files', '-f',
@@ -95,6 +96,17 @@ parser.add_argument('--headroom',
                     action="store_true",
                     dest="headroom")
 
+parser.add_argument('--expected',
+                    help="Rates predicted by loadcheck.py (<matrix>.expected), drawn dashed",
+                    default=None,
+                    dest="expected")
+
+parser.add_argument('--expected-shift',
+                    help="Add to the predicted times (when loadgen started on the x-axis)",
+                    default=0.0,
+                    type=float,
+                    dest="expected_shift")
+
 parser.add_argument('--xlabels',
                     help="x tick labels: comma sep")
 
@@ -108,6 +120,23 @@ if args.rx == True or args.tx == True:
 
 m.rc('figure', figsize=(cols * 8, 6))
 
+@cached
+def parse_loadgen_output(f):
+    ret = defaultdict(list)
+    for l in open(f):
+        if l[0] not in '0123456789':
+            continue
+        try:
+            t, rx, tx, blah1, blah2 = map(float, l.strip().split(' '))
+        except:
+            print 'error, ignoring line:', f, l
+            continue
+        ret['t'].append(t)
+        ret['rx'].append(rx)
+        ret['tx'].append(tx)
+    print 'parsed file %s' % f
+    return ret
+
 def parse_loadgen_file(f):
     dir = os.path.dirname(f)
     files = glob.glob(dir + "/%s*.txt" % LOADGEN_OUTPUT)
@@ -116,58 +145,50 @@ def parse_loadgen_file(f):
     print files
     for f in sorted(files):
         tid += 1
-        lines = open(f).readlines()
-        for l in lines:
-            if l[0] not in '0123456789':
-                continue
-            try:
-                t, rx, tx, blah1, blah2 = map(float, l.strip().split(' '))
-            except:
-                print 'error, ignoring line:', f, l
-                continue
-            if not ret.has_key(tid):
-                ret[tid] = defaultdict(list)
-            ret[tid]['t'].append(t)
-            ret[tid]['rx'].append(rx)
-            ret[tid]['tx'].append(tx)
-        print 'parsed file %s' % f
+        data = parse_loadgen_output(f)
+        if len(data['t']):
+            ret[tid] = data
     return ret
 
+def parse_range():
+    if not args.range:
+        return None, None
+    try:
+        lo, hi = map(float, args.range.split(':'))
+    except ValueError:
+        return None, None
+    return lo, hi
+
 def parse_file(f):
     if 'tenant.txt' not in f:
         return parse_loadgen_file(f)
-    lines = open(f).readlines()
-    start_time = 0
-    ret = {}
-    for l in lines:
-        if l.startswith('#'):
+    # Only the --range window is read from the binary form
+    lo, hi = parse_range()
+    return tenantdata.load(f, lo, hi)
+
+def parse_expected(f):
+    """(host id, tid) -> {'t', 'tx', 'rx'} arrays of expected Mbps"""
+    rows = defaultdict(list)
+    for l in open(f):
+        if l[0] == '#':
             continue
-        t, tid, tx, rx = l.split(',')
-        t, tx, rx = map(float, [t, tx, rx])
-        if start_time == 0:
-            start_time = t
-        if not ret.has_key(tid):
-            ret[tid] = defaultdict(list)
-        ret[tid]['t'].append(t - start_time)
-        ret[tid]['tx'].append(tx)
-        ret[tid]['rx'].append(rx)
-    print 'parsed file %s' % f
+        t, host, tid, dir, offered, expected = l.split()
+        rows[(int(host), int(tid), dir)].append((float(t), float(expected)))
+    ret = defaultdict(dict)
+    for (host, tid, dir), values in rows.iteritems():
+        values = np.array(values)
+        ret[(host, tid)]['t'] = values[:, 0] + args.expected_shift
+        ret[(host, tid)][dir] = values[:, 1]
     return ret
 
+expected = {}
+if args.expected:
+    expected = parse_expected(args.expected)
+
 def accum(values):
     if args.accum is None or args.accum == 1:
         return values
-    ret = []
-    count = 0
-    tot = 0
-    for v in values:
-        tot += v
-        count += 1
-        if count == args.accum:
-            ret.append(tot*1.0/args.accum)
-            count = 0
-            tot = 0
-    return ret
+    return analytics.window_mean(values, args.accum)
 
 def get_marker(tid):
     return 'so^v'[tid%3]
@@ -192,6 +213,9 @@ def plot_rate(ax, data, dir="tx", title=args.title, markevery=args.every):
             label = args.labels[TID]
         ax.plot(xvalues, yvalues, lw=2, label=label, color=default_colours[TID%l],
                 marker=get_marker(TID), markevery=markevery, markersize=15)
+        e = expected.get((int(str(tid).split('.')[-1]), TID+1), {})
+        if dir in e:
+            ax.plot(e['t'], e[dir], lw=2, ls='--', color=default_colours[TID%l])
         if len(total) == 0:
             total = yvalues
         else:
@@ -215,7 +239,7 @@ def plot_rate(ax, data, dir="tx", title=args.title, markevery=args.every):
     ax.legend(loc="upper right")
     if args.range:
         try:
-            lo,hi = map(float, args.range.split(':'))
+            lo,hi = parse_range()
             ax.set_xlim((lo, hi))
             if args.xlabels:
                 print 'setting', args.xlabels
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""Mergeable latency sketches.
+
+A Sketch is a histogram with logarithmically sized buckets (as in HDR
+histograms): a value v goes into bucket ceil(log(v) / log(gamma)), so
+every quantile it reports is within a relative error of `accuracy` of
+the true one, whatever the range of the values.  Sketches of the same
+accuracy merge by adding bucket counts, so the distributions of many
+clients, hosts and repetitions can be combined exactly, instead of
+averaging their percentiles.
+
+The ingest functions read the latency histograms of mcperf, memaslap
+and netperf RR outputs in one pass.  Values are in microseconds.
+
+    python plots/sketch.py --pciles 50,95,99,99.9 memcached-*/l*/mcperf*"""
+
+import re
+import sys
+import math
+import json
+import argparse
+from collections import defaultdict
+
+class Sketch(object):
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.lngamma = math.log(self.gamma)
+        self.buckets = defaultdict(int)
+        # Values <= 0 cannot go in a log bucket
+        self.zeros = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def key(self, value):
+        return int(math.ceil(math.log(value) / self.lngamma))
+
+    def value(self, key):
+        """Representative value of a bucket, (gamma^(k-1), gamma^k]."""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if count <= 0:
+            return
+        if value <= 0:
+            self.zeros += count
+        else:
+            self.buckets[self.key(value)] += count
+        self.count += count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def add_values(self, values):
+        """Add an array of values at once (needs NumPy)."""
+        import numpy as np
+        v = np.asarray(values, dtype=float)
+        if len(v) == 0:
+            return
+        pos = v[v > 0]
+        self.zeros += len(v) - len(pos)
+        if len(pos):
+            keys = np.ceil(np.log(pos) / self.lngamma).astype(int)
+            lo = keys.min()
+            for i, n in enumerate(np.bincount(keys - lo)):
+                if n:
+                    self.buckets[int(lo + i)] += int(n)
+        self.count += len(v)
+        for m in [float(v.min()), float(v.max())]:
+            if self.min is None or m < self.min:
+                self.min = m
+            if self.max is None or m > self.max:
+                self.max = m
+
+    def merge(self, other):
+        if other.accuracy != self.accuracy:
+            raise ValueError("cannot merge sketches of accuracy %s and %s" %
+                             (self.accuracy, other.accuracy))
+        for k, n in other.buckets.iteritems():
+            self.buckets[k] += n
+        self.zeros += other.zeros
+        self.count += other.count
+        for m in [other.min, other.max]:
+            if m is None:
+                continue
+            if self.min is None or m < self.min:
+                self.min = m
+            if self.max is None or m > self.max:
+                self.max = m
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), or None if the sketch is empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.0
+        cum = self.zeros
+        for k in sorted(self.buckets.keys()):
+            cum += self.buckets[k]
+            if cum > rank:
+                # Clamp to what was actually seen
+                return min(max(self.value(k), self.min), self.max)
+        return self.max
+
+    def percentile(self, p):
+        return self.quantile(p / 100.0)
+
+    def cdf(self):
+        """(values, fractions) at the bucket boundaries."""
+        x, y = [], []
+        cum = self.zeros
+        if self.zeros:
+            x.append(0.0)
+            y.append(cum * 1.0 / self.count)
+        for k in sorted(self.buckets.keys()):
+            cum += self.buckets[k]
+            x.append(self.gamma ** k)
+            y.append(cum * 1.0 / self.count)
+        return (x, y)
+
+    def to_dict(self):
+        return {'accuracy': self.accuracy, 'zeros': self.zeros, 'count': self.count,
+                'min': self.min, 'max': self.max,
+                'buckets': [[k, n] for k, n in sorted(self.buckets.iteritems())]}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d['accuracy'])
+        for k, n in d['buckets']:
+            s.buckets[k] = n
+        s.zeros = d['zeros']
+        s.count = d['count']
+        s.min = d['min']
+        s.max = d['max']
+        return s
+
+    def save(self, path):
+        json.dump(self.to_dict(), open(path, 'w'))
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(json.load(open(path)))
+
+def merged(sketches, accuracy=0.01):
+    ret = Sketch(accuracy)
+    for s in sketches:
+        ret.merge(s)
+    return ret
+
+pat_mcperf = re.compile(r'([\d\.]+) (\d+)')
+def ingest_mcperf(f, sketch=None):
+    """mcperf's "Response time histogram [ms]"."""
+    sketch = sketch or Sketch()
+    started = False
+    for l in open(f):
+        if not started:
+            started = "Response time histogram [ms]" in l
+            continue
+        l = l.strip()
+        if "Response time [ms]: p25" in l:
+            break
+        m = pat_mcperf.search(l)
+        if m:
+            sketch.add(float(m.group(1)) * 1e3, int(m.group(2)))
+    return sketch
+
+pat_memaslap = re.compile(r'(\d+) - \s+(\d+):\s+(\d+)')
+def memaslap_histogram(f):
+    """(hi_us, count) pairs of memaslap's "Total Statistics" histogram
+    (lo_us - hi_us: count), exactly as printed."""
+    ret = []
+    skip = 2
+    for l in open(f):
+        if skip == 2 and l.startswith("Total Statistics ("):
+            skip = 1
+        elif skip == 1 and "lo_us -" in l:
+            skip = 0
+        elif skip == 0:
+            m = pat_memaslap.search(l)
+            if m:
+                ret.append((int(m.group(2)), int(m.group(3))))
+    return ret
+
+def ingest_memaslap(f, sketch=None):
+    """memaslap's histogram; each bucket is counted at its upper edge."""
+    sketch = sketch or Sketch()
+    for v, n in memaslap_histogram(f):
+        sketch.add(v, n)
+    return sketch
+
+def netperf_histogram(lines):
+    """(usec, count) pairs from netperf's 8-row histogram (rows of 10
+    buckets of 1us, 10us, ... 10s); each bucket at its upper edge."""
+    ret = defaultdict(int)
+    rsep = re.compile(r':\s+')
+    start = None
+    for i, l in enumerate(lines):
+        if 'Histogram' in l:
+            start = i + 1
+            break
+    if start is None:
+        return []
+    unit = 1
+    for l in lines[start:start+8]:
+        nums = map(lambda e: int(e.strip()), rsep.split(l.split(":", 1)[1]))
+        for i, n in enumerate(nums):
+            ret[unit + i*unit] += n
+        unit *= 10
+    return sorted(ret.iteritems())
+
+def ingest_netperf(f, sketch=None):
+    sketch = sketch or Sketch()
+    for v, n in netperf_histogram(open(f).readlines()):
+        sketch.add(v, n)
+    return sketch
+
+def ingest(f, sketch=None):
+    """Ingest f, guessing its format from its contents.  A saved sketch
+    (.json) is merged in as is."""
+    sketch = sketch or Sketch()
+    if f.endswith('.json'):
+        return sketch.merge(Sketch.load(f))
+    for l in open(f):
+        if "Response time histogram [ms]" in l:
+            return ingest_mcperf(f, sketch)
+        if l.startswith("Total Statistics ("):
+            return ingest_memaslap(f, sketch)
+        if "Histogram" in l:
+            return ingest_netperf(f, sketch)
+    raise ValueError("%s: no latency histogram found" % f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Merged latency percentiles of mcperf/memaslap/netperf outputs.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--pciles', default="50,95,99,99.9",
+                        help="Comma separated percentiles")
+    parser.add_argument('--accuracy', type=float, default=0.01)
+    parser.add_argument('--save', default=None,
+                        help="Save the merged sketch (json) for later merging")
+    parser.add_argument('--unit', choices=["us", "ms"], default="us",
+                        help="Print percentiles in us (\"50pc 812.3 us\") or in ms, as \"50pc 0.812\"")
+    args = parser.parse_args()
+    sketch = Sketch(args.accuracy)
+    for f in args.files:
+        try:
+            ingest(f, sketch)
+        except (IOError, ValueError), e:
+            print >>sys.stderr, e
+    print >>sys.stderr, "%d samples from %d files" % (sketch.count, len(args.files))
+    for p in args.pciles.split(','):
+        v = sketch.percentile(float(p))
+        if v is None:
+            continue
+        if args.unit == "ms":
+            print "%spc %.3f" % (p, v / 1e3)
+        else:
+            print "%spc %.1f us" % (p, v)
+    if args.save:
+        sketch.save(args.save)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Binary, memory-mapped per-tenant series from pimonitor's tenant.txt.
+
+tenant.txt has one "t,tid,tx,rx" line per tenant per sample, and at 1ms
+sampling it gets very large.  convert() splits it once into one file of
+fixed-width (t, tx, rx) float64 records per tenant in <tenant.txt>.d/,
+and load() memory-maps those files and returns only the samples in a
+time window, so zooming into a few seconds of a long run reads a few
+pages instead of the whole text file.  load() converts (again) by
+itself whenever tenant.txt is newer than its binary form.
+
+    python plots/tenantdata.py exptdata/*/*/l*/tenant.txt"""
+
+import os
+import sys
+import json
+import bisect
+import itertools
+import numpy as np
+from collections import defaultdict
+
+DTYPE = np.dtype([('t', '<f8'), ('tx', '<f8'), ('rx', '<f8')])
+INDEX = 'index.json'
+
+def data_dir(path):
+    return path + '.d'
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime]
+
+def read_index(path):
+    """The index of path's binary form, or None if missing or stale."""
+    index = os.path.join(data_dir(path), INDEX)
+    try:
+        ret = json.load(open(index))
+    except (IOError, ValueError):
+        return None
+    if ret.get('source') != _stamp(path):
+        return None
+    return ret
+
+def convert(path, chunk=1 << 16):
+    """Write the per-tenant binary files for path; returns the index.
+    Memory use is bounded by chunk lines."""
+    d = data_dir(path)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    stamp = _stamp(path)
+    files = {}
+    counts = defaultdict(int)
+    start = None
+    f = open(path)
+    while True:
+        lines = list(itertools.islice(f, chunk))
+        if not lines:
+            break
+        rows = defaultdict(list)
+        for l in lines:
+            # Skip comments and the incomplete last line of a live file
+            if l.startswith('#') or l.count(',') != 3 or not l.endswith('\n'):
+                continue
+            t, tid, rest = l.split(',', 2)
+            rows[tid].append(t + ',' + rest.rstrip())
+        for tid, r in rows.iteritems():
+            a = np.fromstring(','.join(r), dtype='<f8', sep=',').reshape((-1, 3))
+            if start is None or a[0, 0] < start:
+                start = a[0, 0]
+            if tid not in files:
+                files[tid] = open(os.path.join(d, '%s.bin' % tid), 'wb')
+            a.view(DTYPE).tofile(files[tid])
+            counts[tid] += len(a)
+    f.close()
+    for fb in files.values():
+        fb.close()
+    index = {'source': stamp, 'start': start or 0.0, 'counts': counts,
+             'tids': sorted(files.keys())}
+    # The index goes last, so a crash mid-way leaves no valid index
+    tmp = os.path.join(d, INDEX + '.tmp')
+    json.dump(index, open(tmp, 'w'))
+    os.rename(tmp, os.path.join(d, INDEX))
+    return index
+
+def series(path, tid, index=None):
+    """Memory-mapped record array (t, tx, rx) for one tenant."""
+    if index is None:
+        index = read_index(path) or convert(path)
+    if index['counts'].get(tid, 0) == 0:
+        return np.zeros(0, dtype=DTYPE)
+    fname = os.path.join(data_dir(path), '%s.bin' % tid)
+    return np.memmap(fname, dtype=DTYPE, mode='r')
+
+def window(rec, lo=None, hi=None):
+    """The slice of rec with lo <= t <= hi.  Binary search on the
+    strided t view touches O(log n) pages; np.searchsorted would copy
+    the whole column first."""
+    t = rec['t']
+    i, j = 0, len(rec)
+    if lo is not None:
+        i = bisect.bisect_left(t, lo)
+    if hi is not None:
+        j = bisect.bisect_right(t, hi)
+    return rec[i:j]
+
+def load(path, lo=None, hi=None):
+    """{tid: {'t': ..., 'tx': ..., 'rx': ...}} like
+    plot_tenant_rate.parse_file, with t relative to the first sample
+    and only the samples in [lo, hi]."""
+    index = read_index(path)
+    if index is None:
+        print 'converting %s' % path
+        index = convert(path)
+    start = index['start']
+    if lo is not None:
+        lo += start
+    if hi is not None:
+        hi += start
+    ret = {}
+    for tid in map(str, index['tids']):
+        rec = window(series(path, tid, index), lo, hi)
+        ret[tid] = {'t': rec['t'] - start, 'tx': rec['tx'], 'rx': rec['rx']}
+    return ret
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        index = convert(path)
+        print '%s: %d tenants, %d samples' % (path, len(index['tids']), sum(index['counts'].values()))
@@ -0,0 +1,99 @@
+"""Readiness probes for experiment start paths.
+
+Instead of fixed sleeps followed by serial nc loops, wait_ready polls
+every probe concurrently with exponential backoff and returns as soon
+as the whole cluster is ready."""
+
+import socket
+import threading
+import time
+import termcolor as T
+from parallel import fanout
+
+class NotReady(Exception):
+    def __init__(self, probes):
+        self.probes = probes
+        Exception.__init__(self, "not ready: %s" % ', '.join(map(str, probes)))
+
+class Probe(object):
+    def check(self):
+        raise NotImplementedError
+
+class TcpProbe(Probe):
+    """Ready once ip:port accepts a connection (like nc -z, which is
+    also what kicks off a waiting loadgen)."""
+    def __init__(self, ip, port, timeout=0.5):
+        self.ip = ip
+        self.port = int(port)
+        self.timeout = timeout
+
+    def check(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.settimeout(self.timeout)
+        try:
+            return s.connect_ex((self.ip, self.port)) == 0
+        except socket.error:
+            return False
+        finally:
+            s.close()
+
+    def __str__(self):
+        return "%s:%s" % (self.ip, self.port)
+
+class ProcessProbe(Probe):
+    """Ready once a process called name runs on host."""
+    def __init__(self, host, name):
+        self.host = host
+        self.name = name
+
+    def check(self):
+        return "ready" in self.host.cmd("pgrep -x %s > /dev/null && echo ready" % self.name)
+
+    def __str__(self):
+        return "%s:%s" % (self.host.addr, self.name)
+
+class LogProbe(Probe):
+    """Ready once pattern (a grep regex) appears in path on host."""
+    def __init__(self, host, path, pattern):
+        self.host = host
+        self.path = path
+        self.pattern = pattern
+
+    def check(self):
+        c = "grep -q '%s' %s 2>/dev/null && echo ready" % (self.pattern, self.path)
+        return "ready" in self.host.cmd(c)
+
+    def __str__(self):
+        return "%s:%s" % (self.host.addr, self.path)
+
+def wait_ready(probes, timeout=60, initial=0.05, factor=2, max_delay=2.0,
+               max_workers=64, verbose=True):
+    """Poll all probes concurrently until every one is ready.  Each
+    probe backs off from initial to max_delay seconds between checks.
+    Returns the time taken; raises NotReady with the stragglers after
+    timeout seconds (None waits forever)."""
+    probes = list(probes)
+    start = time.time()
+    state = {'ready': 0}
+    lock = threading.Lock()
+
+    def poll(p):
+        delay = initial
+        while True:
+            if p.check():
+                with lock:
+                    state['ready'] += 1
+                    if verbose:
+                        print T.colored("  ready %s (%d/%d, %.2fs)" % (p, state['ready'], len(probes),
+                                                                        time.time() - start), "green")
+                return True
+            if timeout is not None and time.time() - start + delay > timeout:
+                return False
+            time.sleep(delay)
+            delay = min(delay * factor, max_delay)
+
+    results, errors = fanout(poll, probes, max_workers)
+    stragglers = [p for p, ok, e in zip(probes, results, errors) if not ok or e is not None]
+    if stragglers:
+        raise NotReady(stragglers)
+    return time.time() - start
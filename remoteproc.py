@@ -0,0 +1,143 @@
+import threading
+import pipes
+import time
+from collections import deque
+
+# First line printed by every RemoteProcess, carrying the pid of the
+# remote shell.  sshd makes that shell a session and process group
+# leader, so killing the group takes the whole pipeline with it.
+PID_MARKER = "__eyeq_pid__"
+
+class RemoteProcess(object):
+    """A long-running command on a remote host.
+
+    Output (stdout and stderr combined) is drained by a background
+    thread as it arrives, so the remote side never stalls on a full
+    channel window.  The last maxlines lines are kept in memory and,
+    if out is given, everything is also appended to that local file.
+    on_line, if given, is called with every line from the drain
+    thread."""
+    def __init__(self, host, cmd, out=None, maxlines=1000, on_line=None):
+        self.host = host
+        self.cmd = cmd
+        self.on_line = on_line
+        self.pid = None
+        self.status = None
+        self.lines = deque(maxlen=maxlines)
+        # Total number of lines seen, including those pushed out of
+        # self.lines; stream() uses it to find where it left off.
+        self.nlines = 0
+        self.done = False
+        self.cond = threading.Condition()
+        self.outfile = None
+        if out is not None:
+            self.outfile = open(out, 'ab')
+        chan = host.get().get_transport().open_session()
+        chan.set_combine_stderr(True)
+        chan.exec_command("echo %s $$; exec sh -c %s" % (PID_MARKER, pipes.quote(cmd)))
+        self.chan = chan
+        self.thread = threading.Thread(target=self._drain)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _drain(self):
+        partial = ''
+        while True:
+            data = self.chan.recv(32768)
+            if not data:
+                break
+            lines = (partial + data).split('\n')
+            partial = lines.pop()
+            self._add(lines)
+        if partial:
+            self._add([partial])
+        status = self.chan.recv_exit_status()
+        if self.outfile is not None:
+            self.outfile.close()
+        with self.cond:
+            self.status = status
+            self.done = True
+            self.cond.notifyAll()
+
+    def _add(self, lines):
+        new = []
+        with self.cond:
+            for l in lines:
+                if self.pid is None and l.startswith(PID_MARKER):
+                    self.pid = int(l.split()[1])
+                    continue
+                self.lines.append(l)
+                self.nlines += 1
+                new.append(l)
+                if self.outfile is not None:
+                    self.outfile.write(l + '\n')
+            self.cond.notifyAll()
+        if self.on_line is not None:
+            for l in new:
+                self.on_line(l)
+
+    def poll(self):
+        """Exit status, or None if still running."""
+        with self.cond:
+            return self.status
+
+    def wait(self, timeout=None):
+        """Wait for the command to exit; returns its exit status, or
+        None if it is still running after timeout seconds."""
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+        with self.cond:
+            while not self.done:
+                left = 1.0
+                if end is not None:
+                    left = min(left, end - time.time())
+                    if left <= 0:
+                        break
+                # A bounded wait keeps Ctrl-C working.
+                self.cond.wait(left)
+            return self.status
+
+    def kill(self, grace=1.0):
+        """SIGTERM the remote process group, then SIGKILL it if it has
+        not exited after grace seconds."""
+        with self.cond:
+            # The pid line may still be in flight for a fresh process
+            if self.pid is None and not self.done:
+                self.cond.wait(grace)
+        if self.done:
+            return self.status
+        if self.pid is None:
+            self.chan.close()
+            return None
+        self.host.cmd("kill -TERM -- -%d" % self.pid)
+        if self.wait(grace) is None:
+            self.host.cmd("kill -KILL -- -%d" % self.pid)
+            self.wait(grace)
+        self.chan.close()
+        return self.status
+
+    def output(self):
+        """Buffered output lines (at most maxlines)."""
+        with self.cond:
+            return list(self.lines)
+
+    def stream(self, timeout=None):
+        """Yield output lines as they arrive until the command exits.
+        Lines that fell out of the buffer before they were read are
+        skipped.  Stops after timeout seconds without output."""
+        seen = 0
+        while True:
+            with self.cond:
+                if self.nlines == seen and not self.done:
+                    self.cond.wait(timeout if timeout is not None else 1.0)
+                    if self.nlines == seen and timeout is not None and not self.done:
+                        return
+                new = self.nlines - seen
+                lines = list(self.lines)[-new:] if new else []
+                seen = self.nlines
+                done = self.done
+            for l in lines:
+                yield l
+            if done and not lines:
+                return
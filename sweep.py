@@ -0,0 +1,161 @@
+#!/usr/bin/python
+"""In-process parameter sweeps.
+
+Runs an experiment script once per point of a parameter grid inside a
+single interpreter, so every point reuses the loaded modules and the
+cached SSH connections (and agents) in Host instead of paying for a
+fresh python and fresh connections.  Completed points are appended to a
+checkpoint file, so an interrupted sweep picks up where it stopped;
+failed points are run again on resume.
+
+    python tests/sweep.py tests/test_hadoop_trace.py \\
+        --grid mtu=9000 --grid iso=,--inv-weighted --grid nhadoop=3 \\
+        --order mtu,iso \\
+        --args "--mtu {mtu} {iso} --nhadoop {nhadoop} --reconcile \\
+                --dir /tmp/{exptid}/iso{iso}-mtu{mtu}-nhadoop{nhadoop} --exptid {exptid}"
+"""
+
+import sys
+import os
+import json
+import time
+import shlex
+import argparse
+import itertools
+import traceback
+import termcolor as T
+
+def point_key(point):
+    return json.dumps(sorted(point.items()))
+
+def grid_points(grid, order=None):
+    """All points of grid (name -> list of values) as dicts.  Points are
+    sorted on the names in order first, so that the expensive
+    parameters (MTU, module enabled or not) change as rarely as
+    possible; values keep their order within each name."""
+    names = sorted(grid.keys())
+    order = list(order or [])
+    points = [dict(zip(names, values))
+              for values in itertools.product(*[grid[n] for n in names])]
+    def rank(point):
+        return tuple(grid[n].index(point[n]) for n in order)
+    # sort is stable, so the remaining names keep product order
+    points.sort(key=rank)
+    return points
+
+class Checkpoint(object):
+    """Append-only record of finished points, one JSON object per line."""
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            for l in open(path):
+                try:
+                    rec = json.loads(l)
+                except ValueError:
+                    # Torn last line from an interrupted write
+                    continue
+                self.done[point_key(rec['point'])] = rec
+
+    def finished(self, point):
+        rec = self.done.get(point_key(point), None)
+        return rec is not None and rec['status'] == "ok"
+
+    def record(self, point, status, elapsed):
+        rec = {'point': point, 'status': status, 'elapsed': elapsed}
+        self.done[point_key(point)] = rec
+        if not self.path:
+            return
+        d = os.path.dirname(self.path)
+        if d and not os.path.exists(d):
+            os.makedirs(d)
+        f = open(self.path, 'a')
+        f.write(json.dumps(rec) + '\n')
+        f.close()
+
+def run_script(script, argv):
+    """Run script as __main__ with argv in this interpreter.  Returns
+    True if it finished (or called sys.exit(0))."""
+    saved = sys.argv
+    sys.argv = [script] + list(argv)
+    try:
+        execfile(script, {'__name__': '__main__', '__file__': script})
+    except SystemExit, e:
+        return e.code in (None, 0)
+    finally:
+        sys.argv = saved
+    return True
+
+class Sweep(object):
+    def __init__(self, grid, run, order=None, checkpoint=None):
+        """run(point) runs one point and returns True on success."""
+        self.points = grid_points(grid, order)
+        self.run_point = run
+        self.checkpoint = Checkpoint(checkpoint)
+
+    def run(self):
+        todo = [p for p in self.points if not self.checkpoint.finished(p)]
+        skipped = len(self.points) - len(todo)
+        if skipped:
+            print T.colored("Resuming: %d/%d points already done" % (skipped, len(self.points)), "cyan")
+        failed = []
+        for i, point in enumerate(todo):
+            print T.colored("[%d/%d] %s" % (skipped + i + 1, len(self.points), point), "cyan")
+            start = time.time()
+            try:
+                ok = self.run_point(point)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                traceback.print_exc()
+                ok = False
+            status = "ok" if ok else "failed"
+            if not ok:
+                failed.append(point)
+            self.checkpoint.record(point, status, time.time() - start)
+        return failed
+
+def parse_grid(specs):
+    grid = {}
+    for spec in specs:
+        name, values = spec.split('=', 1)
+        # '|' separates values that contain commas themselves
+        sep = '|' if '|' in values else ','
+        grid[name] = values.split(sep)
+    return grid
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an experiment script over a parameter grid.")
+    parser.add_argument('script')
+    parser.add_argument('--grid', action='append', default=[],
+                        help="name=v1,v2,... or name=v1|v2|... (repeat for each parameter)")
+    parser.add_argument('--args', required=True,
+                        help="Script arguments; {name} is replaced by the point's value")
+    parser.add_argument('--order', default="",
+                        help="Comma separated names to group points by (most expensive first)")
+    parser.add_argument('--exptid', default=time.strftime('%b%d-%H:%M'))
+    parser.add_argument('--checkpoint', default=None,
+                        help="Checkpoint file (default: /tmp/<exptid>/sweep.done)")
+    parser.add_argument('--dry-run', dest="dryrun", action="store_true", default=False,
+                        help="Only print the command line of every point")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    checkpoint = args.checkpoint or "/tmp/%s/sweep.done" % args.exptid
+    def run(point):
+        values = dict(point, exptid=args.exptid)
+        argv = shlex.split(args.args.format(**values))
+        if args.dryrun:
+            print "python", args.script, ' '.join(argv)
+            return True
+        return run_script(args.script, argv)
+    if args.dryrun:
+        checkpoint = None
+    order = [n for n in args.order.split(',') if n]
+    failed = Sweep(grid, run, order, checkpoint).run()
+    print "exptid %s: %d failed points" % (args.exptid, len(failed))
+    for p in failed:
+        print T.colored("  failed: %s" % p, "red")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Thread-backed tasks for overlapping experiment phases.
+
+Python 2 has no asyncio, so a Task is a function running in its own
+daemon thread with a future-like interface: spawn() starts one, and
+result()/gather()/wait_any() block on them.  Host commands, readiness
+probes and timed phases can all be started as tasks and joined later,
+instead of running strictly one after the other."""
+
+import threading
+import time
+
+class TaskTimeout(Exception):
+    pass
+
+class Task(object):
+    def __init__(self, fn, *args, **kwargs):
+        self.name = getattr(fn, '__name__', 'task')
+        self._done = threading.Event()
+        self._value = None
+        self._exc = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, args=(fn, args, kwargs))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            self._value = fn(*args, **kwargs)
+        except BaseException, e:
+            self._exc = e
+        with self._lock:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for cb in callbacks:
+            cb(self)
+
+    def done(self):
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """Block until the task finishes; returns done().  Waits in
+        short slices so Ctrl-C still reaches the main thread."""
+        end = None
+        if timeout is not None:
+            end = time.time() + timeout
+        while not self._done.isSet():
+            left = 0.5
+            if end is not None:
+                left = min(left, end - time.time())
+                if left <= 0:
+                    break
+            self._done.wait(left)
+        return self.done()
+
+    def result(self, timeout=None):
+        if not self.wait(timeout):
+            raise TaskTimeout("%s did not finish in %ss" % (self.name, timeout))
+        if self._exc is not None:
+            raise self._exc
+        return self._value
+
+    def exception(self, timeout=None):
+        if not self.wait(timeout):
+            raise TaskTimeout("%s did not finish in %ss" % (self.name, timeout))
+        return self._exc
+
+    def add_done_callback(self, cb):
+        with self._lock:
+            if not self._done.isSet():
+                self._callbacks.append(cb)
+                return
+        cb(self)
+
+def spawn(fn, *args, **kwargs):
+    return Task(fn, *args, **kwargs)
+
+def gather(tasks, timeout=None):
+    """Wait for all tasks and return their results in order.  If any
+    failed, the first failure (in task order) is raised once all have
+    finished."""
+    end = None
+    if timeout is not None:
+        end = time.time() + timeout
+    for t in tasks:
+        left = None
+        if end is not None:
+            left = max(0, end - time.time())
+        if not t.wait(left):
+            raise TaskTimeout("%s did not finish in %ss" % (t.name, timeout))
+    return [t.result() for t in tasks]
+
+def wait_any(tasks, timeout=None):
+    """Return the first task to finish, or None on timeout."""
+    first = threading.Event()
+    for t in tasks:
+        t.add_done_callback(lambda t: first.set())
+    end = None
+    if timeout is not None:
+        end = time.time() + timeout
+    while not first.isSet():
+        left = 0.5
+        if end is not None:
+            left = min(left, end - time.time())
+            if left <= 0:
+                return None
+        first.wait(left)
+    for t in tasks:
+        if t.done():
+            return t
+
+def sleep(t, event=None):
+    """A task that finishes after t seconds, or earlier if event is
+    set.  Its result is True if it was cut short by the event."""
+    if event is None:
+        event = threading.Event()
+    def timer():
+        event.wait(t)
+        return event.isSet()
+    return spawn(timer)
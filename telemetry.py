@@ -0,0 +1,233 @@
+"""Live view of the monitors while an experiment runs.
+
+start_monitors() leaves cpu.txt, net.txt and tenant.txt on every host.
+Telemetry follows all three with one `tail -F` per host over the
+cached SSH connection, parses each line as it arrives and keeps the
+last `span` seconds of every series in memory: per-tenant TX/RX
+(pimonitor, Mbps), per-interface TX/RX (bwm-ng, Mbps) and CPU use
+(top).  The current view is available as a snapshot dict, a text
+table printed every few seconds, and over HTTP (a page at / and JSON at
+/json), so a broken run shows up in the first minute."""
+
+import os
+import json
+import time
+import threading
+import BaseHTTPServer
+from collections import deque, defaultdict
+import termcolor as T
+from remoteproc import RemoteProcess
+
+MONITOR_FILES = ["cpu.txt", "net.txt", "tenant.txt"]
+# Seconds between samples of the slowest monitor (bwm-ng)
+SAMPLE_INTERVAL = 2
+
+class Window(object):
+    """(time, value) samples from the last span seconds."""
+    def __init__(self, span=60):
+        self.span = span
+        self.samples = deque()
+
+    def add(self, v, t=None):
+        if t is None:
+            t = time.time()
+        self.samples.append((t, v))
+        while self.samples and self.samples[0][0] < t - self.span:
+            self.samples.popleft()
+
+    def last(self):
+        if not self.samples:
+            return None
+        return self.samples[-1][1]
+
+    def mean(self, secs=None):
+        """Mean over the last secs seconds (the whole window if None)."""
+        if not self.samples:
+            return None
+        lo = self.samples[-1][0] - secs if secs is not None else None
+        vals = [v for t, v in self.samples if lo is None or t >= lo]
+        return sum(vals) / len(vals)
+
+    def age(self):
+        if not self.samples:
+            return None
+        return time.time() - self.samples[-1][0]
+
+class Telemetry(object):
+    def __init__(self, hlist, dir="/tmp", span=60):
+        self.hlist = hlist
+        self.dir = os.path.abspath(dir)
+        self.span = span
+        self.lock = threading.Lock()
+        # (addr, kind, name, field) -> Window; kind is cpu, net or tenant
+        self.windows = {}
+        self.procs = []
+        self.errors = defaultdict(int)
+        self.stopping = threading.Event()
+        self.server = None
+
+    def set_span(self, span):
+        """Keep at least span seconds of every series from now on."""
+        with self.lock:
+            self.span = max(self.span, span)
+            for w in self.windows.itervalues():
+                w.span = self.span
+
+    def window(self, key):
+        w = self.windows.get(key, None)
+        if w is None:
+            w = self.windows[key] = Window(self.span)
+        return w
+
+    def record(self, addr, kind, name, values):
+        now = time.time()
+        with self.lock:
+            for field, v in values.iteritems():
+                self.window((addr, kind, name, field)).add(v, now)
+
+    # Parsers for a line of each monitor file
+    def parse_cpu(self, addr, line):
+        # Cpu0  :  0.3%us,  0.7%sy,  0.0%ni, 98.7%id,  0.0%wa,  0.0%hi,  0.3%si,  0.0%st
+        # one line per CPU, or a single "Cpu(s)" line for all of them
+        label, rest = line.split(':', 1)
+        fields = {}
+        for f in rest.split(','):
+            v, name = f.strip().split('%')
+            fields[name] = float(v)
+        self.record(addr, "cpu", label.strip(), {'busy': 100.0 - fields.get('id', 100.0),
+                                                 'sirq': fields.get('si', 0.0)})
+
+    def parse_net(self, addr, line):
+        # unix_timestamp,iface,bytes_out,bytes_in,...
+        row = line.split(',')
+        if len(row) < 4 or row[1] in ['lo', 'eth0', 'total']:
+            return
+        self.record(addr, "net", row[1], {'tx': float(row[2]) * 8 / 1e6,
+                                          'rx': float(row[3]) * 8 / 1e6})
+
+    def parse_tenant(self, addr, line):
+        # t,tid,tx,rx
+        t, tid, tx, rx = line.split(',')
+        self.record(addr, "tenant", tid, {'tx': float(tx), 'rx': float(rx)})
+
+    def follower(self, host):
+        """on_line callback for host's tail -F; the "==> file <=="
+        headers tell which file the following lines come from."""
+        state = {'file': None}
+        parsers = {"cpu.txt": self.parse_cpu, "net.txt": self.parse_net,
+                   "tenant.txt": self.parse_tenant}
+        def on_line(line):
+            line = line.strip()
+            if not line:
+                return
+            if line.startswith("==> ") and line.endswith(" <=="):
+                state['file'] = os.path.basename(line[4:-4])
+                return
+            parse = parsers.get(state['file'], None)
+            if parse is None or line.startswith('#'):
+                return
+            try:
+                parse(host.addr, line)
+            except (ValueError, IndexError):
+                # Partial or unexpected line; keep going
+                self.errors[host.addr] += 1
+        return on_line
+
+    def start(self):
+        paths = ' '.join(os.path.join(self.dir, f) for f in MONITOR_FILES)
+        # -n0: only what is written from now on.  -F: wait for files
+        # the monitors have not created yet.
+        cmd = "tail -n0 -F %s 2>/dev/null" % paths
+        for h in self.hlist.lst:
+            self.procs.append(RemoteProcess(h, cmd, maxlines=10, on_line=self.follower(h)))
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        for p in self.procs:
+            p.kill()
+        self.procs = []
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+    def snapshot(self, secs=5):
+        """{addr: {'cpu': {...}, 'net': {iface: {...}}, 'tenant': {tid:
+        {...}}, 'age': seconds since the last sample}} with each value
+        averaged over the last secs seconds."""
+        ret = {}
+        with self.lock:
+            for (addr, kind, name, field), w in self.windows.iteritems():
+                h = ret.setdefault(addr, {'cpu': {}, 'net': {}, 'tenant': {}, 'age': None})
+                h[kind].setdefault(name, {})[field] = w.mean(secs)
+                age = w.age()
+                if h['age'] is None or age < h['age']:
+                    h['age'] = age
+        for h in self.hlist.lst:
+            ret.setdefault(h.addr, {'cpu': {}, 'net': {}, 'tenant': {}, 'age': None})
+        return ret
+
+    def render(self, secs=5, color=True):
+        lines = []
+        snap = self.snapshot(secs)
+        for addr in sorted(snap.keys()):
+            h = snap[addr]
+            # The busiest CPU
+            busy = [c['busy'] for c in h['cpu'].values() if c.get('busy') is not None]
+            s = "%-15s cpu %5s%%" % (addr, fmt(max(busy) if busy else None))
+            for iface in sorted(h['net'].keys()):
+                n = h['net'][iface]
+                s += "  %s tx %6s rx %6s" % (iface, fmt(n.get('tx')), fmt(n.get('rx')))
+            for tid in sorted(h['tenant'].keys()):
+                t = h['tenant'][tid]
+                s += "  %s %6s/%6s" % (tid, fmt(t.get('tx')), fmt(t.get('rx')))
+            if h['age'] is None or h['age'] > 5:
+                s += "  (no data)"
+                if color:
+                    s = T.colored(s, "red")
+            lines.append(s)
+        return '\n'.join(lines)
+
+    def console(self, interval=10, secs=5):
+        """Print the table every interval seconds until stopped."""
+        def show():
+            while True:
+                self.stopping.wait(interval)
+                if self.stopping.isSet():
+                    break
+                print "\n" + self.render(secs)
+        t = threading.Thread(target=show)
+        t.daemon = True
+        t.start()
+        return t
+
+    def serve(self, port=8000, addr="127.0.0.1"):
+        telemetry = self
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/json"):
+                    body = json.dumps(telemetry.snapshot())
+                    ctype = "application/json"
+                else:
+                    body = ("<html><head><meta http-equiv='refresh' content='2'></head>"
+                            "<body><pre>%s</pre></body></html>" % telemetry.render(color=False))
+                    ctype = "text/html"
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+        self.server = BaseHTTPServer.HTTPServer((addr, port), Handler)
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        print T.colored("telemetry on http://%s:%d/" % (addr, port), "cyan")
+        return self.server
+
+def fmt(v):
+    if v is None:
+        return "-"
+    return "%.0f" % v
@@ -1,4 +1,5 @@
 from expt import Expt
+from collect import collect
 from host import *
 from iperf import Iperf
 from time import sleep
@@ -146,7 +147,7 @@ class Allocation(Expt):
 
     def stop(self):
         self.hlist.remove_tenants()
-        self.hlist.copy("l1", self.opts("dir"), self.opts("exptid"))
+        collect(self.hlist, self.opts("dir"), self.opts("exptid"))
         self.hlist.killall("iperf")
 
 if __name__ == "__main__":
@@ -1,13 +1,14 @@
-from expt import Expt, progress
+from expt import Expt
+from collect import collect
 from host import *
-from time import sleep
 import subprocess
 import argparse
 import datetime
 import sys
-from collections import defaultdict
-from subprocess import Popen, PIPE
-import termcolor as T
+from topology import Topology
+from readiness import wait_ready, TcpProbe
+from completion import CompletionTracker
+import loadfiles
 
 parser = argparse.ArgumentParser(description="Hadoop test.")
 parser.add_argument('--create',
@@ -86,6 +87,23 @@ parser.add_argument('--static',
                     help="Static bandwidth for UDP",
                     default=False)
 
+parser.add_argument("--reconcile",
+                    action="store_true",
+                    help="Reuse module/tenants from the previous run and apply only changes",
+                    default=False)
+
+parser.add_argument("--telemetry",
+                    type=int,
+                    metavar="PORT",
+                    help="Show live rates during the run, and serve them on localhost:PORT",
+                    default=None)
+
+parser.add_argument("--watchdog",
+                    action="append",
+                    default=[],
+                    metavar="RULE",
+                    help="Abort the run if RULE fires, e.g. rate:tid=1,mbps=100,secs=30 (see watchdog.py)")
+
 parser.add_argument("--pin",
                     action="store_true",
                     help="Pin loadgen to cpus",
@@ -98,67 +116,54 @@ HADOOP_TID = 2
 args = parser.parse_args()
 
 class HadoopTrace(Expt):
+    watch_during_stop = True
+
     def create_tenants(self):
         self.hlist.create_ip_tenant(LOADGEN_TID)
         if self.opts("static"):
-            for h in self.hlist.lst:
-                h.create_ip_tx_rl(ip=h.get_tenant_ip(LOADGEN_TID), rate='5Gbit', static=True)
+            fanout_check(lambda h: h.create_ip_tx_rl(ip=h.get_tenant_ip(LOADGEN_TID),
+                                                     rate='5Gbit', static=True),
+                         self.hlist.lst)
         else:
             self.hlist.remove_qdiscs()
         n = args.nhadoop-1
         for i in xrange(args.nhadoop):
-            w = 1
-            if self.opts("weighted"):
-                w = self.get_hadoop_P(i)
-            if self.opts("inv_weighted"):
-                w = self.get_hadoop_P(args.nhadoop - i - 1)
-
-            self.hlist.create_ip_tenant(HADOOP_TID+i, w)
+            self.hlist.create_ip_tenant(HADOOP_TID+i, self.get_hadoop_weight(i))
         self.hlist.setup_tenant_routes(args.nhadoop+1)
 
+    def topology(self):
+        enabled = self.opts("enabled") or self.opts("weighted") or self.opts("inv_weighted")
+        tenants = [LOADGEN_TID]
+        weights = {}
+        for i in xrange(args.nhadoop):
+            tenants.append(HADOOP_TID+i)
+            weights[HADOOP_TID+i] = self.get_hadoop_weight(i)
+        rate_limiters = {}
+        if self.opts("static"):
+            rate_limiters[LOADGEN_TID] = ('5Gbit', True)
+        return Topology(tenants, enabled=enabled, weights=weights,
+                        rate_limiters=rate_limiters, mtu=self.opts("mtu"))
+
+    def get_hadoop_weight(self, i):
+        w = 1
+        if self.opts("weighted"):
+            w = self.get_hadoop_P(i)
+        if self.opts("inv_weighted"):
+            w = self.get_hadoop_P(args.nhadoop - i - 1)
+        return w
+
     def get_hadoop_P(self, i):
         return self.opts("base")**(i+1)
 
     def start_hadoop(self, i, P=1):
         # Create loadgen file
         tid = HADOOP_TID + i
-        traffic = "~/vimal/exports/loadfiles/sort_%s_%s" % (self.opts("size"), tid)
-        cmd = "python tests/genconfig.py --type tcp -n 16 -P %s --tenant %s" % (P, tid)
-        cmd += " --traffic sort --size %s" % self.opts("size")
-        cmd += " --port %s > %s" % (12345+tid, traffic)
-        print "Generating traffic matrix for sort for hadoop %s" % i
-        Popen(cmd, shell=True).wait()
+        traffic = loadfiles.prepare(self.hlist.lst, "sort",
+                                    name="sort_%s_%s" % (self.opts("size"), tid),
+                                    type="tcp", n=16, P=P, tenant=tid,
+                                    size=self.opts("size"), port=12345+tid)
         self.start_loadgen(out="sort-%s.txt" % i, tid=tid, traffic=traffic)
 
-    def check_hadoop_done(self, i):
-        # Sort is running on a host if file /dir/sort.txt exists and
-        # "client thread terminated" has not been printed yet in that
-        # file
-        f = os.path.join(self.opts("dir"), "sort-%s.txt" % i)
-        done = True
-        done_count = 0
-        total_count = 0
-        for h in self.hlist.lst:
-            cmd = "if [ -f %s ]; then grep 'client thread terminated' %s; " % (f, f)
-            cmd += "else echo 'sort not running'; fi"
-            out = h.cmd(cmd)
-            nr = 'not running' in out
-            tt = 'thread terminated' in out
-            if nr or tt:
-                if not self.completed[h.addr]:
-                    if nr:
-                        print 'Not running in %s' % h.addr
-                    elif tt:
-                        print 'Completed in %s' % h.addr
-                    self.completed[h.addr] = True
-                done = done and True
-                done_count += 1
-            else:
-                done = False
-            total_count += 1
-        print '%d/%d' % (done_count, total_count)
-        return done
-
     def start_loadgen(self, out="loadgen.txt", tid=2, traffic=None, cpu=None):
         dir = self.opts("dir")
         out = os.path.join(dir, out)
@@ -170,30 +175,20 @@ class HadoopTrace(Expt):
             cpu = self.nextcpu
             self.nextcpu = (self.nextcpu + 2) % 8
         port = 12345 + tid
-        for h in self.hlist.lst:
+        def start(h):
             ip = h.get_tenant_ip(tid)
             cmd = "mkdir -p %s; " % dir
             if args.pin:
                 cmd += "taskset -c %s,%s  " % (cpu, cpu+1)
             cmd += " %s -i %s -vv " % (LOADGEN, ip)
             cmd += " -l %s -p 1000000 -f %s > %s" % (port, traffic, out)
-            h.cmd_async(cmd)
+            return h.cmd_async(cmd)
+        fanout_check(start, self.hlist.lst)
 
         print "Waiting for loadgen to start..."
-        progress(5)
-        for h in self.hlist.lst:
-            ip = h.get_tenant_ip(tid)
-
-            while 1:
-                p = Popen("nc -nzv %s %s" % (ip, port),
-                          shell=True, stdout=PIPE, stderr=PIPE)
-                stdout, stderr = p.communicate()
-                if 'open' in stderr:
-                    print T.colored("started %s:%s" % (ip, port), "green")
-                    break
-                else:
-                    print T.colored("  retrying %s:%s" % (ip, port), "yellow")
-                    sleep(0.5)
+        # Connecting to the control port also starts loadgen.
+        wait_ready([TcpProbe(h.get_tenant_ip(tid), port) for h in self.hlist.lst],
+                   timeout=300)
         return
 
     def clean(self):
@@ -203,11 +198,12 @@ class HadoopTrace(Expt):
     def start(self):
         hlist = HostList()
         self.nextcpu = 2
-        self.completed = defaultdict(bool)
+        self.tracker = None
         for ip in host_ips:
             hlist.lst.append(Host(ip))
         self.hlist = hlist
-        self.hlist.rmmod()
+        if not self.opts("reconcile"):
+            self.hlist.rmmod()
         if self.opts("create"):
             self.hlist.insmod()
             self.create_tenants()
@@ -217,19 +213,32 @@ class HadoopTrace(Expt):
             self.clean()
             sys.exit(0)
 
-        self.hlist.set_mtu(self.opts("mtu"))
+        if not self.opts("reconcile"):
+            self.hlist.set_mtu(self.opts("mtu"))
         if args.pin:
             self.hlist.cmd("killall -9 irqbalance")
             self.hlist.configure_tx_interrupt_affinity()
         else:
             #self.hlist.cmd("killall -9 irqbalance; irqbalance")
             self.hlist.configure_interrupt_affinity()
-        if self.opts("enabled") or self.opts("weighted") or self.opts("inv_weighted"):
-            self.hlist.insmod()
-        self.create_tenants()
+        if self.opts("reconcile"):
+            self.topology().apply(self.hlist)
+        else:
+            if self.opts("enabled") or self.opts("weighted") or self.opts("inv_weighted"):
+                self.hlist.insmod()
+            self.create_tenants()
         self.hlist.start_monitors(self.opts("dir"))
+        if self.opts("telemetry"):
+            self.start_telemetry(self.hlist, port=self.opts("telemetry"))
+        if self.opts("watchdog"):
+            self.start_watchdog(self.hlist, self.opts("watchdog"))
         for i in xrange(self.opts("nhadoop")):
             self.start_hadoop(i, P=self.get_hadoop_P(i))
+        # Sort is done on a host once "client thread terminated" is
+        # printed in its sort-i.txt
+        sorts = [os.path.join(self.opts("dir"), "sort-%s.txt" % i)
+                 for i in xrange(self.opts("nhadoop"))]
+        self.tracker = CompletionTracker(self.hlist, sorts).start()
         self.start_loadgen(tid=LOADGEN_TID, traffic=self.opts("traffic"))
         return
 
@@ -240,30 +249,23 @@ class HadoopTrace(Expt):
             self.hlist.remove_tenants()
             return
         start = datetime.datetime.now()
-        try:
-            while 1:
-                done = True
-                for i in xrange(self.opts("nhadoop")):
-                    done = done and self.check_hadoop_done(i)
-                if done:
-                    break
-                else:
-                    print "Waiting for hadoop job(s)   start: ", start
-                    print "        now: ", datetime.datetime.now()
-                    try:
-                        progress(60)
-                    except:
-                        break
-                continue
-        except Exception, e:
-            print "Hadoop job not found", e
+        if self.tracker is not None:
+            print "Waiting for hadoop job(s)   start: ", start
+            try:
+                self.tracker.wait(self.stopping)
+            except KeyboardInterrupt:
+                print "Still running:", ', '.join("%s:%s" % p for p in self.tracker.pending())
+            self.tracker.stop()
+        self.stop_watchdog()
         print "Hadoop job completed...", datetime.datetime.now()
         self.hlist.killall("ruby loadgen java")
-        self.hlist.remove_tenants()
+        # Leave tenants in place for the next run to reconcile against
+        if not self.opts("reconcile"):
+            self.hlist.remove_tenants()
         for p in self.procs:
             p.kill()
         if args.exptid is None:
             args.exptid = "sort-%s-trace" % self.opts("size")
-        self.hlist.copy("l1", self.opts("dir"), args.exptid)
+        collect(self.hlist, self.opts("dir"), args.exptid)
 
 HadoopTrace(vars(args)).run()
@@ -5,9 +5,11 @@ import multiprocessing
 from common import *
 import termcolor as T
 from expt import Expt
+from collect import collect
 from iperf import Iperf
-from time import sleep
 from host import *
+from topology import Topology
+from readiness import wait_ready, TcpProbe
 
 parser = argparse.ArgumentParser(description="Memcached Cluster Test.")
 parser.add_argument('--ns',
@@ -103,6 +105,30 @@ parser.add_argument('--mcrate',
                     help="mcperf: Request generation rate",
                     default="6000")
 
+parser.add_argument('--reconcile',
+                    dest="reconcile",
+                    action="store_true",
+                    help="With --enable, reuse module/tenants from the previous run and apply only changes",
+                    default=False)
+
+parser.add_argument('--destroy', '-c', '--clean',
+                    dest="destroy",
+                    action="store_true",
+                    help="Remove tenants, qdiscs and the module left by --reconcile runs, then exit",
+                    default=False)
+
+parser.add_argument("--telemetry",
+                    type=int,
+                    metavar="PORT",
+                    help="Show live rates during the run, and serve them on localhost:PORT",
+                    default=None)
+
+parser.add_argument("--watchdog",
+                    action="append",
+                    default=[],
+                    metavar="RULE",
+                    help="Abort the run if RULE fires, e.g. rate:tid=1,mbps=100,secs=30 (see watchdog.py)")
+
 parser.add_argument('--static',
                     dest="static",
                     action="store_true",
@@ -115,6 +141,8 @@ LOADGEN_TID = 2
 
 class MemcachedCluster(Expt):
     def initialise(self):
+        # An earlier --reconcile --enable run may have left its tenants
+        self.hlist.remove_tenants()
         self.hlist.rmmod()
         self.hlist.remove_qdiscs()
         if self.opts("enable"):
@@ -123,8 +151,14 @@ class MemcachedCluster(Expt):
             self.hlist.insert_r2d2("192.168.0.0", 16)
         # Create a static rate limiter for UDP tenant
         if self.opts("static"):
-            for h in self.hlist.lst:
-                h.create_ip_tx_rl(ip=h.get_tenant_ip(LOADGEN_TID), rate='5Gbit', static=True)
+            fanout_check(lambda h: h.create_ip_tx_rl(ip=h.get_tenant_ip(LOADGEN_TID),
+                                                     rate='5Gbit', static=True),
+                         self.hlist.lst)
+
+    def clean(self):
+        self.hlist.killall("memcached loadgen")
+        self.hlist.remove_tenants()
+        self.hlist.rmmod()
 
     def prepare_iface(self):
         h = self.hlist
@@ -135,6 +169,14 @@ class MemcachedCluster(Expt):
             h.create_ip_tenant(MEMASLAP_TID)
             h.create_ip_tenant(LOADGEN_TID)
 
+    def topology(self):
+        rate_limiters = {}
+        if self.opts("static"):
+            rate_limiters[LOADGEN_TID] = ('5Gbit', True)
+        return Topology([MEMASLAP_TID, LOADGEN_TID],
+                        rate_limiters=rate_limiters, mtu=self.opts("mtu"),
+                        params={"ISO_VQ_DRAIN_RATE_MBPS": self.opts("vqrate")})
+
     def memaslap(self, host, dir="/tmp"):
         time = int(self.opts("t")) - 5
         config = self.opts("memaslap")
@@ -208,20 +250,26 @@ class MemcachedCluster(Expt):
         host.cmd_async(cmd)
 
     def loadgen_start(self):
-        if "udp" not in self.opts("active"):
+        if "udp" not in self.opts("active") or self.opts("dryrun"):
             return
-        procs = []
+        probes = []
         for h in self.hlist.lst:
             ip = h.get_10g_ip()
             if self.opts("enable"):
                 ip = h.get_tenant_ip(LOADGEN_TID)
-            sleep(2)
-            p = Popen("nc -nzv %s 12345" % ip, shell=True)
-            procs.append(p)
-        for p in procs:
-            p.wait()
+            probes.append(TcpProbe(ip, 12345))
+        wait_ready(probes)
         return
 
+    def memcached_ready(self):
+        probes = []
+        for h in self.hs.lst:
+            ip = h.get_10g_ip()
+            if self.opts("enable"):
+                ip = h.get_tenant_ip(MEMASLAP_TID)
+            probes.append(TcpProbe(ip, 11211))
+        wait_ready(probes)
+
     def start(self):
         # num servers, num clients
         ns = self.opts("ns")
@@ -252,36 +300,48 @@ class MemcachedCluster(Expt):
         self.hc = hclients
         self.hlist = hlist
         hlist.set_dryrun(self.opts("dryrun"))
-        self.initialise()
-        # Automatically initialised by the module
-        #hlist.perfiso_set("IsoAutoGenerateFeedback", "1")
-        hlist.perfiso_set("ISO_VQ_DRAIN_RATE_MBPS", self.opts("vqrate"))
-        #hlist.perfiso_set("ISO_VQ_UPDATE_INTERVAL_US", 25)
-        self.prepare_iface()
-        self.hlist.setup_tenant_routes(2)
-        self.hlist.cmd("killall -9 irqbalance; ")
-        self.hlist.configure_interrupt_affinity()
-
-        hservers.start_memcached()
-        sleep(2)
-        for h in hclients.lst:
-            if args.mcperf:
-                self.mcperf(h, dir)
-            else:
-                self.memaslap(h, dir)
+        if self.opts("destroy"):
+            self.clean()
+            sys.exit(0)
+        if self.opts("reconcile") and self.opts("enable"):
+            self.topology().apply(hlist)
+        else:
+            self.initialise()
+            # Automatically initialised by the module
+            #hlist.perfiso_set("IsoAutoGenerateFeedback", "1")
+            hlist.perfiso_set("ISO_VQ_DRAIN_RATE_MBPS", self.opts("vqrate"))
+            #hlist.perfiso_set("ISO_VQ_UPDATE_INTERVAL_US", 25)
+            self.prepare_iface()
+            self.hlist.setup_tenant_routes(2)
+        def irq_setup():
+            self.hlist.cmd("killall -9 irqbalance; ")
+            self.hlist.configure_interrupt_affinity()
+
+        # Memcached servers come up while interrupts are being set up
+        self.phase("server start", hservers.spawn("start_memcached"),
+                   self.spawn(irq_setup))
+        if not self.opts("dryrun"):
+            self.memcached_ready()
+        if args.mcperf:
+            fanout_check(lambda h: self.mcperf(h, dir), hclients.lst)
+        else:
+            fanout_check(lambda h: self.memaslap(h, dir), hclients.lst)
 
         hlist.start_monitors(dir)
-        self.hlist.netstat_begin(self.opts("dir"))
-
-        for h in hlist.lst:
-            self.loadgen(h, xtraffic, dir)
+        if self.opts("telemetry") and not self.opts("dryrun"):
+            self.start_telemetry(hlist, port=self.opts("telemetry"))
+        if self.opts("watchdog") and not self.opts("dryrun"):
+            self.start_watchdog(hlist, self.opts("watchdog"))
+        self.phase("loadgen start", hlist.spawn("netstat_begin", dir),
+                   self.spawn(fanout_check, lambda h: self.loadgen(h, xtraffic, dir), hlist.lst))
         self.loadgen_start()
 
     def stop(self):
         self.hlist.netstat_end(self.opts("dir"))
         self.hlist.killall("memcached loadgen")
-        self.hlist.remove_tenants()
-        self.hlist.copy("l1", self.opts("dir"), self.opts("exptid"))
+        if not (self.opts("reconcile") and self.opts("enable")):
+            self.hlist.remove_tenants()
+        collect(self.hlist, self.opts("dir"), self.opts("exptid"))
         return
 
 MemcachedCluster(vars(args)).run()
@@ -1,4 +1,5 @@
 from expt import Expt, progress
+from collect import collect
 from host import *
 from time import sleep
 import subprocess
@@ -6,6 +7,7 @@ import argparse
 import datetime
 import sys
 from collections import defaultdict
+import loadfiles
 
 parser = argparse.ArgumentParser(description="Hadoop test.")
 parser.add_argument('--create',
@@ -68,12 +70,9 @@ class HadoopTrace(Expt):
 
     def start_hadoop(self):
         # Create loadgen file
-        traffic = "~/vimal/exports/loadfiles/sort_%s" % self.opts("size")
-        cmd = "python tests/genconfig.py --type tcp -n 16 -P 2 --tenant %s" % HADOOP_TID
-        cmd += " --traffic sort --size %s" % self.opts("size")
-        cmd += " --port %s > %s" % (12345+HADOOP_TID, traffic)
-        print "Generating traffic matrix for sort"
-        Popen(cmd, shell=True).wait()
+        traffic = loadfiles.prepare(self.hlist.lst, "sort", name="sort_%s" % self.opts("size"),
+                                    type="tcp", n=16, P=2, tenant=HADOOP_TID,
+                                    size=self.opts("size"), port=12345+HADOOP_TID)
         self.start_loadgen(out="sort.txt", tid=HADOOP_TID, traffic=traffic)
 
     def check_hadoop_done(self):
@@ -178,6 +177,6 @@ class HadoopTrace(Expt):
             p.kill()
         if args.exptid is None:
             args.exptid = "sort-%s-trace" % self.opts("size")
-        self.hlist.copy("l1", self.opts("dir"), args.exptid)
+        collect(self.hlist, self.opts("dir"), args.exptid)
 
 HadoopTrace(vars(args)).run()
@@ -1,4 +1,5 @@
-from expt import Expt, progress
+from expt import Expt
+from collect import collect
 from host import *
 from time import sleep
 import subprocess
@@ -6,6 +7,8 @@ import argparse
 import datetime
 import sys
 from collections import defaultdict
+from readiness import wait_ready, TcpProbe
+import loadfiles
 
 parser = argparse.ArgumentParser(description="Partition aggregate test.")
 parser.add_argument('--create',
@@ -116,17 +119,14 @@ class PartitionAggregate(Expt):
             h.cmd_async(cmd)
 
         print "Waiting for servers to start..."
-        progress(1)
+        wait_ready([TcpProbe(h.get_tenant_ip(tid), 5001) for h in self.hlist.lst[1:]])
         print "starting client (tid=%s) on %s..." % (tid, host_ips[0])
         h0 = Host(host_ips[0])
 
         # Generate input file for client
         size = self.opts("size")
-        inpfile = "~/vimal/exports/incast_app/input/get%s_P%s_tenant%s.dat" % (size, P, tid)
-        cmd = "python tests/genconfig.py --traffic paggr -n 15 "
-        cmd += "-P %s --size %s --repeat %s --tenant %s " % (P, size, self.opts("repeat"), tid)
-        cmd += "> %s" % inpfile
-        Popen(cmd, shell=True).wait()
+        inpfile = loadfiles.prepare([h0], "paggr", name="get%s_P%s_tenant%s" % (size, P, tid),
+                                    n=15, P=P, size=size, repeat=self.opts("repeat"), tenant=tid)
 
         dir = self.opts("dir")
         outfile = os.path.join(dir, out)
@@ -181,6 +181,6 @@ class PartitionAggregate(Expt):
             p.kill()
         if args.exptid is None:
             args.exptid = "paggr-%s" % self.opts("size")
-        self.hlist.copy("l1", self.opts("dir"), args.exptid)
+        collect(self.hlist, self.opts("dir"), args.exptid)
 
 PartitionAggregate(vars(args)).run()
@@ -1,4 +1,5 @@
 from expt import Expt
+from collect import collect
 from host import *
 from iperf import Iperf
 from time import sleep
@@ -46,10 +47,10 @@ class TcpVsUdp(Expt):
         sleep(1)
         hlist.setup_tenant_routes()
         if self.opts("enabled"):
-            hlist.perfiso_set("IsoAutoGenerateFeedback", "1")
-            hlist.perfiso_set("ISO_VQ_DRAIN_RATE_MBPS", self.opts("vqrate"))
-            hlist.perfiso_set("ISO_VQ_UPDATE_INTERVAL_US", self.opts("vqupdate"))
-            hlist.perfiso_set("ISO_RFAIR_INITIAL", 9000)
+            hlist.perfiso_apply({"IsoAutoGenerateFeedback": 1,
+                                 "ISO_VQ_DRAIN_RATE_MBPS": self.opts("vqrate"),
+                                 "ISO_VQ_UPDATE_INTERVAL_US": self.opts("vqupdate"),
+                                 "ISO_RFAIR_INITIAL": 9000}, verify=True)
             # don't muck around with parameters
             #if self.opts("aimd_dt_us"):
                 #hlist.perfiso_set("ISO_RFAIR_DECREASE_INTERVAL_US", self.opts("aimd_dt_us"))
@@ -60,11 +61,11 @@ class TcpVsUdp(Expt):
                 #hlist.perfiso_set("ISO_RFAIR_INCREMENT", "%s" % increment)
                 #hlist.perfiso_set("ISO_FALPHA", "%s" % self.opts("md"))
         else:
-            hlist.perfiso_set("IsoAutoGenerateFeedback", 0)
-            hlist.perfiso_set("ISO_VQ_DRAIN_RATE_MBPS", 100000)
-            hlist.perfiso_set("ISO_VQ_UPDATE_INTERVAL_US", 1000000)
-            hlist.perfiso_set("ISO_RFAIR_INITIAL", 100000)
-            hlist.perfiso_set("ISO_MAX_TX_RATE", 100000)
+            hlist.perfiso_apply({"IsoAutoGenerateFeedback": 0,
+                                 "ISO_VQ_DRAIN_RATE_MBPS": 100000,
+                                 "ISO_VQ_UPDATE_INTERVAL_US": 1000000,
+                                 "ISO_RFAIR_INITIAL": 100000,
+                                 "ISO_MAX_TX_RATE": 100000})
         hlist.start_monitors(self.opts("dir"), 1e3)
 
         self.procs = []
@@ -131,6 +132,6 @@ class TcpVsUdp(Expt):
         self.hlist.set_mtu("1500")
         self.hlist.killall("loadgen")
         self.hlist.remove_tenants()
-        self.hlist.copy("l1", self.opts("dir"), self.opts("exptid"))
+        collect(self.hlist, self.opts("dir"), self.opts("exptid"))
         for p in self.procs:
             p.kill()
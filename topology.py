@@ -0,0 +1,210 @@
+"""Declarative tenant setup.
+
+A Topology describes what every host should look like: whether perfiso
+is loaded (and with which parameters), the IP tenants and their
+weights, static rate limiters, tenant routes, MTU and perfiso tunables.
+Topology.apply reads the live state of each host and runs only the
+commands needed to get there, so back-to-back runs that differ in one
+weight do not pay for an rmmod/insmod and a rebuild of every tenant.
+
+Tenant weights cannot be read back from perfiso, so the reconciler
+keeps what it configured in TOPOLOGY_STATE_FILE on each host.  Host.rmmod
+removes the file, so a reload by hand is noticed."""
+
+import re
+import json
+from host import PI_MODULE, PERFISO_PROC, TOPOLOGY_STATE_FILE, fanout_check
+
+class HostState(object):
+    """Live state of one host, as read by read_state."""
+    def __init__(self):
+        self.module = False
+        self.module_params = None
+        self.mtu = None
+        # tid -> ip of the dev:tid alias
+        self.aliases = {}
+        # tids with a route to 11.0.tid.0/24
+        self.routes = set()
+        # An htb root qdisc (handle 1:) is installed
+        self.root_htb = False
+        # classid -> rate string, e.g. '5Gbit'
+        self.classes = {}
+        self.params = {}
+        # tid -> weight, from TOPOLOGY_STATE_FILE
+        self.weights = {}
+
+def read_state(host):
+    """Read the live configuration of host in one round trip."""
+    dev = host.get_10g_dev()
+    cmds = ["grep -c '^perfiso ' /proc/modules",
+            "cat /sys/class/net/%s/mtu" % dev,
+            "ip -4 -o addr show dev %s" % dev,
+            "ip route show",
+            "tc qdisc show dev %s" % dev,
+            "tc class show dev %s" % dev,
+            "grep -H . %s/*" % PERFISO_PROC,
+            "cat %s" % TOPOLOGY_STATE_FILE]
+    st = HostState()
+    if host.dryrun:
+        return st
+    res = host.cmd_batch(cmds, stop_on_error=False)
+    module, mtu, addrs, routes, qdiscs, classes, params, saved = [r.out for r in res]
+    st.module = module.strip() not in ('', '0')
+    try:
+        st.mtu = int(mtu.strip())
+    except ValueError:
+        pass
+    for m in re.finditer(r'inet (\S+?)/\d+ .*?%s:(\d+)' % re.escape(dev), addrs):
+        st.aliases[int(m.group(2))] = m.group(1)
+    for m in re.finditer(r'^11\.0\.(\d+)\.0/24 ', routes, re.M):
+        st.routes.add(int(m.group(1)))
+    st.root_htb = re.search(r'^qdisc htb 1: root', qdiscs, re.M) is not None
+    for m in re.finditer(r'class htb 1:(\d+) .*?rate (\S+)', classes):
+        st.classes[int(m.group(1))] = m.group(2)
+    for m in re.finditer(r'^%s/(\w+):(.*)$' % re.escape(PERFISO_PROC), params, re.M):
+        st.params[m.group(1)] = m.group(2).strip()
+    try:
+        saved = json.loads(saved)
+    except ValueError:
+        saved = {}
+    if st.module:
+        st.module_params = saved.get('module_params', None)
+        st.weights = dict((int(t), w) for t, w in saved.get('weights', {}).iteritems())
+    return st
+
+def _rate_eq(a, b):
+    # tc prints rates in its own units (5Gbit -> 5000Mbit)
+    def bits(r):
+        m = re.match(r'([\d.]+)([KMG]?)bit', str(r))
+        if m is None:
+            return r
+        return float(m.group(1)) * {'': 1, 'K': 1e3, 'M': 1e6, 'G': 1e9}[m.group(2)]
+    return bits(a) == bits(b)
+
+class Topology(object):
+    def __init__(self, tenants, enabled=True, weights=None,
+                 rate_limiters=None, routes=True, mtu=None,
+                 params=None, module=PI_MODULE,
+                 module_params="iso_param_dev=eth2"):
+        """tenants: list of tenant ids.  weights: tid -> weight
+        (default 1).  rate_limiters: tid -> (rate, static), as for
+        Host.create_ip_tx_rl.  params: perfiso tunables."""
+        self.tenants = list(tenants)
+        self.enabled = enabled
+        self.weights = weights or {}
+        self.rate_limiters = rate_limiters or {}
+        self.routes = routes
+        self.mtu = mtu
+        self.params = params or {}
+        self.module = module
+        self.module_params = module_params
+
+    def weight(self, tid):
+        return self.weights.get(tid, 1)
+
+    def diff(self, host, st):
+        """Queue on host (which must be in delay mode) the commands
+        that take it from live state st to this topology."""
+        dev = host.get_10g_dev()
+        fresh = False
+        if self.enabled and (not st.module or st.module_params != self.module_params):
+            host.cmd("tc qdisc del dev %s root; rmmod sch_htb; rmmod perfiso; true" % dev)
+            host.cmd("mount -a; insmod %s %s" % (self.module, self.module_params))
+            # The htb root is only added (by diff_rate_limiters) when
+            # there are rate limiters
+            st.root_htb = False
+            st.classes = {}
+            st.params = {}
+            fresh = True
+        elif not self.enabled and st.module:
+            host.cmd("tc qdisc del dev %s root; rmmod perfiso" % dev)
+            st.root_htb = False
+            st.classes = {}
+
+        if self.mtu is not None and str(st.mtu) != str(self.mtu):
+            host.set_mtu(self.mtu)
+
+        for name in sorted(self.params.keys()):
+            if st.params.get(name, None) != str(self.params[name]):
+                host.perfiso_set(name, self.params[name])
+
+        for tid in self.tenants:
+            ip = host.get_tenant_ip(tid)
+            w = self.weight(tid)
+            if self.enabled and (fresh or tid not in st.weights):
+                host.perfiso_create_txc(ip)
+                host.perfiso_create_vq(ip)
+                host.perfiso_assoc_txc_vq(ip, ip)
+            if self.enabled and (fresh or str(st.weights.get(tid, None)) != str(w)):
+                host.perfiso_set_vq_weight(ip, w)
+                host.perfiso_set_txc_weight(ip, w)
+            if st.aliases.get(tid, None) != ip:
+                host.cmd("ifconfig %s:%d %s" % (dev, tid, ip))
+            if self.routes and tid not in st.routes:
+                host.cmd("route add -net 11.0.%d.0/24 dev %s:%d" % (tid, dev, tid))
+
+        for tid in sorted(st.aliases.keys()):
+            if tid not in self.tenants:
+                host.cmd("ifconfig %s:%d down" % (dev, tid))
+
+        self.diff_rate_limiters(host, st)
+
+    def diff_rate_limiters(self, host, st):
+        dev = host.get_10g_dev()
+        want = self.rate_limiters
+        if not want:
+            if st.root_htb or st.classes:
+                host.remove_qdiscs()
+            return
+        rebuild = not st.root_htb or set(want.keys()) != set(st.classes.keys())
+        if rebuild:
+            host.cmd("tc qdisc del dev %s root; true" % dev)
+            host.cmd("tc qdisc add dev %s root handle 1: htb default 1000" % dev)
+        for tid in sorted(want.keys()):
+            rate, static = want[tid]
+            ceil = rate if static else "10Gbit"
+            if rebuild:
+                c = "tc class add dev %s parent 1: classid 1:%s " % (dev, tid)
+                c += "htb rate %s ceil %s mtu 64000" % (rate, ceil)
+                host.cmd(c)
+                c = "tc filter add dev %s protocol ip parent 1: prio 1 " % dev
+                c += " u32 match ip src %s flowid 1:%s" % (host.get_tenant_ip(tid), tid)
+                host.cmd(c)
+            elif not _rate_eq(st.classes[tid], rate):
+                c = "tc class change dev %s parent 1: classid 1:%s " % (dev, tid)
+                c += "htb rate %s ceil %s mtu 64000" % (rate, ceil)
+                host.cmd(c)
+
+    def saved_state(self):
+        weights = {}
+        if self.enabled:
+            weights = dict((str(t), self.weight(t)) for t in self.tenants)
+        return json.dumps({'module_params': self.module_params, 'weights': weights})
+
+    def apply_host(self, host):
+        st = read_state(host)
+        host.delay = True
+        try:
+            self.diff(host, st)
+        except:
+            host.delay = False
+            host.delayed_cmds = []
+            raise
+        if len(host.delayed_cmds) == 0:
+            host.delay = False
+            host.log("topology up to date")
+            return []
+        host.cmd("echo '%s' > %s" % (self.saved_state(), TOPOLOGY_STATE_FILE))
+        cmds = list(host.delayed_cmds)
+        # Stop at the first failure so the state file is never written
+        # for a half-applied configuration.
+        host.delayed_cmds_execute(stop_on_error=True)
+        for tid in self.tenants:
+            if tid not in host.tenants:
+                host.tenants.append(tid)
+        return cmds
+
+    def apply(self, hlist):
+        """Reconcile every host in hlist concurrently.  Returns the
+        commands run on each host, in host order."""
+        return fanout_check(self.apply_host, hlist.lst, hlist.max_workers)
@@ -9,8 +9,6 @@ ctrlc() {
 
 trap ctrlc SIGINT
 
-basecmd="python tests/scenario.py --time $time --run tcpvsudp"
-
 size=100G
 proto=udp
 # WITH ISOLATION
@@ -19,15 +17,14 @@ python tests/genconfig.py --type $proto --traffic incast \
 	--inter 5 -n 16 --time 1000 \
 	--tenant 2 > ~/vimal/exports/14to1_${size}_${proto}_tenant
 
-for vqrate in 8000 8500 8800 9000 9200 9400 9600 9800 10000; do
-for mtu in 1500 9000; do
-for n in 1 2 4 8 14; do
-	subdir=mtu$mtu-vq${vqrate}-n$n
-	echo $basecmd -n $n --dir $dir/$subdir --enable \
-		--traffic ~/vimal/exports/14to1_${size}_${proto}_tenant \
-		--mtu $mtu --vqrate $vqrate
-done
-done
-done
+# Only lists the commands for now; drop --dry-run to run them all in one
+# python process, mtu changing least often
+python tests/sweep.py tests/scenario.py --dry-run \
+	--grid vqrate=8000,8500,8800,9000,9200,9400,9600,9800,10000 \
+	--grid mtu=1500,9000 --grid n=1,2,4,8,14 \
+	--order mtu,vqrate \
+	--args "--time $time --run tcpvsudp -n {n} --dir $dir/mtu{mtu}-vq{vqrate}-n{n} --enable \
+		--traffic $HOME/vimal/exports/14to1_${size}_${proto}_tenant \
+		--mtu {mtu} --vqrate {vqrate}"
 
 echo `date` $dir
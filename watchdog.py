@@ -0,0 +1,223 @@
+"""Abort experiments that have gone wrong.
+
+A Watchdog checks a list of rules every few seconds while an experiment
+runs (including a long stop() phase, like waiting for Hadoop jobs) and
+calls Expt.abort() on the first one that fires.  abort() leaves a
+FAILED file with the reason in the result directory (on the hosts too,
+so it is copied back with the rest) and Expt.run() then exits non-zero,
+which is what makes sweep.py record the point as failed and move on.
+
+Rules that look at rates and CPU read the rolling windows of a
+telemetry.Telemetry; the others poll the hosts themselves.  Rules can
+be given on the command line as "name:key=value,...", for example
+
+    --watchdog rate:tid=1,mbps=100,secs=30 --watchdog cpu:busy=98
+    --watchdog proc:name=loadgen --watchdog timeouts:limit=1000"""
+
+import time
+import threading
+import termcolor as T
+from parallel import fanout
+from readiness import ProcessProbe
+from telemetry import SAMPLE_INTERVAL
+
+class Rule(object):
+    """check(watchdog) returns a reason string when the run should be
+    aborted.  Rules are ignored for the first grace seconds.  Rules
+    that look back window seconds into the telemetry need it to keep
+    more than that."""
+    grace = 60
+    window = 0
+
+    def check(self, wd):
+        raise NotImplementedError
+
+def _tid_matches(key, tid):
+    # pimonitor names tenants by IP; the third octet is the tenant id
+    if str(key) == str(tid):
+        return True
+    parts = str(key).split('.')
+    return len(parts) == 4 and parts[2] == str(tid)
+
+class TenantRateBelow(Rule):
+    """A tenant's rate on some host stayed below mbps for secs seconds."""
+    def __init__(self, tid, mbps, secs=30, field="tx", grace=60):
+        self.tid = tid
+        self.mbps = float(mbps)
+        self.secs = float(secs)
+        self.field = field
+        self.grace = float(grace)
+        self.window = self.secs
+
+    def check(self, wd):
+        with wd.telemetry.lock:
+            for (addr, kind, name, field), w in wd.telemetry.windows.items():
+                if kind != "tenant" or field != self.field or not _tid_matches(name, self.tid):
+                    continue
+                samples = w.samples
+                if not samples or samples[-1][0] - samples[0][0] < self.secs:
+                    continue
+                lo = samples[-1][0] - self.secs
+                if max(v for t, v in samples if t >= lo) < self.mbps:
+                    return "tenant %s %s on %s below %.0f Mbps for %ds" % (name, self.field, addr,
+                                                                          self.mbps, self.secs)
+        return None
+
+class CpuSaturated(Rule):
+    """Some host's CPU was busier than busy% for secs seconds."""
+    def __init__(self, busy=98, secs=60, grace=30):
+        self.busy = float(busy)
+        self.secs = float(secs)
+        self.grace = float(grace)
+        self.window = self.secs
+
+    def check(self, wd):
+        with wd.telemetry.lock:
+            for (addr, kind, name, field), w in wd.telemetry.windows.items():
+                if kind != "cpu" or field != "busy":
+                    continue
+                samples = w.samples
+                if not samples or samples[-1][0] - samples[0][0] < self.secs:
+                    continue
+                lo = samples[-1][0] - self.secs
+                if min(v for t, v in samples if t >= lo) > self.busy:
+                    return "%s on %s above %.0f%% for %ds" % (name, addr, self.busy, self.secs)
+        return None
+
+class NoData(Rule):
+    """A host's monitors have produced nothing for secs seconds."""
+    def __init__(self, secs=30, grace=60):
+        self.secs = float(secs)
+        self.grace = float(grace)
+
+    def check(self, wd):
+        snap = wd.telemetry.snapshot()
+        for addr in sorted(snap.keys()):
+            age = snap[addr]['age']
+            if age is None or age > self.secs:
+                return "no monitor data from %s for %ds" % (addr, self.secs)
+        return None
+
+class ProcessNotRunning(Rule):
+    """A process (e.g. loadgen) is not running on some host."""
+    def __init__(self, name, grace=60, every=30):
+        self.name = name
+        self.grace = float(grace)
+        self.every = float(every)
+        self.last = 0
+
+    def check(self, wd):
+        if time.time() - self.last < self.every:
+            return None
+        self.last = time.time()
+        probes = [ProcessProbe(h, self.name) for h in wd.hlist.lst]
+        results, errors = fanout(lambda p: p.check(), probes)
+        for p, ok in zip(probes, results):
+            if ok is False:
+                return "%s not running on %s" % (self.name, p.host.addr)
+        return None
+
+def netstat_timeouts(host):
+    """Sum of the 'timeouts' counters in netstat -s (as calc-timeouts.py)."""
+    total = 0
+    for line in host.cmd("netstat -s | grep timeouts").split('\n'):
+        try:
+            total += int(line.strip().split(' ', 1)[0])
+        except ValueError:
+            pass
+    return total
+
+class TimeoutGrowth(Rule):
+    """TCP timeouts on some host grew by more than limit since the
+    watchdog started."""
+    def __init__(self, limit=1000, grace=0, every=30):
+        self.limit = int(limit)
+        self.grace = float(grace)
+        self.every = float(every)
+        self.last = 0
+        self.base = None
+
+    def check(self, wd):
+        if time.time() - self.last < self.every:
+            return None
+        self.last = time.time()
+        results, errors = fanout(netstat_timeouts, wd.hlist.lst)
+        if self.base is None:
+            self.base = results
+            return None
+        for h, b, now in zip(wd.hlist.lst, self.base, results):
+            if b is not None and now is not None and now - b > self.limit:
+                return "%d TCP timeouts on %s since start" % (now - b, h.addr)
+        return None
+
+RULES = {
+    'rate': TenantRateBelow,
+    'cpu': CpuSaturated,
+    'nodata': NoData,
+    'proc': ProcessNotRunning,
+    'timeouts': TimeoutGrowth,
+}
+
+def parse_rule(spec):
+    """"name:key=value,..." -> Rule"""
+    name, _, params = spec.partition(':')
+    kwargs = {}
+    for kv in params.split(','):
+        if kv:
+            k, v = kv.split('=', 1)
+            kwargs[k] = v
+    if name not in RULES:
+        raise ValueError("unknown watchdog rule %s (one of %s)" % (name, ', '.join(sorted(RULES))))
+    return RULES[name](**kwargs)
+
+def span_needed(rules):
+    """Seconds of telemetry the rules need: the longest look-back plus
+    a sample, since a window never spans quite its whole length."""
+    return max([r.window for r in rules] + [0]) + SAMPLE_INTERVAL
+
+class Watchdog(object):
+    def __init__(self, expt, hlist, rules, telemetry=None, interval=5):
+        for r in rules:
+            if not r.window:
+                continue
+            if telemetry is None:
+                raise ValueError("%s needs telemetry" % r.__class__.__name__)
+            if r.window + SAMPLE_INTERVAL > telemetry.span:
+                raise ValueError("%s looks back %ds, but telemetry only keeps %ds"
+                                 % (r.__class__.__name__, r.window, telemetry.span))
+        self.expt = expt
+        self.hlist = hlist
+        self.rules = rules
+        self.telemetry = telemetry
+        self.interval = interval
+        self.done = threading.Event()
+        self.thread = None
+
+    def run(self):
+        start = time.time()
+        while not self.done.isSet() and not self.expt.stopping.isSet():
+            self.done.wait(self.interval)
+            # Woken by stop(): the run is being torn down
+            if self.done.isSet() or self.expt.stopping.isSet():
+                return
+            elapsed = time.time() - start
+            for rule in self.rules:
+                if elapsed < rule.grace:
+                    continue
+                try:
+                    reason = rule.check(self)
+                except Exception, e:
+                    print T.colored("watchdog: %s failed: %s" % (rule.__class__.__name__, e), "yellow")
+                    continue
+                if reason and not self.done.isSet():
+                    self.expt.abort(reason)
+                    return
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()